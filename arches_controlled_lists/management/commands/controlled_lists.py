@@ -1,22 +1,37 @@
+import io
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.management.base import BaseCommand, CommandError
-from django.db import models, transaction
+from django.db import connection, connections, models, transaction
 from django.db.models.expressions import CombinedExpression
 from django.db.models.fields.json import KT
 from django.db.models.functions import Cast
 from uuid import UUID
 
-from arches.app.datatypes.datatypes import DataTypeFactory
-from arches.app.models.fields.i18n import I18n_JSONField
+from arches.app.models.fields.i18n import I18n_JSON, I18n_JSONField
 from arches.app.models.graph import Graph
 from arches.app.models.models import (
+    CardXNodeXWidget,
     GraphModel,
     Language,
     Node,
     Value,
     Widget,
 )
-from arches_controlled_lists.models import List
+from arches_controlled_lists.models import (
+    CollectionMigration,
+    List,
+    ListItem,
+    ListItemImage,
+    ListItemValue,
+)
+from arches_controlled_lists.thumbnails import generate_thumbnails
 
 
 class Command(BaseCommand):
@@ -35,6 +50,9 @@ class Command(BaseCommand):
             choices=[
                 "migrate_collections_to_controlled_lists",
                 "migrate_concept_nodes_to_reference_datatype",
+                "migrate_concept_tiles_to_reference_datatype",
+                "clone_controlled_list",
+                "regenerate_thumbnails",
             ],
             help="The operation to perform",
         )
@@ -48,6 +66,23 @@ class Command(BaseCommand):
             help="One or more collections to migrate to controlled lists",
         )
 
+        parser.add_argument(
+            "-l",
+            "--list",
+            action="store",
+            dest="list",
+            help="The id or name of the controlled list to clone, or whose image thumbnails to regenerate (default all lists)",
+        )
+
+        parser.add_argument(
+            "-n",
+            "--name",
+            action="store",
+            dest="name",
+            default=None,
+            help="The name of the clone. Default 'Copy of <list name>'",
+        )
+
         parser.add_argument(
             "-ho",
             "--host",
@@ -66,6 +101,15 @@ class Command(BaseCommand):
             help="Overwrite the entire controlled list and its list items/values. Default false.",
         )
 
+        parser.add_argument(
+            "-r",
+            "--resume",
+            action="store_true",
+            dest="resume",
+            default=False,
+            help="Skip collections already migrated by a previous (e.g. interrupted) run. Default false.",
+        )
+
         parser.add_argument(
             "-psl",
             "--preferred_sort_language",
@@ -80,7 +124,57 @@ class Command(BaseCommand):
             "--graph",
             action="store",
             dest="graph",
-            help="The graphid or slug which associated concept nodes will be migrated to use the reference datatype",
+            nargs="+",
+            help="One or more graphids or slugs which associated concept nodes will be migrated to use the reference datatype",
+        )
+
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            dest="all_graphs",
+            default=False,
+            help=(
+                "Instead of --graph, migrate every resource model with concept/concept-list nodes, or, when "
+                "migrating tiles, every resource model with reference nodes of controlled lists."
+            ),
+        )
+
+        parser.add_argument(
+            "--workers",
+            type=int,
+            dest="workers",
+            default=1,
+            help=(
+                "The number of worker processes migrating concept nodes when more than one graph is given. "
+                "Each worker migrates and publishes whole graphs in its own transaction. Default is 1"
+            ),
+        )
+
+        parser.add_argument(
+            "-bs",
+            "--batch_size",
+            action="store",
+            type=int,
+            dest="batch_size",
+            default=1000,
+            help="The number of tiles migrated (and committed) at a time. Default 1000",
+        )
+
+        parser.add_argument(
+            "-dr",
+            "--dry_run",
+            action="store_true",
+            dest="dry_run",
+            default=False,
+            help="Report what the migration would affect, using read-only queries, without migrating anything.",
+        )
+
+        parser.add_argument(
+            "--no_reindex",
+            action="store_false",
+            dest="reindex",
+            default=True,
+            help="Do not reindex resources whose tiles were migrated, e.g. to reindex the whole database afterwards.",
         )
 
     def handle(self, *args, **options):
@@ -98,8 +192,23 @@ class Command(BaseCommand):
             if options["collections_to_migrate"] is None:
                 raise CommandError("No collections provided to migrate.")
 
+            if options["dry_run"]:
+                self.plan_collection_migration(options["collections_to_migrate"], psl)
+                return
+
+            if options["resume"]:
+                already_migrated = set(
+                    CollectionMigration.objects.filter(
+                        collection__in=options["collections_to_migrate"]
+                    ).values_list("collection", flat=True)
+                )
+            else:
+                already_migrated = set()
+
             if not options["overwrite"]:
                 for collection_name in options["collections_to_migrate"]:
+                    if collection_name in already_migrated:
+                        continue
                     if List.objects.filter(name=collection_name).exists():
                         raise CommandError(
                             f"The collection '{collection_name}' already exists."
@@ -110,12 +219,101 @@ class Command(BaseCommand):
                 host=options["host"],
                 overwrite=options["overwrite"],
                 preferred_sort_language=psl,
+                resume=options["resume"],
             )
         elif options["operation"] == "migrate_concept_nodes_to_reference_datatype":
-            graph = options["graph"]
-            if not graph or graph is None:
-                raise CommandError("Please provide a graph id or slug")
-            self.migrate_concept_nodes_to_reference_datatype(graph)
+            graphs = self.graphs_to_migrate(options)
+            if options["dry_run"]:
+                for graph in graphs:
+                    self.plan_concept_node_migration(graph)
+                return
+            if len(graphs) == 1:
+                self.migrate_concept_nodes_to_reference_datatype(graphs[0])
+            else:
+                self.migrate_concept_nodes_of_graphs(graphs, options["workers"])
+        elif options["operation"] == "migrate_concept_tiles_to_reference_datatype":
+            for graph in self.graphs_to_migrate(options):
+                self.migrate_concept_tiles_to_reference_datatype(
+                    graph, batch_size=options["batch_size"], reindex=options["reindex"]
+                )
+        elif options["operation"] == "clone_controlled_list":
+            if not options["list"]:
+                raise CommandError("Please provide a list id or name")
+            self.clone_controlled_list(options["list"], options["name"])
+        elif options["operation"] == "regenerate_thumbnails":
+            self.regenerate_thumbnails(options["list"])
+
+    @staticmethod
+    def get_list(list_id_or_name):
+        try:
+            UUID(list_id_or_name)
+            query = models.Q(pk=list_id_or_name)
+        except ValueError:
+            query = models.Q(name=list_id_or_name)
+        try:
+            return List.objects.get(query)
+        except (List.DoesNotExist, List.MultipleObjectsReturned) as e:
+            raise CommandError(e)
+
+    def clone_controlled_list(self, list_id_or_name, name=None):
+        source_list = self.get_list(list_id_or_name)
+
+        start = time.monotonic()
+        try:
+            clone = source_list.clone(name=name)
+        except ValidationError as e:
+            raise CommandError("\n".join(e.messages))
+        self.stdout.write(
+            "Cloned {0} to {1} ({2}): {3} items in {4:.1f}s".format(
+                source_list.name,
+                clone.name,
+                clone.pk,
+                clone.list_items.count(),
+                time.monotonic() - start,
+            )
+        )
+
+    @staticmethod
+    def graphs_to_migrate(options):
+        if options["all_graphs"]:
+            resource_nodes = Node.objects.filter(
+                graph__isresource=True, graph__source_identifier__isnull=True
+            )
+            if options["operation"] == "migrate_concept_tiles_to_reference_datatype":
+                # Tiles are migrated after their nodes, which are by then
+                # reference nodes of controlled lists.
+                nodes = (
+                    resource_nodes.filter(datatype="reference")
+                    .annotate(
+                        list_id=Cast(
+                            KT("config__controlledList"),
+                            output_field=models.UUIDField(),
+                        )
+                    )
+                    .filter(list_id__isnull=False)
+                )
+                not_found = "No graphs with reference nodes of controlled lists found"
+            else:
+                nodes = resource_nodes.filter(
+                    datatype__in=["concept", "concept-list"], is_immutable=False
+                )
+                not_found = "No graphs with concept/concept-list nodes found"
+            graphs = [
+                str(graph_id)
+                for graph_id in nodes.order_by("graph_id")
+                .values_list("graph_id", flat=True)
+                .distinct()
+            ]
+            if not graphs:
+                raise CommandError(not_found)
+            return graphs
+
+        graphs = options["graph"]
+        if isinstance(graphs, str):
+            graphs = [graphs]
+        if not graphs:
+            raise CommandError("Please provide a graph id or slug")
+        return graphs
 
     def migrate_collections_to_controlled_lists(
         self,
@@ -123,9 +321,13 @@ class Command(BaseCommand):
         host,
         overwrite,
         preferred_sort_language,
+        resume=False,
     ):
         """
-        Uses a postgres function to migrate collections to controlled lists
+        Uses a postgres function to migrate collections to controlled lists,
+        one collection (and one transaction) at a time. Each migrated
+        collection is checkpointed, so that with --resume, a run that was
+        interrupted skips the collections it already migrated.
 
         Example usage:
             python manage.py controlled_lists
@@ -134,6 +336,7 @@ class Command(BaseCommand):
                 -ho 'http://localhost:8000/plugins/controlled-list-manager/item/'
                 -psl 'fr'
                 -ow
+                -r
 
             for collections that contain an apostrophe, wrap the concept in double quotes, e.g. "John''s list"
 
@@ -159,22 +362,264 @@ class Command(BaseCommand):
                 % ", ".join(failed_collections)
             )
 
-        if len(collections_in_db) > 0:
-            from django.db import connection
+        # Preserve the requested order, e.g. for resuming.
+        collections_in_db = [
+            collection
+            for collection in dict.fromkeys(collections_to_migrate)
+            if collection in collections_in_db
+        ]
+        if resume:
+            checkpoints = CollectionMigration.objects.in_bulk(collections_in_db)
+        else:
+            checkpoints = {}
+
+        migrated = []
+        for index, collection in enumerate(collections_in_db, start=1):
+            progress = "[{0}/{1}]".format(index, len(collections_in_db))
+            if collection in checkpoints:
+                self.stdout.write(
+                    "{0} Skipping {1}, already migrated on {2}".format(
+                        progress,
+                        collection,
+                        checkpoints[collection].migrated.isoformat(
+                            sep=" ", timespec="seconds"
+                        ),
+                    )
+                )
+                continue
 
-            cursor = connection.cursor()
+            started = time.monotonic()
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        select * from __arches_migrate_collections_to_clm(
+                            ARRAY[%s], %s, %s::boolean, %s
+                        );
+                        """,
+                        [[collection], host, overwrite, preferred_sort_language],
+                    )
+                # Lists have the ids of the collections they were migrated from.
+                list_ids = Value.objects.filter(
+                    value=collection,
+                    valuetype__in=["prefLabel", "identifier"],
+                    concept__nodetype="Collection",
+                ).values("concept_id")
+                checkpoint, unused = CollectionMigration.objects.update_or_create(
+                    collection=collection,
+                    defaults={
+                        "item_count": ListItem.objects.filter(
+                            list_id__in=list_ids
+                        ).count(),
+                        "value_count": ListItemValue.objects.filter(
+                            list_item__list_id__in=list_ids
+                        ).count(),
+                    },
+                )
+            migrated.append(collection)
+            self.stdout.write(
+                "{0} Migrated {1}: {2} items, {3} values ({4:.1f}s)".format(
+                    progress,
+                    collection,
+                    checkpoint.item_count,
+                    checkpoint.value_count,
+                    time.monotonic() - started,
+                )
+            )
+
+        if migrated:
+            self.stdout.write(
+                "Collection(s) {0} migrated to controlled list(s)".format(
+                    ", ".join(migrated)
+                )
+            )
+
+    def plan_collection_migration(
+        self, collections_to_migrate, preferred_sort_language
+    ):
+        """Reports, per collection, what migrate_collections_to_controlled_lists
+        would insert. Shared concepts are those in several of the collections
+        or already migrated, which are given new ids."""
+        with connection.cursor() as cursor:
             cursor.execute(
                 """
-                select * from __arches_migrate_collections_to_clm(
-                    ARRAY[%s], %s, %s::boolean, %s
-                );
+                with recursive requested as (
+                    select distinct c.conceptid as id
+                    from concepts c
+                    join values v on v.conceptid = c.conceptid
+                    where c.nodetype = 'Collection'
+                        and v.valuetype in ('prefLabel', 'identifier')
+                        and v.value = any(%s)
+                ),
+                collection_hierarchy as (
+                    select conceptidfrom as root_list,
+                        conceptidto as child,
+                        ARRAY[conceptidfrom] as path,
+                        0 as depth
+                    from relations
+                    where conceptidfrom in (select id from requested)
+                        and relationtype = 'member'
+                    union all
+                    select ch.root_list,
+                        r.conceptidto,
+                        ch.path || r.conceptidfrom,
+                        ch.depth + 1
+                    from collection_hierarchy ch
+                    join relations r on ch.child = r.conceptidfrom
+                    where r.relationtype = 'member'
+                        and r.conceptidto <> all(ch.path || ch.child)
+                ),
+                members as (
+                    select root_list, child, max(depth) as depth
+                    from collection_hierarchy
+                    group by root_list, child
+                ),
+                shared as (
+                    select child from members group by child having count(*) > 1
+                    union
+                    select id from arches_controlled_lists_listitem
+                    where id in (select child from members)
+                ),
+                member_values as (
+                    select members.root_list, count(*) as value_count
+                    from members
+                    join values v on v.conceptid = members.child
+                    join d_value_types on d_value_types.valuetype = v.valuetype
+                    where d_value_types.category in ('label', 'note')
+                    group by members.root_list
+                )
+                select (
+                        select v.value from values v
+                        where v.conceptid = requested.id and v.valuetype = 'prefLabel'
+                        order by v.languageid = %s desc, v.languageid
+                        limit 1
+                    ) as name,
+                    count(members.child) as concept_count,
+                    coalesce(max(member_values.value_count), 0) as value_count,
+                    coalesce(max(members.depth), 0) as max_depth,
+                    count(members.child) filter (
+                        where members.child in (select child from shared)
+                    ) as shared_count,
+                    exists (
+                        select 1 from arches_controlled_lists_list
+                        where id = requested.id
+                    ) as already_migrated
+                from requested
+                left join members on members.root_list = requested.id
+                left join member_values on member_values.root_list = requested.id
+                group by requested.id
+                order by name
                 """,
-                [collections_in_db, host, overwrite, preferred_sort_language],
+                [collections_to_migrate, preferred_sort_language],
             )
-            result = cursor.fetchone()
-            self.stdout.write(result[0])
+            rows = cursor.fetchall()
 
-    def migrate_concept_nodes_to_reference_datatype(self, graph):
+        if not rows:
+            raise CommandError(
+                "Failed to find the following collections in the database: {0}".format(
+                    ", ".join(collections_to_migrate)
+                )
+            )
+        totals = [0, 0, 0]
+        for name, concepts, values, max_depth, shared, already_migrated in rows:
+            self.stdout.write(
+                "{0}: {1} concepts, {2} values, max depth {3}, {4} shared concepts{5}".format(
+                    name,
+                    concepts,
+                    values,
+                    max_depth,
+                    shared,
+                    " (already migrated)" if already_migrated else "",
+                )
+            )
+            totals = [totals[0] + concepts, totals[1] + values, totals[2] + shared]
+        self.stdout.write(
+            "Total: {0} list items, {1} list item values, {2} shared concepts, in {3} list(s)".format(
+                *totals, len(rows)
+            )
+        )
+
+    def regenerate_thumbnails(self, list_id_or_name=None):
+        images = ListItemImage.objects.all()
+        if list_id_or_name:
+            images = images.filter(list_item__list=self.get_list(list_id_or_name))
+        file_names = images.order_by("value").values_list("value", flat=True)
+
+        start = time.monotonic()
+        images_done = thumbnails_written = 0
+        for file_name in file_names.distinct().iterator():
+            thumbnails_written += generate_thumbnails(file_name)
+            images_done += 1
+        self.stdout.write(
+            "Wrote {0} thumbnails of {1} images in {2:.1f}s".format(
+                thumbnails_written, images_done, time.monotonic() - start
+            )
+        )
+
+    def plan_concept_node_migration(self, graph):
+        """Reports the nodes, cross records and tiles that
+        migrate_concept_nodes_to_reference_datatype would affect."""
+        source_graph = self.get_source_graph(graph)
+        nodes = list(
+            Node.objects.filter(
+                graph_id=source_graph.graphid,
+                datatype__in=["concept", "concept-list"],
+                is_immutable=False,
+            )
+            .annotate(
+                collection_id=Cast(
+                    KT("config__rdmCollection"),
+                    output_field=models.UUIDField(),
+                ),
+                cross_record_count=models.Count("cardxnodexwidget"),
+                collection_migrated=models.Exists(
+                    List.objects.filter(pk=models.OuterRef("collection_id"))
+                ),
+            )
+            .order_by("alias")
+        )
+        if not nodes:
+            raise CommandError(
+                "No concept/concept-list nodes found for the {0} graph".format(
+                    source_graph.name
+                )
+            )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                select node.nodeid, count(tiles.tileid)
+                from unnest(%s::uuid[], %s::uuid[]) as node(nodeid, nodegroupid)
+                join tiles on tiles.nodegroupid = node.nodegroupid
+                    and jsonb_typeof(tiles.tiledata -> node.nodeid::text) <> 'null'
+                group by node.nodeid
+                """,
+                [[node.pk for node in nodes], [node.nodegroup_id for node in nodes]],
+            )
+            tile_counts = dict(cursor.fetchall())
+
+        for node in nodes:
+            self.stdout.write(
+                "{0} ({1}): collection {2}{3}, {4} cross records, {5} tiles".format(
+                    node.alias,
+                    node.datatype,
+                    node.collection_id,
+                    "" if node.collection_migrated else " (not migrated)",
+                    node.cross_record_count,
+                    tile_counts.get(node.pk, 0),
+                )
+            )
+        self.stdout.write(
+            "Total: {0} nodes, {1} cross records, {2} tile values in the {3} graph".format(
+                len(nodes),
+                sum(node.cross_record_count for node in nodes),
+                sum(tile_counts.values()),
+                source_graph.name,
+            )
+        )
+
+    @staticmethod
+    def get_source_graph(graph):
         try:
             UUID(graph)
             query = models.Q(graphid=graph)
@@ -182,10 +627,12 @@ class Command(BaseCommand):
             query = models.Q(slug=graph, source_identifier__isnull=True)
 
         try:
-            source_graph = GraphModel.objects.get(query)
+            return GraphModel.objects.get(query)
         except GraphModel.DoesNotExist as e:
             raise CommandError(e)
 
+    def migrate_concept_nodes_to_reference_datatype(self, graph):
+        source_graph = self.get_source_graph(graph)
         graph_id = source_graph.graphid
 
         nodes = (
@@ -211,7 +658,6 @@ class Command(BaseCommand):
             )
 
         REFERENCE_SELECT_WIDGET = Widget.objects.get(name="reference-select-widget")
-        REFERENCE_FACTORY = DataTypeFactory().get_instance("reference")
         controlled_list_ids = List.objects.all().values_list("id", flat=True)
 
         errors = []
@@ -248,64 +694,385 @@ class Command(BaseCommand):
                     node.full_clean()
                     node.save()
 
-                    cross_records = node.cardxnodexwidget_set.annotate(
-                        config_without_options=CombinedExpression(
-                            models.F("config"),
-                            "-",
-                            models.Value("options", output_field=models.CharField()),
-                            output_field=I18n_JSONField(),
+                self.migrate_cross_records_to_reference_widget(
+                    nodes, REFERENCE_SELECT_WIDGET
+                )
+
+                source_graph = Graph.objects.get(pk=graph_id)
+
+                # Refresh the nodes to ensure the changes are reflected in the serialized graph
+                fresh_nodes = Node.objects.filter(graph_id=graph_id).in_bulk()
+                for node in source_graph.nodes.values():
+                    fresh_node = fresh_nodes[node.pk]
+                    for field in Node._meta.concrete_fields:
+                        setattr(node, field.attname, getattr(fresh_node, field.attname))
+
+                source_graph.create_editable_future_graph()
+                source_graph.publish(
+                    notes="Migrated concept/concept-list nodes to reference datatype"
+                )
+
+            self.stdout.write(
+                "All concept/concept-list nodes for the {0} graph have been successfully migrated to reference datatype".format(
+                    source_graph.name
+                )
+            )
+            return len(nodes)
+
+    def migrate_concept_nodes_of_graphs(self, graphs, workers=1):
+        """Migrates and publishes each graph in its own transaction, in up to
+        `workers` processes, then summarizes the results."""
+        results = []
+        if workers > 1:
+            # Workers must not share the parent's connection.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(graphs)), initializer=initialize_worker
+            ) as pool:
+                futures = {
+                    pool.submit(migrate_graph_concept_nodes, graph): graph
+                    for graph in graphs
+                }
+                for future in as_completed(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        results.append((futures[future], None, str(e)))
+                    self.stdout.write(results[-1][2])
+        else:
+            for graph in graphs:
+                results.append(migrate_graph_concept_nodes(graph))
+                self.stdout.write(results[-1][2])
+
+        failures = [
+            (graph, output) for graph, migrated, output in results if migrated is None
+        ]
+        self.stdout.write(
+            "Migrated {0} concept/concept-list nodes in {1} of {2} graphs".format(
+                sum(migrated or 0 for graph, migrated, output in results),
+                len(results) - len(failures),
+                len(results),
+            )
+        )
+        if failures:
+            raise CommandError(
+                "{0} of {1} graphs failed to migrate:\n{2}".format(
+                    len(failures),
+                    len(results),
+                    "\n".join(
+                        "{0}: {1}".format(graph, output.strip())
+                        for graph, output in failures
+                    ),
+                )
+            )
+
+    def migrate_cross_records_to_reference_widget(self, nodes, widget):
+        """Crosswalks the concept default values of all the nodes' widgets to
+        references, resolving Values and list items in bulk."""
+        collection_ids = {node.pk: node.collection_id for node in nodes}
+        node_names = {node.pk: node.name for node in nodes}
+        cross_records = list(
+            CardXNodeXWidget.objects.filter(node__in=list(collection_ids)).annotate(
+                config_without_options=CombinedExpression(
+                    models.F("config"),
+                    "-",
+                    models.Value("options", output_field=models.CharField()),
+                    output_field=I18n_JSONField(),
+                )
+            )
+        )
+
+        default_value_ids = {}
+        for cross_record in cross_records:
+            original_default_value = cross_record.config_without_options.get(
+                "defaultValue", None
+            )
+            if original_default_value:
+                if isinstance(original_default_value, str):
+                    original_default_value = [original_default_value]
+                default_value_ids[cross_record.pk] = original_default_value
+
+        labels_by_value_id = {
+            str(value_id): label
+            for value_id, label in Value.objects.filter(
+                pk__in={
+                    value_id
+                    for value_ids in default_value_ids.values()
+                    for value_id in value_ids
+                }
+            ).values_list("pk", "value")
+        }
+
+        # Like ReferenceDataType.lookup_listitem_from_label(): the first item
+        # by sortorder with a value matching the label.
+        items_by_list_and_label = {}
+        for item in (
+            ListItem.objects.filter(
+                list_id__in=set(collection_ids.values()),
+                list_item_values__value__in=set(labels_by_value_id.values()),
+            )
+            .annotate(matched_value=models.F("list_item_values__value"))
+            .order_by("sortorder")
+            .prefetch_related(
+                models.Prefetch(
+                    "list_item_values",
+                    queryset=ListItemValue.objects.labels(),
+                    to_attr="prefetched_labels",
+                )
+            )
+        ):
+            items_by_list_and_label.setdefault((item.list_id, item.matched_value), item)
+
+        updated_configs = []
+        for cross_record in cross_records:
+            collection_id = collection_ids[cross_record.node_id]
+            if cross_record.pk in default_value_ids:
+                new_default_value = []
+                for value_id in default_value_ids[cross_record.pk]:
+                    label = labels_by_value_id.get(str(value_id))
+                    item = items_by_list_and_label.get((collection_id, label))
+                    if item is None:
+                        raise CommandError(
+                            f"Failed to convert original default value: {label or value_id} in list: {collection_id} for node: {node_names[cross_record.node_id]} into a reference datatype instance"
                         )
+                    new_default_value.append(
+                        item.build_tile_value(labels=item.prefetched_labels)
                     )
-                    for cross_record in cross_records:
-                        # work around for i18n as_sql method issue detailed here: https://github.com/archesproject/arches/issues/11473
-                        cross_record.config = {}
-                        cross_record.save()
-
-                        # Crosswalk concept version of default values to reference versions
-                        original_default_value = (
-                            cross_record.config_without_options.get(
-                                "defaultValue", None
-                            )
-                        )
-                        if original_default_value:
-                            new_default_value = []
-                            if isinstance(original_default_value, str):
-                                original_default_value = [original_default_value]
-                            for value in original_default_value:
-                                value_rec = Value.objects.get(pk=value)
-                                config = {"controlledList": node.collection_id}
-                                new_value = REFERENCE_FACTORY.transform_value_for_tile(
-                                    value=value_rec.value,
-                                    **config,
-                                )
-                                if isinstance(new_value, list):
-                                    new_default_value.append(new_value[0])
-                                else:
-                                    raise CommandError(
-                                        f"Failed to convert original default value: {value_rec.value} in list: {node.collection_id} for node: {node.name} into a reference datatype instance"
-                                    )
-                            cross_record.config_without_options["defaultValue"] = (
-                                new_default_value
-                            )
+                cross_record.config_without_options["defaultValue"] = new_default_value
+            cross_record.config = cross_record.config_without_options
+            cross_record.widget = widget
+            # Only the config and widget change, so uniqueness is not rechecked.
+            cross_record.full_clean(validate_unique=False)
+            updated_configs.append(
+                I18n_JSON(cross_record.config_without_options).to_localized_object()
+            )
 
-                        cross_record.config = cross_record.config_without_options
-                        cross_record.widget = REFERENCE_SELECT_WIDGET
-                        cross_record.full_clean()
-                        cross_record.save()
+        # Written directly rather than with bulk_update(): I18n_JSONField
+        # would otherwise merge into the existing config, which still holds
+        # the concept widget's options.
+        qn = connection.ops.quote_name
+        config_field = CardXNodeXWidget._meta.get_field("config")
+        widget_field = CardXNodeXWidget._meta.get_field("widget")
+        pk_column = qn(CardXNodeXWidget._meta.pk.column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                update {qn(CardXNodeXWidget._meta.db_table)}
+                set {qn(config_field.column)} = crosswalked.config,
+                    {qn(widget_field.column)} = %s
+                from unnest(%s::uuid[], %s::jsonb[]) as crosswalked(id, config)
+                where {pk_column} = crosswalked.id
+                """,
+                [
+                    widget.pk,
+                    [cross_record.pk for cross_record in cross_records],
+                    [
+                        json.dumps(config, cls=DjangoJSONEncoder)
+                        for config in updated_configs
+                    ],
+                ],
+            )
 
-            source_graph = Graph.objects.get(pk=graph_id)
+    def migrate_concept_tiles_to_reference_datatype(
+        self, graph, batch_size=1000, reindex=True
+    ):
+        """
+        Rewrites concept valueids stored in tiles of reference nodes (i.e. nodes
+        already migrated by migrate_concept_nodes_to_reference_datatype) into
+        reference values, in batches that are each committed on their own.
+        Migrated values no longer look like valueids, so an interrupted run
+        resumes where it left off when run again.
 
-            # Refresh the nodes to ensure the changes are reflected in the serialized graph
-            for node in source_graph.nodes.values():
-                node.refresh_from_db()
+        Example usage:
+            python manage.py controlled_lists
+                -o migrate_concept_tiles_to_reference_datatype
+                -g 'my-graph-slug'
+                -bs 5000
+        """
+        source_graph = self.get_source_graph(graph)
+        nodes = list(
+            Node.objects.filter(graph_id=source_graph.graphid, datatype="reference")
+            .annotate(
+                list_id=Cast(
+                    KT("config__controlledList"), output_field=models.UUIDField()
+                )
+            )
+            .filter(list_id__isnull=False)
+            .values_list("nodeid", "nodegroup_id", "list_id")
+        )
+        if not nodes:
+            raise CommandError(
+                "No reference nodes found for the {0} graph. Please run migrate_concept_nodes_to_reference_datatype first.".format(
+                    source_graph.name
+                )
+            )
 
-            source_graph.create_editable_future_graph()
-            source_graph.publish(
-                notes="Migrated concept/concept-list nodes to reference datatype"
+        # Map valueids to reference values. Migrated items keep their concept's
+        # id as the end of their URI. Not "on commit drop": the map outlives
+        # the per-batch transactions below.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                drop table if exists temp_concept_value_references;
+                create temporary table temp_concept_value_references as
+                select v.valueid::text as valueid,
+                    item.list_id,
+                    jsonb_build_object(
+                        'uri', item.uri,
+                        'labels', labels.labels,
+                        'list_id', item.list_id::text
+                    ) as reference
+                from values v
+                join arches_controlled_lists_listitem item
+                    on right(item.uri, 36) = v.conceptid::text
+                cross join lateral (
+                    select coalesce(
+                        jsonb_agg(
+                            jsonb_build_object(
+                                'id', label.id::text,
+                                'value', label.value,
+                                'language_id', label.languageid,
+                                'valuetype_id', label.valuetype_id,
+                                'list_item_id', label.list_item_id::text
+                            ) order by label.valuetype_id, label.languageid
+                        ),
+                        '[]'::jsonb
+                    ) as labels
+                    from arches_controlled_lists_listitemvalue label
+                    join d_value_types on d_value_types.valuetype = label.valuetype_id
+                    where label.list_item_id = item.id
+                        and d_value_types.category = 'label'
+                ) labels
+                where item.list_id = any(%s::uuid[]);
+                create index on temp_concept_value_references (valueid, list_id);
+                analyze temp_concept_value_references;
+                """,
+                [list({list_id for _, _, list_id in nodes})],
             )
 
-            self.stdout.write(
-                "All concept/concept-list nodes for the {0} graph have been successfully migrated to reference datatype".format(
-                    source_graph.name
+        migrated_count = 0
+        unmatched_count = 0
+        for node_id, nodegroup_id, list_id in nodes:
+            last_tile_id = None
+            while True:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        with batch as (
+                            select tileid,
+                                resourceinstanceid,
+                                case when jsonb_typeof(tiledata -> %(node)s) = 'string'
+                                    then jsonb_build_array(tiledata -> %(node)s)
+                                    else tiledata -> %(node)s
+                                end as valueids
+                            from tiles
+                            where nodegroupid = %(nodegroup)s
+                                and (%(after)s::uuid is null or tileid > %(after)s::uuid)
+                                and (
+                                    jsonb_typeof(tiledata -> %(node)s) = 'string'
+                                    or jsonb_typeof(tiledata -> %(node)s -> 0) = 'string'
+                                )
+                            order by tileid
+                            limit %(batch_size)s
+                        ),
+                        converted as (
+                            select batch.tileid,
+                                batch.resourceinstanceid,
+                                count(valueid.value) filter (where valueid.value <> '') as valueid_count,
+                                count(ref.reference) as reference_count,
+                                jsonb_agg(ref.reference order by valueid.ordinality)
+                                    filter (where ref.reference is not null) as refs
+                            from batch
+                            cross join lateral jsonb_array_elements_text(batch.valueids)
+                                with ordinality as valueid(value, ordinality)
+                            left join temp_concept_value_references ref
+                                on ref.valueid = valueid.value and ref.list_id = %(list)s
+                            group by batch.tileid, batch.resourceinstanceid
+                        ),
+                        updated as (
+                            update tiles
+                            set tiledata = jsonb_set(
+                                tiledata, array[%(node)s], coalesce(converted.refs, 'null'::jsonb)
+                            )
+                            from converted
+                            where tiles.tileid = converted.tileid
+                                and converted.reference_count = converted.valueid_count
+                            returning tiles.tileid
+                        )
+                        select converted.tileid,
+                            converted.resourceinstanceid,
+                            converted.tileid in (select tileid from updated)
+                        from converted
+                        order by converted.tileid
+                        """,
+                        {
+                            "node": str(node_id),
+                            "nodegroup": nodegroup_id,
+                            "list": list_id,
+                            "after": last_tile_id,
+                            "batch_size": batch_size,
+                        },
+                    )
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_tile_id = rows[-1][0]
+                migrated = [row for row in rows if row[2]]
+                unmatched_count += len(rows) - len(migrated)
+                migrated_count += len(migrated)
+                if reindex and migrated:
+                    self.reindex_resources({row[1] for row in migrated})
+                self.stdout.write(
+                    "{0} tile values migrated ({1} with valueids not found in list {2})".format(
+                        migrated_count, unmatched_count, list_id
+                    )
+                )
+
+        with connection.cursor() as cursor:
+            cursor.execute("drop table if exists temp_concept_value_references")
+
+        self.stdout.write(
+            "{0} concept/concept-list tile values for the {1} graph have been migrated to reference datatype".format(
+                migrated_count, source_graph.name
+            )
+        )
+        if unmatched_count:
+            self.stderr.write(
+                "{0} tile values were left unchanged because their valueids do not belong to a migrated controlled list item".format(
+                    unmatched_count
                 )
             )
+
+    @staticmethod
+    def reindex_resources(resource_ids):
+        from arches.app.models.resource import Resource
+        from arches.app.utils.index_database import (
+            index_resources_using_singleprocessing,
+        )
+
+        index_resources_using_singleprocessing(
+            Resource.objects.filter(pk__in=resource_ids),
+            quiet=True,
+            recalculate_descriptors=True,
+        )
+
+
+def initialize_worker():
+    if not apps.ready:
+        django.setup()
+
+
+def migrate_graph_concept_nodes(graph):
+    """Migrates one graph's concept nodes, possibly in a worker process.
+    Returns the graph, the number of nodes migrated (None on failure),
+    and the output."""
+    output = io.StringIO()
+    command = Command(stdout=output, stderr=output)
+    try:
+        migrated = command.migrate_concept_nodes_to_reference_datatype(graph)
+    except Exception as e:
+        # e.g. a ValidationError or IntegrityError: report it with the other
+        # graphs' results rather than abandoning the run.
+        output.write(str(e))
+        migrated = None
+    return graph, migrated, output.getvalue()
@@ -1,15 +1,73 @@
+import argparse
+import csv
+import io
+import json
 import os, sys
 import logging
+import uuid
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
+
+import django
 import openpyxl
 from arches.management.commands.packages import Command as PackagesCommand
 from arches.app.models.system_settings import settings
 from arches.app.models import models
-from arches_controlled_lists.models import List, ListItem, ListItemValue
-from django.db import transaction
+from arches_controlled_lists.models import (
+    List,
+    ListItem,
+    ListItemImageMetadata,
+    ListItemValue,
+    ListTombstone,
+)
+from arches_controlled_lists.skos import (
+    SKOS_EXTENSIONS,
+    SKOSConceptScheme,
+    SKOSReader,
+    SKOSWriter,
+)
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models import BooleanField, CharField, F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 
 logger = logging.getLogger(__name__)
 
+INTERCHANGE_MODELS = (List, ListItem, ListItemValue)
+INTERCHANGE_FILE_FORMATS = ("csv", "jsonl")
+SKOS_FORMATS = {"rdf": "xml", "ttl": "turtle"}
+SKOS_BATCH_SIZE = 2000
+
+
+def interchange_fields(model):
+    """Fields maintained by the database (e.g. List.modified) are not
+    interchanged."""
+    return [
+        field for field in model._meta.concrete_fields if not field.has_db_default()
+    ]
+
+
+def modified_since(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(
+            f"{value} is not an ISO 8601 date and time, e.g. 2024-05-01T12:00:00Z"
+        )
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+# One JSON document per line: pick quote & delimiter characters that
+# cannot appear unescaped in JSON so that COPY passes each line through as-is.
+JSONL_COPY_OPTIONS = "format csv, quote e'\\x01', delimiter e'\\x02'"
+
 
 class Command(PackagesCommand):
 
@@ -30,18 +88,86 @@ class Command(PackagesCommand):
             help="The name of the file to export to. Default is export_controlled_lists.xlsx",
         )
 
+        parser.add_argument(
+            "-if",
+            "--interchange_format",
+            choices=["xlsx", *INTERCHANGE_FILE_FORMATS, *SKOS_FORMATS],
+            dest="interchange_format",
+            default="xlsx",
+            help=(
+                "The format to export controlled lists to. csv and jsonl write one file per model "
+                "to a directory, or to a zip archive if the file name ends with .zip. "
+                "rdf (RDF/XML) and ttl (Turtle) write SKOS. Default is xlsx"
+            ),
+        )
+
+        parser.add_argument(
+            "-m",
+            "--merge",
+            action="store_true",
+            dest="merge",
+            default=False,
+            help=(
+                "Merge imported controlled lists into existing ones instead of only inserting new rows. "
+                "Items are matched on id or (list, uri), rows are updated only if their content changed, "
+                "and items and values missing from the import are deleted from the imported lists."
+            ),
+        )
+
+        parser.add_argument(
+            "--workers",
+            type=int,
+            dest="workers",
+            default=1,
+            help=(
+                "The number of worker processes used to import controlled lists. "
+                "Each worker imports whole lists in its own transaction. Default is 1"
+            ),
+        )
+
+        parser.add_argument(
+            "--modified_since",
+            type=modified_since,
+            dest="modified_since",
+            default=None,
+            help=(
+                "Only export lists modified after this ISO 8601 date and time, along with "
+                "the ids of lists deleted since then (ListTombstone). Import the result with "
+                "--merge to apply it to another instance."
+            ),
+        )
+
     def handle(self, *args, **options):
         super().handle(self, *args, **options)
 
         if options["operation"] == "import_controlled_lists":
-            self.import_controlled_lists(options["source"])
+            self.import_controlled_lists(
+                options["source"], merge=options["merge"], workers=options["workers"]
+            )
 
         if options["operation"] == "export_controlled_lists":
-            self.export_controlled_lists(options["dest_dir"], options["file_name"])
+            self.export_controlled_lists(
+                options["dest_dir"],
+                options["file_name"],
+                options["interchange_format"],
+                modified_since=options["modified_since"],
+            )
 
-    def import_controlled_lists(self, source):
+    def import_controlled_lists(self, source, merge=False, workers=1):
         created_instances_pks = []
-        if os.path.exists(source):
+        if os.path.exists(source) and source.lower().endswith(SKOS_EXTENSIONS):
+            if merge or workers > 1:
+                raise CommandError(
+                    "--merge and --workers are not supported when importing SKOS."
+                )
+            self.import_controlled_lists_from_skos(source)
+        elif os.path.exists(source) and workers > 1:
+            self.import_controlled_lists_in_parallel(source, merge, workers)
+        elif os.path.exists(source) and not source.endswith(".xlsx"):
+            self.import_controlled_lists_from_files(source, merge=merge)
+        elif os.path.exists(source) and merge:
+            self.import_controlled_lists_from_workbook(source, merge=merge)
+        elif os.path.exists(source):
             wb = openpyxl.load_workbook(source)
             with transaction.atomic():
                 for sheet in wb.sheetnames:
@@ -57,6 +183,12 @@ class Command(PackagesCommand):
                         created_instances_pks.extend(
                             self.import_sheet_to_model(wb[sheet], ListItemValue)
                         )
+                    elif sheet == "ListTombstone":
+                        self.delete_tombstoned_lists(
+                            self.tombstoned_list_ids(
+                                "csv", self.sheet_as_csv(wb[sheet])
+                            )
+                        )
                 # validate all data
                 for model in [
                     List,
@@ -74,7 +206,7 @@ class Command(PackagesCommand):
     def import_sheet_to_model(self, sheet, model):
         fields = [
             {"name": field.name, "is_fk": field.get_internal_type() == "ForeignKey"}
-            for field in model._meta.fields
+            for field in interchange_fields(model)
         ]
         field_names = [field["name"] for field in fields]
 
@@ -143,13 +275,892 @@ class Command(PackagesCommand):
 
         return instance_pks
 
-    def export_controlled_lists(self, data_dest, file_name):
+    def import_controlled_lists_from_files(self, source, merge=False):
+        """Loads a directory or zip archive of csv or jsonl files, one per model,
+        e.g. List.csv, ListItem.csv, ListItemValue.csv. Rows are streamed into
+        staging tables with COPY and then merged into the controlled list tables.
+        """
+        with self.open_interchange_files(source) as files:
+            if not files:
+                raise CommandError(
+                    "No controlled list files (e.g. List.csv, ListItem.jsonl) found in {0}".format(
+                        source
+                    )
+                )
+            with transaction.atomic(), connection.cursor() as cursor:
+                if ListTombstone in files:
+                    self.delete_tombstoned_lists(
+                        self.tombstoned_list_ids(*files.pop(ListTombstone))
+                    )
+                for model in INTERCHANGE_MODELS:
+                    if model in files:
+                        file_format, stream = files[model]
+                        self.copy_file_to_staging_table(
+                            cursor, model, file_format, stream
+                        )
+                self.load_staging_tables(cursor, list(files), merge=merge)
+        self.stdout.write("Data imported successfully from {0}".format(source))
+
+    def import_controlled_lists_from_workbook(self, source, merge=False):
+        """Stages the sheets of an .xlsx export like csv files, e.g. for merging."""
+        wb = openpyxl.load_workbook(source, read_only=True)
+        staged_models = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            if ListTombstone.__name__ in wb.sheetnames:
+                self.delete_tombstoned_lists(
+                    self.tombstoned_list_ids(
+                        "csv", self.sheet_as_csv(wb[ListTombstone.__name__])
+                    )
+                )
+            for model in INTERCHANGE_MODELS:
+                if model.__name__ in wb.sheetnames:
+                    self.copy_file_to_staging_table(
+                        cursor, model, "csv", self.sheet_as_csv(wb[model.__name__])
+                    )
+                    staged_models.append(model)
+            self.load_staging_tables(cursor, staged_models, merge=merge)
+        self.stdout.write("Data imported successfully from {0}".format(source))
+
+    def import_controlled_lists_in_parallel(self, source, merge, workers):
+        """Partitions the import by list and loads partitions concurrently,
+        each in its own process, connection, and transaction. Cross-list
+        integrity is checked on the staged rows before any partition is
+        loaded; should a partition still fail, the others stay committed,
+        and the lists they wrote are reported."""
+        tombstoned_list_ids = []
+        if source.endswith(".xlsx"):
+            wb = openpyxl.load_workbook(source, read_only=True)
+            if ListTombstone.__name__ in wb.sheetnames:
+                tombstoned_list_ids = self.tombstoned_list_ids(
+                    "csv", self.sheet_as_csv(wb[ListTombstone.__name__])
+                )
+            tables = {
+                model: self.read_interchange_rows(
+                    model, "csv", self.sheet_as_csv(wb[model.__name__])
+                )
+                for model in INTERCHANGE_MODELS
+                if model.__name__ in wb.sheetnames
+            }
+        else:
+            with self.open_interchange_files(source) as files:
+                if ListTombstone in files:
+                    tombstoned_list_ids = self.tombstoned_list_ids(
+                        *files.pop(ListTombstone)
+                    )
+                tables = {
+                    model: self.read_interchange_rows(model, *files[model])
+                    for model in files
+                }
+
+        list_id_by_item_id = self.list_ids_by_item_id(tables)
+        partitions = self.partition_by_list(tables, workers, list_id_by_item_id)
+        imported_list_ids = set(list_id_by_item_id.values())
+        if List in tables:
+            header, rows = tables[List]
+            imported_list_ids |= {row[header.index("id")] for row in rows}
+        imported_item_ids = set()
+        if ListItem in tables:
+            header, rows = tables[ListItem]
+            imported_item_ids = {row[header.index("id")] for row in rows}
+        staged_errors = self.check_staged_cross_list_integrity(
+            list_id_by_item_id, imported_item_ids, imported_list_ids, merge
+        )
+        if staged_errors:
+            raise CommandError("\n".join(staged_errors))
+
+        errors = []
+        written_list_ids = set()
+        if partitions:
+            # Workers must not share the parent's connection.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=len(partitions), initializer=initialize_worker
+            ) as pool:
+                futures = {
+                    pool.submit(import_partition, partition, merge): partition
+                    for partition in partitions
+                }
+                for future in as_completed(futures):
+                    try:
+                        self.stdout.write(future.result())
+                    except Exception as e:
+                        errors.append(str(e))
+                    else:
+                        written_list_ids |= self.partition_list_ids(
+                            futures[future], list_id_by_item_id
+                        )
+
+        messages = []
+        if errors:
+            messages.append(
+                "{0} of {1} partitions failed to import:".format(
+                    len(errors), len(partitions)
+                )
+            )
+            messages.extend(errors)
+        messages.extend(self.check_cross_list_integrity(imported_list_ids))
+        if messages:
+            if written_list_ids:
+                messages.append(
+                    "These lists were imported by the other partitions: {0}".format(
+                        ", ".join(sorted(written_list_ids))
+                    )
+                )
+            raise CommandError("\n".join(messages))
+        # Only once every partition is imported, so that a failed import can
+        # be retried from the same package.
+        if tombstoned_list_ids:
+            with transaction.atomic():
+                self.delete_tombstoned_lists(tombstoned_list_ids)
+        self.stdout.write("Data imported successfully from {0}".format(source))
+
+    def read_interchange_rows(self, model, file_format, stream):
+        """Returns (header, rows) with csv-ready string cells."""
+        if file_format == "csv":
+            reader = csv.reader(
+                io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+            )
+            header = next(reader)
+            return header, list(reader)
+
+        header = [field.name for field in interchange_fields(model)]
+        rows = []
+        for line in io.TextIOWrapper(stream, encoding="utf-8"):
+            if not line.strip():
+                continue
+            document = json.loads(line)
+            row = []
+            for name in header:
+                cell = document.get(name)
+                if cell is None:
+                    cell = ""
+                elif isinstance(cell, bool):
+                    cell = "1" if cell else "0"
+                row.append(str(cell))
+            rows.append(row)
+        return header, rows
+
+    @staticmethod
+    def rows_as_csv(header, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        writer.writerows(rows)
+        return io.BytesIO(buffer.getvalue().encode("utf-8"))
+
+    @staticmethod
+    def list_ids_by_item_id(tables):
+        """Maps the items in (or referred to by) the import to their lists."""
+        list_id_by_item_id = {}
+        if ListItem in tables:
+            header, rows = tables[ListItem]
+            id_index, list_index = header.index("id"), header.index("list")
+            list_id_by_item_id = {row[id_index]: row[list_index] for row in rows}
+
+        referenced_item_ids = set()
+        if ListItem in tables:
+            header, rows = tables[ListItem]
+            parent_index = header.index("parent")
+            referenced_item_ids |= {
+                row[parent_index] for row in rows if row[parent_index]
+            }
+        if ListItemValue in tables:
+            header, rows = tables[ListItemValue]
+            item_index = header.index("list_item")
+            referenced_item_ids |= {row[item_index] for row in rows}
+
+        unknown_item_ids = referenced_item_ids - set(list_id_by_item_id)
+        if unknown_item_ids:
+            list_id_by_item_id |= {
+                str(item_id): str(list_id)
+                for item_id, list_id in ListItem.objects.filter(
+                    pk__in=unknown_item_ids
+                ).values_list("pk", "list_id")
+            }
+        return list_id_by_item_id
+
+    @staticmethod
+    def partition_by_list(tables, partition_count, list_id_by_item_id):
+        """Splits parsed tables into at most `partition_count` partitions of
+        whole lists, balanced by row count. Items may not have parents in
+        other lists, since each partition is committed independently."""
+        rows_by_list = defaultdict(lambda: defaultdict(list))
+        for model, (header, rows) in tables.items():
+            if model is List:
+                list_index = header.index("id")
+            elif model is ListItem:
+                list_index = header.index("list")
+                parent_index = header.index("parent")
+            else:
+                item_index = header.index("list_item")
+            for row in rows:
+                if model is ListItemValue:
+                    list_id = list_id_by_item_id.get(row[item_index])
+                    if list_id is None:
+                        raise CommandError(
+                            "ListItemValue {0} refers to an unknown item {1}".format(
+                                row[header.index("id")], row[item_index]
+                            )
+                        )
+                else:
+                    list_id = row[list_index]
+                if (
+                    model is ListItem
+                    and row[parent_index]
+                    and list_id_by_item_id.get(row[parent_index]) != list_id
+                ):
+                    raise CommandError(
+                        "ListItem {0} has a parent {1} in another list".format(
+                            row[header.index("id")], row[parent_index]
+                        )
+                    )
+                rows_by_list[list_id][model].append(row)
+
+        partitions = [defaultdict(list) for _ in range(partition_count)]
+        sizes = [0] * partition_count
+        largest_first = sorted(
+            rows_by_list.values(),
+            key=lambda rows_by_model: sum(map(len, rows_by_model.values())),
+            reverse=True,
+        )
+        for rows_by_model in largest_first:
+            smallest = sizes.index(min(sizes))
+            for model, rows in rows_by_model.items():
+                partitions[smallest][model].extend(rows)
+            sizes[smallest] += sum(map(len, rows_by_model.values()))
+
+        return [
+            {model: (tables[model][0], rows) for model, rows in partition.items()}
+            for partition in partitions
+            if partition
+        ]
+
+    @staticmethod
+    def partition_list_ids(partition, list_id_by_item_id):
+        """The lists a partition writes to."""
+        list_ids = set()
+        for model, (header, rows) in partition.items():
+            if model is List:
+                list_ids |= {row[header.index("id")] for row in rows}
+            elif model is ListItem:
+                list_ids |= {row[header.index("list")] for row in rows}
+            else:
+                item_index = header.index("list_item")
+                list_ids |= {list_id_by_item_id[row[item_index]] for row in rows}
+        return list_ids
+
+    @staticmethod
+    def check_staged_cross_list_integrity(
+        list_id_by_item_id, imported_item_ids, imported_list_ids, merge=False
+    ):
+        """Returns an error for each existing item, left in place by the
+        import, whose parent the import moves to another list. (Imported
+        items are checked by partition_by_list.) Checked before partitions
+        are committed independently, unlike check_cross_list_integrity."""
+        remaining_children = ListItem.objects.filter(
+            parent_id__in=imported_item_ids
+        ).exclude(pk__in=imported_item_ids)
+        if merge:
+            # Merging deletes the items missing from the imported lists.
+            remaining_children = remaining_children.exclude(
+                list_id__in=imported_list_ids
+            )
+        return [
+            "ListItem {0} has a parent {1} in another list.".format(item_id, parent_id)
+            for item_id, parent_id, list_id in remaining_children.values_list(
+                "pk", "parent_id", "list_id"
+            )
+            if str(list_id) != list_id_by_item_id[str(parent_id)]
+        ]
+
+    @staticmethod
+    def check_cross_list_integrity(list_ids):
+        """Returns an error for each imported item whose parent ended up in
+        another list, which partitions committed independently can cause."""
+        misplaced_items = (
+            ListItem.objects.filter(list_id__in=list_ids, parent__isnull=False)
+            .exclude(parent__list_id=F("list_id"))
+            .values_list("pk", flat=True)
+        )
+        return [
+            "ListItem {0} has a parent in another list.".format(item_id)
+            for item_id in misplaced_items
+        ]
+
+    @staticmethod
+    def sheet_as_csv(sheet):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in sheet.iter_rows(values_only=True):
+            if any(cell is not None for cell in row):
+                writer.writerow("" if cell is None else cell for cell in row)
+        return io.BytesIO(buffer.getvalue().encode("utf-8"))
+
+    def load_staging_tables(self, cursor, staged_models, merge=False):
+        self.check_staged_languages(cursor, staged_models)
+        if merge:
+            self.match_staged_rows_to_existing(cursor, staged_models)
+            deleted = self.delete_rows_missing_from_staging(cursor, staged_models)
+        for model in INTERCHANGE_MODELS:
+            if model not in staged_models:
+                continue
+            if merge:
+                staged, inserted, updated = self.upsert_staging_table(cursor, model)
+                self.stdout.write(
+                    "{0}: {1} inserted, {2} updated, {3} unchanged, {4} deleted".format(
+                        model.__name__,
+                        inserted,
+                        updated,
+                        staged - inserted - updated,
+                        deleted.get(model, 0),
+                    )
+                )
+            else:
+                inserted = self.insert_staging_table(cursor, model)
+                self.stdout.write(
+                    "{0} {1} rows imported".format(inserted, model.__name__)
+                )
+            if model is ListItem:
+                self.generate_blank_staged_uris(cursor)
+
+    @contextmanager
+    def open_interchange_files(self, source):
+        with ExitStack() as stack:
+            if os.path.isdir(source):
+                paths_by_name = {name: name for name in os.listdir(source)}
+                opener = lambda name: open(os.path.join(source, name), "rb")
+            else:
+                try:
+                    archive = stack.enter_context(zipfile.ZipFile(source))
+                except zipfile.BadZipFile:
+                    raise CommandError(
+                        "{0} is neither an .xlsx file, a directory, nor a zip archive.".format(
+                            source
+                        )
+                    )
+                paths_by_name = {
+                    os.path.basename(path): path for path in archive.namelist()
+                }
+                opener = archive.open
+
+            files = {}
+            for model in (*INTERCHANGE_MODELS, ListTombstone):
+                for file_format in INTERCHANGE_FILE_FORMATS:
+                    file_name = f"{model.__name__}.{file_format}"
+                    if file_name in paths_by_name:
+                        stream = stack.enter_context(opener(paths_by_name[file_name]))
+                        files[model] = (file_format, stream)
+            yield files
+
+    @staticmethod
+    def staging_table_name(model):
+        return f"staging_{model._meta.db_table}"
+
+    def copy_file_to_staging_table(self, cursor, model, file_format, stream):
+        qn = connection.ops.quote_name
+        table = model._meta.db_table
+        staging_table = self.staging_table_name(model)
+        cursor.execute(
+            f"""
+            drop table if exists {qn(staging_table)};
+            create temporary table {qn(staging_table)} (like {qn(table)} including defaults) on commit drop;
+            """
+        )
+
+        if file_format == "csv":
+            header = next(csv.reader([stream.readline().decode("utf-8-sig")]))
+            try:
+                fields = [model._meta.get_field(name) for name in header]
+            except FieldDoesNotExist as e:
+                raise CommandError(f"{model.__name__}.csv: {e}")
+            columns = ", ".join(qn(field.column) for field in fields)
+            # Unquoted empty strings are read as null, which is not what
+            # non-nullable text columns (e.g. blank uri) mean by them.
+            not_null_text_columns = ", ".join(
+                qn(field.column)
+                for field in fields
+                if isinstance(field, CharField) and not field.null
+            )
+            options = "format csv"
+            if not_null_text_columns:
+                options += f", force_not_null ({not_null_text_columns})"
+            cursor.copy_expert(
+                f"copy {qn(staging_table)} ({columns}) from stdin with ({options})",
+                stream,
+            )
+        else:
+            documents_table = f"{staging_table}_documents"
+            cursor.execute(
+                f"""
+                drop table if exists {qn(documents_table)};
+                create temporary table {qn(documents_table)} (doc jsonb) on commit drop;
+                """
+            )
+            cursor.copy_expert(
+                f"copy {qn(documents_table)} (doc) from stdin with ({JSONL_COPY_OPTIONS})",
+                stream,
+            )
+            fields = interchange_fields(model)
+            columns = ", ".join(qn(field.column) for field in fields)
+            expressions = []
+            for field in fields:
+                expression = f"(doc ->> '{field.name}')"
+                if isinstance(field, CharField) and not field.null:
+                    expression = f"coalesce({expression}, '')"
+                expressions.append(f"{expression}::{field.db_type(connection)}")
+            cursor.execute(
+                f"insert into {qn(staging_table)} ({columns}) select {', '.join(expressions)} from {qn(documents_table)}"
+            )
+
+    def check_staged_languages(self, cursor, staged_models):
+        if ListItemValue not in staged_models:
+            return
+        qn = connection.ops.quote_name
+        language_column = ListItemValue._meta.get_field("language").column
+        cursor.execute(
+            f"""
+            select distinct {qn(language_column)}
+            from {qn(self.staging_table_name(ListItemValue))}
+            where {qn(language_column)} is not null
+                and {qn(language_column)} not in (
+                    select code from {qn(models.Language._meta.db_table)}
+                )
+            """
+        )
+        missing_languages = [row[0] for row in cursor.fetchall()]
+        if missing_languages:
+            raise CommandError(
+                "Language(s) with code(s) {0} do not exist. Please create these languages before importing these data.".format(
+                    ", ".join(missing_languages)
+                )
+            )
+
+    def insert_staging_table(self, cursor, model):
+        qn = connection.ops.quote_name
+        columns = ", ".join(qn(field.column) for field in interchange_fields(model))
+        cursor.execute(
+            f"insert into {qn(model._meta.db_table)} ({columns}) select {columns} from {qn(self.staging_table_name(model))}"
+        )
+        return cursor.rowcount
+
+    def upsert_staging_table(self, cursor, model):
+        """Inserts new rows and updates existing rows (by id) only where the
+        content hash differs. Returns (staged, inserted, updated) counts."""
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        staging_table = qn(self.staging_table_name(model))
+        fields = interchange_fields(model)
+        columns = ", ".join(qn(field.column) for field in fields)
+        content_columns = [qn(f.column) for f in fields if not f.primary_key]
+        assignments = ", ".join(f"{col} = excluded.{col}" for col in content_columns)
+        existing_row = ", ".join(f"{table}.{col}" for col in content_columns)
+        excluded_row = ", ".join(f"excluded.{col}" for col in content_columns)
+        cursor.execute(
+            f"""
+            with upserted as (
+                insert into {table} ({columns})
+                select {columns} from {staging_table}
+                on conflict (id) do update set {assignments}
+                where md5(row({existing_row})::text) <> md5(row({excluded_row})::text)
+                returning (xmax = 0) as inserted
+            )
+            select
+                (select count(*) from {staging_table}),
+                count(*) filter (where inserted),
+                count(*) filter (where not inserted)
+            from upserted
+            """
+        )
+        return cursor.fetchone()
+
+    def match_staged_rows_to_existing(self, cursor, staged_models):
+        """Adopt the ids of existing rows that match staged rows on a natural
+        key, so that they are updated rather than conflicting on insert."""
+        qn = connection.ops.quote_name
+        item_table = qn(ListItem._meta.db_table)
+        value_table = qn(ListItemValue._meta.db_table)
+        staged_items = qn(self.staging_table_name(ListItem))
+        staged_values = qn(self.staging_table_name(ListItemValue))
+
+        if ListItem in staged_models:
+            cursor.execute(
+                f"""
+                drop table if exists staging_item_id_map;
+                create temporary table staging_item_id_map on commit drop as
+                select staged.id as staged_id, existing.id as existing_id
+                from {staged_items} staged
+                join {item_table} existing
+                    on existing.list_id = staged.list_id
+                    and existing.uri = staged.uri
+                    and existing.uri <> ''
+                where existing.id <> staged.id;
+
+                update {staged_items} staged set id = m.existing_id
+                from staging_item_id_map m where staged.id = m.staged_id;
+
+                update {staged_items} staged set parent_id = m.existing_id
+                from staging_item_id_map m where staged.parent_id = m.staged_id;
+                """
+            )
+            if ListItemValue in staged_models:
+                cursor.execute(
+                    f"""
+                    update {staged_values} staged set list_item_id = m.existing_id
+                    from staging_item_id_map m where staged.list_item_id = m.staged_id;
+                    """
+                )
+
+        if ListItemValue in staged_models:
+            # Same value (or same prefLabel language) on the same item.
+            cursor.execute(
+                f"""
+                update {staged_values} staged set id = existing.id
+                from {value_table} existing
+                where existing.list_item_id = staged.list_item_id
+                    and existing.valuetype_id = staged.valuetype_id
+                    and existing.languageid is not distinct from staged.languageid
+                    and existing.value = staged.value
+                    and existing.id <> staged.id;
+
+                update {staged_values} staged set id = existing.id
+                from {value_table} existing
+                where existing.list_item_id = staged.list_item_id
+                    and existing.valuetype_id = 'prefLabel'
+                    and staged.valuetype_id = 'prefLabel'
+                    and existing.languageid = staged.languageid
+                    and existing.id <> staged.id
+                    and not exists (
+                        select 1 from {staged_values} other where other.id = existing.id
+                    );
+                """
+            )
+
+    def delete_rows_missing_from_staging(self, cursor, staged_models):
+        """Within the imported lists, delete the items and values that are
+        absent from the import. Lists themselves are never deleted."""
+        qn = connection.ops.quote_name
+        item_table = qn(ListItem._meta.db_table)
+        value_table = qn(ListItemValue._meta.db_table)
+        metadata_table = qn(ListItemImageMetadata._meta.db_table)
+        staged_lists = qn(self.staging_table_name(List))
+        staged_items = qn(self.staging_table_name(ListItem))
+        staged_values = qn(self.staging_table_name(ListItemValue))
+
+        imported_list_ids = []
+        if List in staged_models:
+            imported_list_ids.append(f"select id from {staged_lists}")
+        if ListItem in staged_models:
+            imported_list_ids.append(f"select list_id from {staged_items}")
+        if not imported_list_ids:
+            return {}
+        cursor.execute(
+            f"""
+            drop table if exists staging_deleted_values, staging_deleted_items, staging_imported_lists;
+            create temporary table staging_deleted_values (id uuid) on commit drop;
+            create temporary table staging_deleted_items (id uuid) on commit drop;
+            create temporary table staging_imported_lists on commit drop as
+            {" union ".join(imported_list_ids)};
+            """
+        )
+
+        if ListItem in staged_models:
+            cursor.execute(
+                f"""
+                insert into staging_deleted_items
+                select id from {item_table}
+                where list_id in (select * from staging_imported_lists)
+                    and id not in (select id from {staged_items})
+                """
+            )
+        values_to_delete = [
+            "list_item_id in (select id from staging_deleted_items)",
+        ]
+        if ListItemValue in staged_models:
+            values_to_delete.append(
+                f"""(
+                    list_item_id in (
+                        select id from {item_table}
+                        where list_id in (select * from staging_imported_lists)
+                    )
+                    and id not in (select id from {staged_values})
+                )"""
+            )
+        cursor.execute(
+            f"""
+            insert into staging_deleted_values
+            select id from {value_table} where {" or ".join(values_to_delete)}
+            """
+        )
+
+        cursor.execute(
+            f"""
+            delete from {metadata_table}
+            where list_item_image_id in (select id from staging_deleted_values);
+            delete from {value_table}
+            where id in (select id from staging_deleted_values);
+            """
+        )
+        deleted_values = cursor.rowcount
+        cursor.execute(
+            f"delete from {item_table} where id in (select id from staging_deleted_items)"
+        )
+        deleted_items = cursor.rowcount
+        return {ListItem: deleted_items, ListItemValue: deleted_values}
+
+    def tombstoned_list_ids(self, file_format, stream):
+        header, rows = self.read_interchange_rows(ListTombstone, file_format, stream)
+        id_index = header.index("id")
+        return [row[id_index] for row in rows]
+
+    def delete_tombstoned_lists(self, list_ids):
+        """Deletes lists that were deleted on the exporting instance, along with
+        their items, values, and image metadata. Unknown ids are ignored."""
+        if not list_ids:
+            return
+        deleted = List.objects.filter(pk__in=list_ids).bulk_delete()
+        self.stdout.write("{0} deleted List(s) removed".format(deleted))
+
+    def generate_blank_staged_uris(self, cursor):
+        qn = connection.ops.quote_name
+        cursor.execute(
+            f"""
+            update {qn(ListItem._meta.db_table)}
+            set uri = %s || id::text
+            where uri = '' and id in (
+                select id from {qn(self.staging_table_name(ListItem))}
+            )
+            """,
+            [ListItem.generated_uri_prefix()],
+        )
+
+    def import_controlled_lists_from_skos(self, source):
+        """Streams a SKOS file into one new list per ConceptScheme. Values are
+        inserted in batches while the file is read; only a light (id, broader
+        uris, sort label) record per concept is kept until items are inserted."""
+        valuetypes = set(
+            models.DValueType.objects.filter(
+                category__in=("label", "note")
+            ).values_list("valuetype", flat=True)
+        )
+        languages = set(models.Language.objects.values_list("code", flat=True))
+        default_name = os.path.splitext(os.path.basename(source))[0]
+        max_name_length = List._meta.get_field("name").max_length
+
+        lists = {}  # scheme uri (None for concepts outside any scheme): List
+        concepts = defaultdict(dict)  # scheme uri: {uri: (id, broader, label)}
+        concept_uris = set()
+        parents_from_narrower = {}
+        unlabeled_uris = []
+        value_batch = []
+        value_count = 0
+        item_count = 0
+
+        with transaction.atomic():
+            for resource in SKOSReader(source).read():
+                if isinstance(resource, SKOSConceptScheme):
+                    if resource.uri not in lists:
+                        lists[resource.uri] = List.objects.create(name=default_name)
+                    if resource.labels:
+                        lists[resource.uri].name = self.preferred_value(
+                            resource.labels
+                        )[:max_name_length]
+                    continue
+
+                # Values of a concept are inserted as soon as it is read, so a
+                # concept cannot be completed by a later description.
+                if resource.uri in concept_uris:
+                    raise CommandError(
+                        f"The concept {resource.uri} is described more than once in {source}. Please describe each concept in one skos:Concept element."
+                    )
+                concept_uris.add(resource.uri)
+
+                scheme_uri = resource.schemes[0] if resource.schemes else None
+                if scheme_uri not in lists:
+                    lists[scheme_uri] = List.objects.create(name=default_name)
+
+                item_id = uuid.uuid4()
+                pref_labels = []
+                for valuetype, language, value in resource.values:
+                    if valuetype not in valuetypes:
+                        continue
+                    language = language or settings.LANGUAGE_CODE
+                    if language not in languages:
+                        raise CommandError(
+                            f"Language with code {language} does not exist. Please create this language before importing these data."
+                        )
+                    if valuetype == "prefLabel":
+                        pref_labels.append((language, value))
+                    value_batch.append(
+                        ListItemValue(
+                            list_item_id=item_id,
+                            valuetype_id=valuetype,
+                            language_id=language,
+                            value=value,
+                        )
+                    )
+                if not pref_labels:
+                    unlabeled_uris.append(resource.uri)
+                concepts[scheme_uri][resource.uri] = (
+                    item_id,
+                    resource.broader,
+                    self.preferred_value(pref_labels).lower(),
+                )
+                for narrower_uri in resource.narrower:
+                    parents_from_narrower.setdefault(narrower_uri, resource.uri)
+
+                if len(value_batch) >= SKOS_BATCH_SIZE:
+                    # Item foreign keys are checked at commit.
+                    ListItemValue.objects.bulk_create(value_batch)
+                    value_count += len(value_batch)
+                    value_batch.clear()
+
+            # Items need a preferred label (see ListItem.ensure_pref_label).
+            if unlabeled_uris:
+                raise CommandError(
+                    "These concepts have no skos:prefLabel in {0}: {1}".format(
+                        source, ", ".join(unlabeled_uris)
+                    )
+                )
+            ListItemValue.objects.bulk_create(value_batch)
+            value_count += len(value_batch)
+            List.objects.bulk_update(lists.values(), ["name"])
+
+            for scheme_uri, controlled_list in lists.items():
+                items = self.list_items_from_concepts(
+                    controlled_list, concepts[scheme_uri], parents_from_narrower
+                )
+                ListItem.objects.bulk_create(items, batch_size=SKOS_BATCH_SIZE)
+                item_count += len(items)
+
+        self.stdout.write(
+            "{0} items and {1} values imported into {2} list(s) from {3}".format(
+                item_count, value_count, len(lists), source
+            )
+        )
+
+    @staticmethod
+    def preferred_value(values_by_language):
+        """Value in the default language, else the first one, else ''."""
+        for language, value in values_by_language:
+            if language == settings.LANGUAGE_CODE:
+                return value
+        return values_by_language[0][1] if values_by_language else ""
+
+    @staticmethod
+    def list_items_from_concepts(controlled_list, concepts, parents_from_narrower):
+        """Like the collection migration, sort alphabetically within each
+        depth of the hierarchy. Polyhierarchies keep their first parent."""
+        parent_uris = {}
+        for uri, (unused_id, broader, unused_label) in concepts.items():
+            candidates = [*broader, parents_from_narrower.get(uri)]
+            parent_uris[uri] = next((c for c in candidates if c in concepts), None)
+
+        depths = {}
+        for uri in concepts:
+            while uri not in depths:
+                path = []
+                current = uri
+                while current is not None and current not in depths:
+                    if current in path:
+                        break
+                    path.append(current)
+                    current = parent_uris[current]
+                if current in path:
+                    # Break the cycle where it was found, then walk again.
+                    parent_uris[current] = None
+                    continue
+                depth = depths[current] if current is not None else -1
+                for visited in reversed(path):
+                    depth += 1
+                    depths[visited] = depth
+
+        ordered_uris = sorted(concepts, key=lambda uri: (depths[uri], concepts[uri][2]))
+        return [
+            ListItem(
+                id=concepts[uri][0],
+                uri=uri,
+                list=controlled_list,
+                sortorder=sortorder,
+                parent_id=(concepts[parent_uris[uri]][0] if parent_uris[uri] else None),
+            )
+            for sortorder, uri in enumerate(ordered_uris)
+        ]
+
+    def export_controlled_lists(
+        self, data_dest, file_name, interchange_format="xlsx", modified_since=None
+    ):
+        if modified_since:
+            if interchange_format in SKOS_FORMATS:
+                raise CommandError(
+                    "SKOS cannot record deleted lists. Please export changes with the xlsx, csv, or jsonl format."
+                )
+            # Read every table in one snapshot, so that the cutoff reported
+            # for the next delta export matches what was exported.
+            outermost = not connection.in_atomic_block
+            with transaction.atomic():
+                if outermost:
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            "set transaction isolation level repeatable read"
+                        )
+                cutoff = self.delta_export_cutoff()
+                self.stdout.write(
+                    "Exporting lists modified since {0}. Export changes since {1} next time.".format(
+                        modified_since.isoformat(), cutoff.isoformat()
+                    )
+                )
+                self.export_controlled_lists_in_format(
+                    data_dest, file_name, interchange_format, modified_since
+                )
+            return
+        self.export_controlled_lists_in_format(data_dest, file_name, interchange_format)
+
+    @staticmethod
+    def delta_export_cutoff():
+        """The time to export changes since next time, read from the database
+        clock that stamps List.modified. Rows are stamped when written but
+        become visible when committed, so the cutoff is moved back to the
+        start of the oldest transaction still in flight: anything it writes
+        is stamped later than that and is picked up by the next export."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                select least(
+                    statement_timestamp(),
+                    (
+                        select min(xact_start) from pg_stat_activity
+                        where datname = current_database()
+                        and pid <> pg_backend_pid()
+                        and state <> 'idle'
+                    )
+                )
+                """
+            )
+            return cursor.fetchone()[0]
+
+    def export_controlled_lists_in_format(
+        self, data_dest, file_name, interchange_format, modified_since=None
+    ):
+        if interchange_format in INTERCHANGE_FILE_FORMATS:
+            self.export_controlled_lists_to_files(
+                data_dest, file_name, interchange_format, modified_since
+            )
+            return
+        if interchange_format in SKOS_FORMATS:
+            self.export_controlled_lists_to_skos(
+                data_dest, file_name, interchange_format
+            )
+            return
+
         wb = openpyxl.Workbook()
         ws = wb.active
         ws.title = "List"
-        self.export_model_to_sheet(ws, List)
-        self.export_model_to_sheet(wb, ListItem)
-        self.export_model_to_sheet(wb, ListItemValue)
+        for model in self.exported_models(modified_since):
+            self.export_model_to_sheet(
+                ws if model is List else wb,
+                model,
+                self.exported_rows(model, modified_since),
+            )
 
         # if data_dest == ".":
         #     data_dest = os.path.dirname(settings.SYSTEM_SETTINGS_LOCAL_PATH)
@@ -161,7 +1172,29 @@ class Command(PackagesCommand):
                 "No destination directory specified. Please rerun this command with the '-d' parameter populated."
             )
 
-    def export_model_to_sheet(self, wb, model):
+    @staticmethod
+    def exported_models(modified_since=None):
+        if modified_since:
+            return (*INTERCHANGE_MODELS, ListTombstone)
+        return INTERCHANGE_MODELS
+
+    @staticmethod
+    def exported_rows(model, modified_since=None):
+        """All rows, or for a delta export, the lists modified since the given
+        time in full, and the lists deleted since then."""
+        if model is ListTombstone:
+            return ListTombstone.objects.filter(deleted__gt=modified_since)
+        if not modified_since:
+            return model.objects.all()
+        if model is List:
+            return List.objects.filter(modified__gt=modified_since)
+        if model is ListItem:
+            return ListItem.objects.filter(list__modified__gt=modified_since)
+        return ListItemValue.objects.filter(
+            list_item__list__modified__gt=modified_since
+        )
+
+    def export_model_to_sheet(self, wb, model, queryset=None):
         # For the first sheet (List), use blank sheet that is initiallized with workbook
         # otherwise, append a new sheet
         if isinstance(wb, openpyxl.worksheet.worksheet.Worksheet):
@@ -170,10 +1203,12 @@ class Command(PackagesCommand):
             ws = wb.create_sheet(title=model.__name__)
         fields = [
             {"name": field.name, "datatype": field.get_internal_type()}
-            for field in model._meta.fields
+            for field in interchange_fields(model)
         ]
         ws.append(field["name"] for field in fields)
-        for instance in model.objects.all():
+        if queryset is None:
+            queryset = model.objects.all()
+        for instance in queryset:
             row_data = []
             for field in fields:
                 value = getattr(instance, field["name"])
@@ -196,6 +1231,107 @@ class Command(PackagesCommand):
                     row_data.append("1" if value else "0")
                 elif field["datatype"] == "IntegerField":
                     row_data.append(str(value))
+                elif field["datatype"] == "DateTimeField":
+                    row_data.append(value.isoformat() if value else "")
                 else:
                     row_data.append(value if value else "")
             ws.append(row_data)
+
+    def export_controlled_lists_to_files(
+        self, data_dest, file_name, file_format, modified_since=None
+    ):
+        if data_dest == "" or data_dest == ".":
+            self.stdout.write(
+                "No destination directory specified. Please rerun this command with the '-d' parameter populated."
+            )
+            return
+
+        if file_name.endswith(".xlsx"):
+            file_name = file_name.removesuffix(".xlsx") + ".zip"
+        path = os.path.join(data_dest, file_name)
+
+        if file_name.endswith(".zip"):
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+                for model in self.exported_models(modified_since):
+                    with archive.open(f"{model.__name__}.{file_format}", "w") as f:
+                        self.copy_model_to_file(model, file_format, f, modified_since)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for model in self.exported_models(modified_since):
+                with open(
+                    os.path.join(path, f"{model.__name__}.{file_format}"), "wb"
+                ) as f:
+                    self.copy_model_to_file(model, file_format, f, modified_since)
+
+        self.stdout.write(f"Data exported successfully to {file_name}")
+
+    def copy_model_to_file(self, model, file_format, f, modified_since=None):
+        qn = connection.ops.quote_name
+        fields = interchange_fields(model)
+        if file_format == "csv":
+            # Mirror the xlsx export: field names as headers, booleans as 1/0.
+            selected = ", ".join(
+                (
+                    f"{qn(field.column)}::int as {qn(field.name)}"
+                    if isinstance(field, BooleanField)
+                    else f"{qn(field.column)} as {qn(field.name)}"
+                )
+                for field in fields
+            )
+            options = "format csv, header true"
+        else:
+            pairs = ", ".join(f"'{field.name}', {qn(field.column)}" for field in fields)
+            selected = f"json_build_object({pairs})"
+            options = JSONL_COPY_OPTIONS
+
+        pk_column = qn(model._meta.pk.column)
+        with connection.cursor() as cursor:
+            where = ""
+            if modified_since:
+                subquery, params = (
+                    self.exported_rows(model, modified_since)
+                    .values("pk")
+                    .query.sql_with_params()
+                )
+                where = cursor.mogrify(
+                    f"where {pk_column} in ({subquery})", params
+                ).decode()
+            cursor.copy_expert(
+                f"copy (select {selected} from {qn(model._meta.db_table)} {where} order by {pk_column}) to stdout with ({options})",
+                f,
+            )
+
+    def export_controlled_lists_to_skos(self, data_dest, file_name, file_format):
+        if data_dest == "" or data_dest == ".":
+            self.stdout.write(
+                "No destination directory specified. Please rerun this command with the '-d' parameter populated."
+            )
+            return
+
+        if file_name.endswith(".xlsx"):
+            file_name = file_name.removesuffix(".xlsx") + f".{file_format}"
+        with open(os.path.join(data_dest, file_name), "wb") as f:
+            SKOSWriter(f, rdf_format=SKOS_FORMATS[file_format]).write(
+                List.objects.order_by("name").iterator()
+            )
+
+        self.stdout.write(f"Data exported successfully to {file_name}")
+
+
+def initialize_worker():
+    if not apps.ready:
+        django.setup()
+
+
+def import_partition(partition, merge):
+    """Imports one partition of lists. Runs in a worker process."""
+    output = io.StringIO()
+    command = Command(stdout=output)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in INTERCHANGE_MODELS:
+            if model in partition:
+                command.copy_file_to_staging_table(
+                    cursor, model, "csv", Command.rows_as_csv(*partition[model])
+                )
+        command.load_staging_tables(cursor, list(partition), merge=merge)
+    return output.getvalue()
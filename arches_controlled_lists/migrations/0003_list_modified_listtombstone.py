@@ -0,0 +1,178 @@
+import textwrap
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_controlled_lists", "0002_etl_collections_to_controlled_lists"),
+    ]
+
+    # Statement-level triggers keep List.modified current for any write to a
+    # list, its items, or their values, including bulk and raw SQL writes.
+    add_modification_triggers = textwrap.dedent(
+        """
+        CREATE OR REPLACE FUNCTION __arches_controlled_lists_touch_list()
+        RETURNS trigger AS $$
+        BEGIN
+            NEW.modified := statement_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_controlled_lists_list_modified
+            BEFORE UPDATE ON arches_controlled_lists_list
+            FOR EACH ROW EXECUTE FUNCTION __arches_controlled_lists_touch_list();
+
+        CREATE OR REPLACE FUNCTION __arches_controlled_lists_record_tombstones()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO arches_controlled_lists_listtombstone (id, deleted)
+                SELECT id, statement_timestamp() FROM old_rows
+                ON CONFLICT (id) DO UPDATE SET deleted = excluded.deleted;
+            ELSE
+                DELETE FROM arches_controlled_lists_listtombstone
+                WHERE id IN (SELECT id FROM new_rows);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_controlled_lists_list_deleted
+            AFTER DELETE ON arches_controlled_lists_list
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_record_tombstones();
+
+        CREATE TRIGGER __arches_controlled_lists_list_inserted
+            AFTER INSERT ON arches_controlled_lists_list
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_record_tombstones();
+
+        CREATE OR REPLACE FUNCTION __arches_controlled_lists_touch_lists_of_items()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE arches_controlled_lists_list SET modified = statement_timestamp()
+                WHERE id IN (SELECT list_id FROM new_rows);
+            ELSIF TG_OP = 'DELETE' THEN
+                UPDATE arches_controlled_lists_list SET modified = statement_timestamp()
+                WHERE id IN (SELECT list_id FROM old_rows);
+            ELSE
+                UPDATE arches_controlled_lists_list SET modified = statement_timestamp()
+                WHERE id IN (
+                    SELECT list_id FROM new_rows UNION SELECT list_id FROM old_rows
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_controlled_lists_listitem_inserted
+            AFTER INSERT ON arches_controlled_lists_listitem
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_touch_lists_of_items();
+
+        CREATE TRIGGER __arches_controlled_lists_listitem_updated
+            AFTER UPDATE ON arches_controlled_lists_listitem
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_touch_lists_of_items();
+
+        CREATE TRIGGER __arches_controlled_lists_listitem_deleted
+            AFTER DELETE ON arches_controlled_lists_listitem
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_touch_lists_of_items();
+
+        CREATE OR REPLACE FUNCTION __arches_controlled_lists_touch_lists_of_values()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE arches_controlled_lists_list SET modified = statement_timestamp()
+                WHERE id IN (
+                    SELECT item.list_id FROM arches_controlled_lists_listitem item
+                    JOIN new_rows ON new_rows.list_item_id = item.id
+                );
+            ELSIF TG_OP = 'DELETE' THEN
+                UPDATE arches_controlled_lists_list SET modified = statement_timestamp()
+                WHERE id IN (
+                    SELECT item.list_id FROM arches_controlled_lists_listitem item
+                    JOIN old_rows ON old_rows.list_item_id = item.id
+                );
+            ELSE
+                UPDATE arches_controlled_lists_list SET modified = statement_timestamp()
+                WHERE id IN (
+                    SELECT item.list_id FROM arches_controlled_lists_listitem item
+                    JOIN (
+                        SELECT list_item_id FROM new_rows
+                        UNION SELECT list_item_id FROM old_rows
+                    ) changed ON changed.list_item_id = item.id
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_controlled_lists_listitemvalue_inserted
+            AFTER INSERT ON arches_controlled_lists_listitemvalue
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_touch_lists_of_values();
+
+        CREATE TRIGGER __arches_controlled_lists_listitemvalue_updated
+            AFTER UPDATE ON arches_controlled_lists_listitemvalue
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_touch_lists_of_values();
+
+        CREATE TRIGGER __arches_controlled_lists_listitemvalue_deleted
+            AFTER DELETE ON arches_controlled_lists_listitemvalue
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_touch_lists_of_values();
+        """
+    )
+
+    remove_modification_triggers = textwrap.dedent(
+        """
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemvalue_deleted ON arches_controlled_lists_listitemvalue;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemvalue_updated ON arches_controlled_lists_listitemvalue;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemvalue_inserted ON arches_controlled_lists_listitemvalue;
+        DROP FUNCTION IF EXISTS __arches_controlled_lists_touch_lists_of_values();
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitem_deleted ON arches_controlled_lists_listitem;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitem_updated ON arches_controlled_lists_listitem;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitem_inserted ON arches_controlled_lists_listitem;
+        DROP FUNCTION IF EXISTS __arches_controlled_lists_touch_lists_of_items();
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_list_inserted ON arches_controlled_lists_list;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_list_deleted ON arches_controlled_lists_list;
+        DROP FUNCTION IF EXISTS __arches_controlled_lists_record_tombstones();
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_list_modified ON arches_controlled_lists_list;
+        DROP FUNCTION IF EXISTS __arches_controlled_lists_touch_list();
+        """
+    )
+
+    operations = [
+        migrations.AddField(
+            model_name="list",
+            name="modified",
+            field=models.DateTimeField(
+                auto_now=True,
+                db_default=django.db.models.functions.datetime.Now(),
+            ),
+        ),
+        migrations.CreateModel(
+            name="ListTombstone",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                (
+                    "deleted",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now(),
+                        db_index=True,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunSQL(add_modification_triggers, remove_modification_triggers),
+    ]
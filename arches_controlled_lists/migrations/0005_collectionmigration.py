@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_controlled_lists", "0004_migrate_requested_collections_only"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CollectionMigration",
+            fields=[
+                (
+                    "collection",
+                    models.TextField(primary_key=True, serialize=False),
+                ),
+                ("item_count", models.IntegerField()),
+                ("value_count", models.IntegerField()),
+                ("migrated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
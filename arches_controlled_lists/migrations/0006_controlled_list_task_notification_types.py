@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_controlled_lists", "0005_collectionmigration"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            INSERT INTO notification_types (typeid, name, emailtemplate, emailnotify, webnotify)
+            VALUES (
+                'a2c1e5f0-58d1-4b0e-9a43-7b0e3c5d2f61',
+                'Controlled List Task Complete',
+                'email/package_load_complete_email_notification.htm',
+                true,
+                true
+            ), (
+                'c7d94b2e-0f36-4e8a-8d15-2e6a9f4b7c03',
+                'Controlled List Export Ready',
+                'email/download_ready_email_notification.htm',
+                true,
+                true
+            );
+            """,
+            """
+            DELETE FROM notification_types
+                WHERE typeid in (
+                    'a2c1e5f0-58d1-4b0e-9a43-7b0e3c5d2f61',
+                    'c7d94b2e-0f36-4e8a-8d15-2e6a9f4b7c03'
+                );
+            """,
+        ),
+    ]
@@ -0,0 +1,237 @@
+import textwrap
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_controlled_lists", "0006_controlled_list_task_notification_types"),
+    ]
+
+    # Statement-level triggers append every write, including bulk and raw SQL
+    # writes, to the change log. Values that are images are logged as such.
+    add_change_triggers = textwrap.dedent(
+        """
+        CREATE OR REPLACE FUNCTION __arches_controlled_lists_log_list_changes()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id)
+                SELECT 'list', id, 'insert', id FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id)
+                SELECT 'list', id, 'delete', id FROM old_rows;
+            ELSE
+                -- Ignore updates that only touch List.modified.
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id)
+                SELECT 'list', new_rows.id, 'update', new_rows.id
+                FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id
+                WHERE (new_rows.name, new_rows.dynamic, new_rows.search_only)
+                    IS DISTINCT FROM (old_rows.name, old_rows.dynamic, old_rows.search_only);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_controlled_lists_list_changes_inserted
+            AFTER INSERT ON arches_controlled_lists_list
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_list_changes();
+
+        CREATE TRIGGER __arches_controlled_lists_list_changes_updated
+            AFTER UPDATE ON arches_controlled_lists_list
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_list_changes();
+
+        CREATE TRIGGER __arches_controlled_lists_list_changes_deleted
+            AFTER DELETE ON arches_controlled_lists_list
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_list_changes();
+
+        CREATE OR REPLACE FUNCTION __arches_controlled_lists_log_item_changes()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id, list_item_id)
+                SELECT 'listitem', id, 'delete', list_id, id FROM old_rows;
+            ELSE
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id, list_item_id)
+                SELECT 'listitem', id, lower(TG_OP), list_id, id FROM new_rows;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_controlled_lists_listitem_changes_inserted
+            AFTER INSERT ON arches_controlled_lists_listitem
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_item_changes();
+
+        CREATE TRIGGER __arches_controlled_lists_listitem_changes_updated
+            AFTER UPDATE ON arches_controlled_lists_listitem
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_item_changes();
+
+        CREATE TRIGGER __arches_controlled_lists_listitem_changes_deleted
+            AFTER DELETE ON arches_controlled_lists_listitem
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_item_changes();
+
+        CREATE OR REPLACE FUNCTION __arches_controlled_lists_log_value_changes()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id, list_item_id)
+                SELECT
+                    CASE WHEN value.valuetype_id = 'image' THEN 'listitemimage' ELSE 'listitemvalue' END,
+                    value.id, 'delete', item.list_id, value.list_item_id
+                FROM old_rows value
+                LEFT JOIN arches_controlled_lists_listitem item ON item.id = value.list_item_id;
+            ELSE
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id, list_item_id)
+                SELECT
+                    CASE WHEN value.valuetype_id = 'image' THEN 'listitemimage' ELSE 'listitemvalue' END,
+                    value.id, lower(TG_OP), item.list_id, value.list_item_id
+                FROM new_rows value
+                LEFT JOIN arches_controlled_lists_listitem item ON item.id = value.list_item_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_controlled_lists_listitemvalue_changes_inserted
+            AFTER INSERT ON arches_controlled_lists_listitemvalue
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_value_changes();
+
+        CREATE TRIGGER __arches_controlled_lists_listitemvalue_changes_updated
+            AFTER UPDATE ON arches_controlled_lists_listitemvalue
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_value_changes();
+
+        CREATE TRIGGER __arches_controlled_lists_listitemvalue_changes_deleted
+            AFTER DELETE ON arches_controlled_lists_listitemvalue
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_value_changes();
+
+        CREATE OR REPLACE FUNCTION __arches_controlled_lists_log_metadata_changes()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id, list_item_id)
+                SELECT 'listitemimagemetadata', metadata.id, 'delete', item.list_id, value.list_item_id
+                FROM old_rows metadata
+                LEFT JOIN arches_controlled_lists_listitemvalue value ON value.id = metadata.list_item_image_id
+                LEFT JOIN arches_controlled_lists_listitem item ON item.id = value.list_item_id;
+            ELSE
+                INSERT INTO arches_controlled_lists_listchange
+                    (model, object_id, operation, list_id, list_item_id)
+                SELECT 'listitemimagemetadata', metadata.id, lower(TG_OP), item.list_id, value.list_item_id
+                FROM new_rows metadata
+                LEFT JOIN arches_controlled_lists_listitemvalue value ON value.id = metadata.list_item_image_id
+                LEFT JOIN arches_controlled_lists_listitem item ON item.id = value.list_item_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_controlled_lists_listitemimagemetadata_changes_inserted
+            AFTER INSERT ON arches_controlled_lists_listitemimagemetadata
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_metadata_changes();
+
+        CREATE TRIGGER __arches_controlled_lists_listitemimagemetadata_changes_updated
+            AFTER UPDATE ON arches_controlled_lists_listitemimagemetadata
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_metadata_changes();
+
+        CREATE TRIGGER __arches_controlled_lists_listitemimagemetadata_changes_deleted
+            AFTER DELETE ON arches_controlled_lists_listitemimagemetadata
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_controlled_lists_log_metadata_changes();
+        """
+    )
+
+    remove_change_triggers = textwrap.dedent(
+        """
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemimagemetadata_changes_deleted ON arches_controlled_lists_listitemimagemetadata;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemimagemetadata_changes_updated ON arches_controlled_lists_listitemimagemetadata;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemimagemetadata_changes_inserted ON arches_controlled_lists_listitemimagemetadata;
+        DROP FUNCTION IF EXISTS __arches_controlled_lists_log_metadata_changes();
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemvalue_changes_deleted ON arches_controlled_lists_listitemvalue;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemvalue_changes_updated ON arches_controlled_lists_listitemvalue;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitemvalue_changes_inserted ON arches_controlled_lists_listitemvalue;
+        DROP FUNCTION IF EXISTS __arches_controlled_lists_log_value_changes();
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitem_changes_deleted ON arches_controlled_lists_listitem;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitem_changes_updated ON arches_controlled_lists_listitem;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_listitem_changes_inserted ON arches_controlled_lists_listitem;
+        DROP FUNCTION IF EXISTS __arches_controlled_lists_log_item_changes();
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_list_changes_deleted ON arches_controlled_lists_list;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_list_changes_updated ON arches_controlled_lists_list;
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_list_changes_inserted ON arches_controlled_lists_list;
+        DROP FUNCTION IF EXISTS __arches_controlled_lists_log_list_changes();
+        """
+    )
+
+    # Existing rows are logged as inserts, so that a client can build its copy
+    # from the feed alone, starting from cursor 0.
+    log_existing_rows = textwrap.dedent(
+        """
+        INSERT INTO arches_controlled_lists_listchange
+            (model, object_id, operation, list_id)
+        SELECT 'list', id, 'insert', id FROM arches_controlled_lists_list;
+
+        INSERT INTO arches_controlled_lists_listchange
+            (model, object_id, operation, list_id, list_item_id)
+        SELECT 'listitem', id, 'insert', list_id, id
+        FROM arches_controlled_lists_listitem
+        ORDER BY list_id, sortorder;
+
+        INSERT INTO arches_controlled_lists_listchange
+            (model, object_id, operation, list_id, list_item_id)
+        SELECT
+            CASE WHEN value.valuetype_id = 'image' THEN 'listitemimage' ELSE 'listitemvalue' END,
+            value.id, 'insert', item.list_id, value.list_item_id
+        FROM arches_controlled_lists_listitemvalue value
+        JOIN arches_controlled_lists_listitem item ON item.id = value.list_item_id;
+
+        INSERT INTO arches_controlled_lists_listchange
+            (model, object_id, operation, list_id, list_item_id)
+        SELECT 'listitemimagemetadata', metadata.id, 'insert', item.list_id, value.list_item_id
+        FROM arches_controlled_lists_listitemimagemetadata metadata
+        JOIN arches_controlled_lists_listitemvalue value ON value.id = metadata.list_item_image_id
+        JOIN arches_controlled_lists_listitem item ON item.id = value.list_item_id;
+        """
+    )
+
+    operations = [
+        migrations.CreateModel(
+            name="ListChange",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("model", models.CharField(max_length=32)),
+                ("object_id", models.UUIDField()),
+                ("operation", models.CharField(max_length=6)),
+                ("list_id", models.UUIDField(null=True)),
+                ("list_item_id", models.UUIDField(null=True)),
+                (
+                    "changed",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now()
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunSQL(log_existing_rows, migrations.RunSQL.noop),
+        migrations.RunSQL(add_change_triggers, remove_change_triggers),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_controlled_lists", "0007_listchange"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listchange",
+            index=models.Index(
+                fields=["list_id", "id"], name="listchange_list_revision"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listchange",
+            index=models.Index(
+                fields=["list_item_id", "id"], name="listchange_item_revision"
+            ),
+        ),
+    ]
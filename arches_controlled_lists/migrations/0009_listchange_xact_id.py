@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+import arches_controlled_lists.querysets
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_controlled_lists", "0008_listchange_revision_indexes"),
+    ]
+
+    # Existing changes are all given this migration's transaction, which
+    # orders them by id, before any change written afterwards.
+    operations = [
+        migrations.AddField(
+            model_name="listchange",
+            name="xact_id",
+            field=models.BigIntegerField(
+                db_default=arches_controlled_lists.querysets.CurrentTransactionId()
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="listchange",
+            name="listchange_list_revision",
+        ),
+        migrations.RemoveIndex(
+            model_name="listchange",
+            name="listchange_item_revision",
+        ),
+        migrations.AddIndex(
+            model_name="listchange",
+            index=models.Index(fields=["xact_id", "id"], name="listchange_feed"),
+        ),
+        migrations.AddIndex(
+            model_name="listchange",
+            index=models.Index(
+                fields=["list_id", "xact_id", "id"], name="listchange_list_revision"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listchange",
+            index=models.Index(
+                fields=["list_item_id", "xact_id", "id"],
+                name="listchange_item_revision",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listchange",
+            index=models.Index(
+                fields=["object_id", "xact_id", "id"], name="listchange_object"
+            ),
+        ),
+    ]
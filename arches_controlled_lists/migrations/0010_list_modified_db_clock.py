@@ -0,0 +1,37 @@
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_controlled_lists", "0009_listchange_xact_id"),
+    ]
+
+    # Inserts, like updates, are stamped by the database clock, which delta
+    # exports compare against (not the app server's clock, as with auto_now).
+    stamp_inserts = """
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_list_modified ON arches_controlled_lists_list;
+        CREATE TRIGGER __arches_controlled_lists_list_modified
+            BEFORE INSERT OR UPDATE ON arches_controlled_lists_list
+            FOR EACH ROW EXECUTE FUNCTION __arches_controlled_lists_touch_list();
+        """
+
+    stamp_updates = """
+        DROP TRIGGER IF EXISTS __arches_controlled_lists_list_modified ON arches_controlled_lists_list;
+        CREATE TRIGGER __arches_controlled_lists_list_modified
+            BEFORE UPDATE ON arches_controlled_lists_list
+            FOR EACH ROW EXECUTE FUNCTION __arches_controlled_lists_touch_list();
+        """
+
+    operations = [
+        migrations.AlterField(
+            model_name="list",
+            name="modified",
+            field=models.DateTimeField(
+                db_default=django.db.models.functions.datetime.Now(),
+                editable=False,
+            ),
+        ),
+        migrations.RunSQL(stamp_inserts, stamp_updates),
+    ]
@@ -1,22 +1,29 @@
 import datetime
+import hashlib
+import posixpath
 import uuid
 from collections import defaultdict
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models, transaction
-from django.db.models import Deferrable, Q
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Deferrable, Min, Q, Subquery
+from django.db.models.functions import Now
 from django.utils.translation import gettext_lazy as _
 
 from arches.app.models.models import DValueType, Language, Node
 from arches.app.models.utils import field_names
 from arches_controlled_lists.querysets import (
+    CurrentTransactionId,
+    ListChangeQuerySet,
     ListQuerySet,
     ListItemImageManager,
+    ListItemQuerySet,
     ListItemValueQuerySet,
     NodeQuerySet,
 )
+from arches_controlled_lists.thumbnails import image_urls
 
 
 class List(models.Model):
@@ -24,6 +31,9 @@ class List(models.Model):
     name = models.CharField(max_length=127, null=False, blank=True)
     dynamic = models.BooleanField(default=False)
     search_only = models.BooleanField(default=False)
+    # Stamped by database triggers on any write to the list, its items or
+    # their values, with the database clock (see delta exports).
+    modified = models.DateTimeField(db_default=Now(), editable=False)
 
     objects = ListQuerySet.as_manager()
 
@@ -37,9 +47,22 @@ class List(models.Model):
                 sep=" ", timespec="seconds"
             )
 
-    def serialize(self, depth_map=None, flat=False, permitted_nodegroups=None):
+    def serialize(
+        self,
+        depth_map=None,
+        flat=False,
+        permitted_nodegroups=None,
+        include_images=True,
+    ):
         if depth_map is None:
             depth_map = defaultdict(int)
+        # Sort orders are sparse: serialize their dense rank.
+        rank_map = {
+            item.pk: rank
+            for rank, item in enumerate(
+                sorted(self.list_items.all(), key=lambda item: item.sortorder)
+            )
+        }
         data = {
             "id": str(self.id),
             "name": self.name,
@@ -47,7 +70,7 @@ class List(models.Model):
             "search_only": self.search_only,
             "items": sorted(
                 [
-                    item.serialize(depth_map, flat)
+                    item.serialize(depth_map, flat, rank_map, include_images)
                     for item in self.list_items.all()
                     if flat or item.parent_id is None
                 ],
@@ -122,6 +145,119 @@ class List(models.Model):
             reordered_items, fields=["sortorder", "parent_id", "list_id"]
         )
 
+    def clone(self, name=None):
+        """Copies the list, with all its items, values, images (sharing their
+        files) and image metadata, with one INSERT ... SELECT per table."""
+        with transaction.atomic(), connection.cursor() as cursor:
+            clone = List(
+                name=name or _("Copy of {name}").format(name=self.name),
+                dynamic=self.dynamic,
+                search_only=self.search_only,
+            )
+            clone.full_clean()
+            clone.save()
+            cursor.execute(
+                """
+                DROP TABLE IF EXISTS temp_subtree;
+                CREATE TEMPORARY TABLE temp_subtree ON COMMIT DROP AS
+                SELECT
+                    id AS old_id,
+                    uuid_generate_v4() AS new_id,
+                    row_number() OVER (ORDER BY sortorder) AS rank
+                FROM arches_controlled_lists_listitem
+                WHERE list_id = %s;
+                """,
+                [self.pk],
+            )
+            ListItem._copy_mapped_items(cursor, clone.pk)
+        return clone
+
+    def rebalance_sortorder(self, gap=None):
+        """Spreads the items' sort orders evenly, restoring the gaps consumed
+        by ListItem.move(). The order of the items is unchanged."""
+        if gap is None:
+            gap = ListItem.SORTORDER_GAP
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE arches_controlled_lists_listitem AS item
+                SET sortorder = ranked.rank * %(gap)s
+                FROM (
+                    SELECT id, row_number() OVER (ORDER BY sortorder) AS rank
+                    FROM arches_controlled_lists_listitem
+                    WHERE list_id = %(list_id)s
+                ) AS ranked
+                WHERE item.id = ranked.id
+                    AND item.sortorder <> ranked.rank * %(gap)s;
+                """,
+                {"gap": gap, "list_id": self.pk},
+            )
+
+
+class ListTombstone(models.Model):
+    """Records deleted lists (by database trigger) for delta exports."""
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    deleted = models.DateTimeField(db_default=Now(), db_index=True)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class ListChange(models.Model):
+    """Append-only log of writes to lists, items, values, images and image
+    metadata, recorded by database triggers. The id is the cursor of the
+    change feed (ListChangesView), which is ordered by transaction, then id
+    (see ListChangeQuerySet)."""
+
+    id = models.BigAutoField(primary_key=True)
+    # Lowercase model name, e.g. "listitemvalue"
+    model = models.CharField(max_length=32)
+    object_id = models.UUIDField()
+    # "insert", "update" or "delete"
+    operation = models.CharField(max_length=6)
+    list_id = models.UUIDField(null=True)
+    list_item_id = models.UUIDField(null=True)
+    changed = models.DateTimeField(db_default=Now())
+    # The writing transaction, which orders changes by commit (see
+    # ListChangeQuerySet.settled)
+    xact_id = models.BigIntegerField(db_default=CurrentTransactionId())
+
+    objects = ListChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["xact_id", "id"], name="listchange_feed"),
+            # Revisions of lists and items (see ListChangeQuerySet.revision)
+            models.Index(
+                fields=["list_id", "xact_id", "id"], name="listchange_list_revision"
+            ),
+            models.Index(
+                fields=["list_item_id", "xact_id", "id"],
+                name="listchange_item_revision",
+            ),
+            # Compaction (see ListChangeQuerySet.compact)
+            models.Index(
+                fields=["object_id", "xact_id", "id"], name="listchange_object"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.operation} {self.model} {self.object_id}"
+
+
+class CollectionMigration(models.Model):
+    """Checkpoint of a collection migrated to a controlled list, so that an
+    interrupted migration of several collections can be resumed."""
+
+    collection = models.TextField(primary_key=True)
+    item_count = models.IntegerField()
+    value_count = models.IntegerField()
+    migrated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.collection
+
 
 class ListItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -137,6 +273,11 @@ class ListItem(models.Model):
     )
     guide = models.BooleanField(default=False)
 
+    objects = ListItemQuerySet.as_manager()
+
+    # Sort orders are sparse, so that moving an item only updates its row.
+    SORTORDER_GAP = 1024
+
     class Meta:
         constraints = [
             # Sort order concerns the list as a whole, not subsets
@@ -173,10 +314,16 @@ class ListItem(models.Model):
         if not self.id:
             raise RuntimeError("URI generation attempted without a primary key.")
 
+        return self.generated_uri_prefix() + str(self.id)
+
+    @staticmethod
+    def generated_uri_prefix():
+        """Generated URIs are this prefix followed by the item id. Also
+        useful for generating URIs in bulk (SQL)."""
         parts = [settings.PUBLIC_SERVER_ADDRESS.rstrip("/")]
         if settings.FORCE_SCRIPT_NAME:
             parts.append(settings.FORCE_SCRIPT_NAME)
-        parts += ["plugins", "controlled-list-manager", "item", str(self.id)]
+        parts += ["plugins", "controlled-list-manager", "item", ""]
 
         return "/".join(parts)
 
@@ -184,37 +331,427 @@ class ListItem(models.Model):
         if not self.list_item_values.filter(valuetype="prefLabel").exists():
             raise ValidationError(_("At least one preferred label is required."))
 
-    def serialize(self, depth_map=None, flat=False):
+    def move(self, parent_id=None, position=0, after_id=None):
+        """Moves the item under `parent_id` (or to the top level), either
+        after the sibling `after_id` or to `position` among the siblings.
+        The item and its descendants are given sort orders in the gap
+        they move to (see _sortorder_bounds); other items are updated only
+        if the list has run out of gaps and must be rebalanced.
+
+        Returns the dense sortorders (as serialized) that changed."""
+        with transaction.atomic():
+            # Concurrent moves and inserts would otherwise take the same gap.
+            List.objects.select_for_update().get(pk=self.list_id)
+            if parent_id:
+                self._check_new_parent(parent_id)
+            if after_id is None:
+                after_id = self._previous_sibling(parent_id, position)
+            elif (
+                not ListItem.objects.filter(
+                    pk=after_id, list_id=self.list_id, parent_id=parent_id
+                )
+                .exclude(pk=self.pk)
+                .exists()
+            ):
+                raise ValidationError(
+                    _("Items can only be moved after their new siblings.")
+                )
+            # Read under the lock, in case the item was moved meanwhile.
+            old_rank = ListItem.objects.filter(
+                list_id=self.list_id,
+                sortorder__lt=Subquery(
+                    ListItem.objects.filter(pk=self.pk).values("sortorder")
+                ),
+            ).count()
+            subtree_ids = self._subtree_ids()
+
+            lower, upper = self._sortorder_bounds(parent_id, after_id, subtree_ids)
+            if upper - lower <= len(subtree_ids):
+                List(pk=self.list_id).rebalance_sortorder(
+                    gap=max(self.SORTORDER_GAP, 2 * len(subtree_ids))
+                )
+                lower, upper = self._sortorder_bounds(parent_id, after_id, subtree_ids)
+            step = (upper - lower) // (len(subtree_ids) + 1)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE arches_controlled_lists_listitem AS item
+                    SET sortorder = %(lower)s + subtree.rank * %(step)s,
+                        parent_id = CASE
+                            WHEN item.id = %(item_id)s THEN %(parent_id)s::uuid
+                            ELSE item.parent_id
+                        END
+                    FROM unnest(%(subtree_ids)s::uuid[])
+                        WITH ORDINALITY AS subtree(id, rank)
+                    WHERE item.id = subtree.id;
+                    """,
+                    {
+                        "lower": lower,
+                        "step": step,
+                        "item_id": self.pk,
+                        "parent_id": parent_id,
+                        "subtree_ids": subtree_ids,
+                    },
+                )
+            self.parent_id = parent_id
+            self.sortorder = lower + step
+
+            return self._ranks_since(old_rank, len(subtree_ids))
+
+    def _subtree_ids(self):
+        """The ids of the item and its descendants, in sort order."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE subtree AS (
+                    SELECT id, sortorder
+                    FROM arches_controlled_lists_listitem
+                    WHERE id = %s
+                    UNION
+                    SELECT item.id, item.sortorder
+                    FROM arches_controlled_lists_listitem AS item
+                    JOIN subtree ON item.parent_id = subtree.id
+                )
+                SELECT id FROM subtree ORDER BY sortorder;
+                """,
+                [self.pk],
+            )
+            return [item_id for (item_id,) in cursor.fetchall()]
+
+    def _check_new_parent(self, parent_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE ancestors AS (
+                    SELECT id, parent_id, list_id
+                    FROM arches_controlled_lists_listitem
+                    WHERE id = %s
+                    UNION
+                    SELECT item.id, item.parent_id, item.list_id
+                    FROM arches_controlled_lists_listitem AS item
+                    JOIN ancestors ON item.id = ancestors.parent_id
+                )
+                SELECT id, list_id FROM ancestors;
+                """,
+                [parent_id],
+            )
+            ancestors = cursor.fetchall()
+        if not ancestors or ancestors[0][1] != self.list_id:
+            raise ValidationError(_("Parent items must belong to the same list."))
+        if any(ancestor_id == self.pk for ancestor_id, unused in ancestors):
+            raise ValidationError(_("Recursive structure detected."))
+
+    def _previous_sibling(self, parent_id, position):
+        if position <= 0:
+            return None
+        siblings = list(
+            ListItem.objects.filter(list_id=self.list_id, parent_id=parent_id)
+            .exclude(pk=self.pk)
+            .order_by("sortorder")
+            .values_list("pk", flat=True)[:position]
+        )
+        return siblings[-1] if siblings else None
+
+    def _sortorder_bounds(self, parent_id, previous_id, subtree_ids):
+        """The sort orders the item's subtree must fall strictly between:
+        after the previous sibling (or the parent) and before whatever item
+        follows it. Where the list is depth-first, the subtree also goes
+        after the previous sibling's descendants, to keep it depth-first;
+        otherwise (e.g. lists migrated from collections, which are ordered
+        breadth-first) only the siblings' order is relied on."""
+        siblings = ListItem.objects.filter(
+            list_id=self.list_id, parent_id=parent_id
+        ).exclude(pk__in=subtree_ids)
+        if previous_id:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    WITH RECURSIVE subtree AS (
+                        SELECT id, sortorder
+                        FROM arches_controlled_lists_listitem
+                        WHERE id = %(previous_id)s
+                        UNION
+                        SELECT item.id, item.sortorder
+                        FROM arches_controlled_lists_listitem AS item
+                        JOIN subtree ON item.parent_id = subtree.id
+                        WHERE item.id <> %(item_id)s
+                    )
+                    SELECT
+                        min(sortorder) FILTER (WHERE id = %(previous_id)s),
+                        max(sortorder)
+                    FROM subtree;
+                    """,
+                    {"previous_id": previous_id, "item_id": self.pk},
+                )
+                floor, lower = cursor.fetchone()
+        else:
+            floor = -1
+            if parent_id:
+                lower = ListItem.objects.values_list("sortorder", flat=True).get(
+                    pk=parent_id
+                )
+            else:
+                lower = floor
+
+        if lower != floor:
+            next_sibling = siblings.filter(sortorder__gt=floor).aggregate(
+                Min("sortorder")
+            )["sortorder__min"]
+            if next_sibling is not None and lower >= next_sibling:
+                lower = floor
+
+        upper = (
+            ListItem.objects.filter(list_id=self.list_id, sortorder__gt=lower)
+            .exclude(pk__in=subtree_ids)
+            .aggregate(Min("sortorder"))["sortorder__min"]
+        )
+        if upper is None:
+            upper = lower + (len(subtree_ids) + 1) * self.SORTORDER_GAP
+        return lower, upper
+
+    def move_subtree(self, list_id, parent_id=None):
+        """Moves the item and its descendants to the end of another (or the
+        same) list, under `parent_id`. Values, images and metadata follow by
+        foreign key, so one UPDATE does it. URIs are kept."""
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._map_subtree(cursor, list_id, parent_id)
+            try:
+                with transaction.atomic():
+                    cursor.execute(
+                        """
+                        UPDATE arches_controlled_lists_listitem AS item
+                        SET list_id = %(list_id)s,
+                            sortorder = base.sortorder + subtree.rank * %(gap)s,
+                            parent_id = CASE
+                                WHEN item.id = %(item_id)s THEN %(parent_id)s::uuid
+                                ELSE item.parent_id
+                            END
+                        FROM temp_subtree AS subtree, (
+                            SELECT coalesce(max(sortorder), 0) AS sortorder
+                            FROM arches_controlled_lists_listitem
+                            WHERE list_id = %(list_id)s
+                        ) AS base
+                        WHERE item.id = subtree.old_id;
+                        """,
+                        {
+                            "list_id": list_id,
+                            "parent_id": parent_id,
+                            "item_id": self.pk,
+                            "gap": self.SORTORDER_GAP,
+                        },
+                    )
+            except IntegrityError as e:
+                raise ValidationError(ListItem.violation_error_message(e)) from e
+        self.refresh_from_db()
+
+    def copy_subtree(self, list_id, parent_id=None):
+        """Copies the item and its descendants, with their values, images and
+        image metadata, to the end of another (or the same) list, under
+        `parent_id`, with one INSERT per table. The copies are new items, so
+        they get new generated URIs. Images share their files.
+
+        Returns the copy of this item."""
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._map_subtree(cursor, list_id, parent_id)
+            self._copy_mapped_items(cursor, list_id, parent_id)
+            cursor.execute(
+                "SELECT new_id FROM temp_subtree WHERE old_id = %s;", [self.pk]
+            )
+            (copy_id,) = cursor.fetchone()
+        return ListItem.objects.get(pk=copy_id)
+
+    @staticmethod
+    def _copy_mapped_items(cursor, list_id, parent_id=None):
+        """Copies the items in temp_subtree, with their values, images and
+        image metadata, to the end of a list: the new roots under
+        `parent_id`. Copies get new generated URIs."""
+        cursor.execute(
+            """
+            INSERT INTO arches_controlled_lists_listitem
+                (id, uri, list_id, sortorder, parent_id, guide)
+            SELECT
+                subtree.new_id,
+                %(uri_prefix)s || subtree.new_id::text,
+                %(list_id)s,
+                base.sortorder + subtree.rank * %(gap)s,
+                coalesce(parent.new_id, %(parent_id)s::uuid),
+                item.guide
+            FROM temp_subtree AS subtree
+            JOIN arches_controlled_lists_listitem AS item
+                ON item.id = subtree.old_id
+            LEFT JOIN temp_subtree AS parent
+                ON parent.old_id = item.parent_id
+            CROSS JOIN (
+                SELECT coalesce(max(sortorder), 0) AS sortorder
+                FROM arches_controlled_lists_listitem
+                WHERE list_id = %(list_id)s
+            ) AS base;
+
+            DROP TABLE IF EXISTS temp_subtree_values;
+            CREATE TEMPORARY TABLE temp_subtree_values ON COMMIT DROP AS
+            SELECT
+                value.id AS old_id,
+                uuid_generate_v4() AS new_id,
+                subtree.new_id AS new_item_id
+            FROM arches_controlled_lists_listitemvalue AS value
+            JOIN temp_subtree AS subtree ON subtree.old_id = value.list_item_id;
+
+            INSERT INTO arches_controlled_lists_listitemvalue
+                (id, list_item_id, valuetype_id, languageid, value)
+            SELECT
+                subtree_value.new_id,
+                subtree_value.new_item_id,
+                value.valuetype_id,
+                value.languageid,
+                value.value
+            FROM temp_subtree_values AS subtree_value
+            JOIN arches_controlled_lists_listitemvalue AS value
+                ON value.id = subtree_value.old_id;
+
+            INSERT INTO arches_controlled_lists_listitemimagemetadata
+                (id, list_item_image_id, languageid, metadata_type, value)
+            SELECT
+                uuid_generate_v4(),
+                subtree_value.new_id,
+                metadata.languageid,
+                metadata.metadata_type,
+                metadata.value
+            FROM arches_controlled_lists_listitemimagemetadata AS metadata
+            JOIN temp_subtree_values AS subtree_value
+                ON subtree_value.old_id = metadata.list_item_image_id;
+            """,
+            {
+                "uri_prefix": ListItem.generated_uri_prefix(),
+                "list_id": list_id,
+                "parent_id": parent_id,
+                "gap": ListItem.SORTORDER_GAP,
+            },
+        )
+
+    def _map_subtree(self, cursor, list_id, parent_id):
+        """Creates temp_subtree: the ids of the item and its descendants, new
+        ids for copies, and their rank in the list's order."""
+        # Locked, as the subtree is appended after the list's greatest sort
+        # order (see move()).
+        if not List.objects.select_for_update().filter(pk=list_id):
+            raise ValidationError(_("The list does not exist."))
+        cursor.execute(
+            """
+            DROP TABLE IF EXISTS temp_subtree;
+            CREATE TEMPORARY TABLE temp_subtree ON COMMIT DROP AS
+            WITH RECURSIVE subtree AS (
+                SELECT id, sortorder
+                FROM arches_controlled_lists_listitem
+                WHERE id = %s
+                UNION
+                SELECT item.id, item.sortorder
+                FROM arches_controlled_lists_listitem AS item
+                JOIN subtree ON item.parent_id = subtree.id
+            )
+            SELECT
+                id AS old_id,
+                uuid_generate_v4() AS new_id,
+                row_number() OVER (ORDER BY sortorder) AS rank
+            FROM subtree;
+            """,
+            [self.pk],
+        )
+        if parent_id:
+            cursor.execute(
+                """
+                SELECT
+                    item.list_id,
+                    EXISTS (SELECT FROM temp_subtree WHERE old_id = item.id)
+                FROM arches_controlled_lists_listitem AS item
+                WHERE item.id = %s;
+                """,
+                [parent_id],
+            )
+            parent = cursor.fetchone()
+            if not parent or str(parent[0]) != str(list_id):
+                raise ValidationError(_("Parent items must belong to the same list."))
+            if parent[1]:
+                raise ValidationError(_("Recursive structure detected."))
+
+    @staticmethod
+    def violation_error_message(error):
+        """The message of the constraint an IntegrityError violated."""
+        for model in (ListItem, ListItemValue, ListItemImageMetadata):
+            for constraint in model._meta.constraints:
+                if constraint.name in str(error):
+                    return str(constraint.violation_error_message)
+        return str(error)
+
+    def _ranks_since(self, old_rank, subtree_size=1):
+        """The dense sortorders from the item's old or new rank, whichever is
+        first, to the end of its subtree at the other, which are the only
+        ones a move changes."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH ranked AS (
+                    SELECT id, row_number() OVER (ORDER BY sortorder) - 1 AS rank
+                    FROM arches_controlled_lists_listitem
+                    WHERE list_id = %(list_id)s
+                ), moved AS (
+                    SELECT rank FROM ranked WHERE id = %(item_id)s
+                )
+                SELECT ranked.id, ranked.rank
+                FROM ranked, moved
+                WHERE ranked.rank
+                    BETWEEN least(%(old_rank)s, moved.rank)
+                    AND greatest(%(old_rank)s, moved.rank) + %(subtree_size)s - 1;
+                """,
+                {
+                    "list_id": self.list_id,
+                    "item_id": self.pk,
+                    "old_rank": old_rank,
+                    "subtree_size": subtree_size,
+                },
+            )
+            return dict(cursor.fetchall())
+
+    def serialize(self, depth_map=None, flat=False, rank_map=None, include_images=True):
+        """Without images, the item has an image count instead, taken from
+        its (prefetched) values, which include the image rows."""
         if depth_map is None:
             depth_map = defaultdict(int)
         if self.parent_id:
             depth_map[self.id] = depth_map[self.parent_id] + 1
+        values = self.list_item_values.all()
         data = {
             "id": str(self.id),
             "list_id": str(self.list_id),
             "uri": self.uri,
-            "sortorder": self.sortorder,
+            "sortorder": (self.sortorder if rank_map is None else rank_map[self.id]),
             "guide": self.guide,
             "values": [
-                value.serialize()
-                for value in self.list_item_values.all()
-                if value.valuetype_id != "image"
+                value.serialize() for value in values if value.valuetype_id != "image"
             ],
-            "images": [image.serialize() for image in self.list_item_images.all()],
+            "image_count": sum(1 for value in values if value.valuetype_id == "image"),
             "parent_id": str(self.parent_id) if self.parent_id else None,
             "depth": depth_map[self.id],
         }
+        if include_images:
+            data["images"] = [
+                image.serialize() for image in self.list_item_images.all()
+            ]
         if not flat:
             data["children"] = sorted(
-                [child.serialize(depth_map, flat) for child in self.children.all()],
+                [
+                    child.serialize(depth_map, flat, rank_map, include_images)
+                    for child in self.children.all()
+                ],
                 key=lambda d: d["sortorder"],
             )
         return data
 
-    def build_tile_value(self):
+    def build_tile_value(self, labels=None):
+        if labels is None:
+            labels = self.list_item_values.labels()
         tile_value = {
             "uri": self.uri or self.generate_uri(),
-            "labels": [label.serialize() for label in self.list_item_values.labels()],
+            "labels": [label.serialize() for label in labels],
             "list_id": str(self.list_id),
         }
         return tile_value
@@ -318,11 +855,39 @@ class ListItemImage(models.Model):
         managed = False
         db_table = "arches_controlled_lists_listitemvalue"
 
-    def serialize(self):
+    @staticmethod
+    def content_hash(file):
+        digest = hashlib.sha256()
+        for chunk in file.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def content_addressed_name(cls, content_hash, extension):
+        """Images are stored once per content (SHA-256) hash, e.g.
+        list_item_images/<hash>.png, and shared by the items they are
+        attached to. Files are deleted once no image refers to them
+        (tasks.delete_unreferenced_files)."""
+        upload_to = cls._meta.get_field("value").upload_to
+        return posixpath.join(upload_to, content_hash + extension.lower())
+
+    @staticmethod
+    def lock_stored_file(name):
+        """Serializes attaching images to, and deleting, the stored file
+        until the end of the transaction, so that a file is not deleted
+        (tasks.delete_unreferenced_files) as an image is attached to it."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", [name])
+
+    def serialize(self, urls=None):
+        """urls maps stored file names to URLs, e.g. from storage_urls() for
+        a batch of images; by default this image's URLs are looked up."""
+        url, thumbnails = image_urls(self.value.name, urls)
         return {
             "id": str(self.id),
             "list_item_id": str(self.list_item_id),
-            "url": self.value.url,
+            "url": url,
+            "thumbnails": thumbnails,
             "metadata": [
                 metadata.serialize() for metadata in self.list_item_image_metadata.all()
             ],
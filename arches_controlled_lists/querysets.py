@@ -1,9 +1,43 @@
 from django.contrib.postgres.expressions import ArraySubquery
-from django.db import models
+from django.db import connection, models, transaction
 from django.db.models.fields.json import KT
+from django.db.models import Exists, OuterRef, Q
 from django.db.models.functions import Cast
 
 
+def _delete_values_of_items(cursor, items_sql, params):
+    """Deletes the image metadata, then the values, of the items selected by
+    `items_sql`, and returns the file names of the deleted images. Each table
+    is deleted from in its own statement, before the items: the change log
+    triggers of values and metadata, which fire at the end of a statement,
+    find their list through the rows of the tables above them."""
+    cursor.execute(
+        f"""
+        DELETE FROM arches_controlled_lists_listitemimagemetadata
+        WHERE list_item_image_id IN (
+            SELECT id FROM arches_controlled_lists_listitemvalue
+            WHERE list_item_id IN ({items_sql})
+        );
+        """,
+        params,
+    )
+    cursor.execute(
+        f"""
+        WITH deleted_values AS (
+            DELETE FROM arches_controlled_lists_listitemvalue
+            WHERE list_item_id IN ({items_sql})
+            RETURNING valuetype_id, value
+        )
+        SELECT ARRAY(
+            SELECT value FROM deleted_values WHERE valuetype_id = 'image'
+        );
+        """,
+        params,
+    )
+    (file_names,) = cursor.fetchone()
+    return file_names
+
+
 class ListQuerySet(models.QuerySet):
     def annotate_node_fields(self, **kwargs):
         from arches_controlled_lists.models import NodeProxy
@@ -29,6 +63,169 @@ class ListQuerySet(models.QuerySet):
 
         return qs
 
+    def lock_with_max_sortorder(self):
+        """Locks the lists (in a transaction), so that concurrent inserts and
+        moves cannot take the same sort orders, and annotates their greatest
+        sort order. The lock is taken separately: FOR UPDATE cannot be
+        combined with the aggregate."""
+        list(self.select_for_update().order_by("pk").values_list("pk"))
+        return self.annotate(
+            max_sortorder=models.Max("list_items__sortorder", default=0)
+        )
+
+    def bulk_delete(self):
+        """Deletes the lists with their items, values and image metadata in
+        a few statements, instead of collecting every row for Django's
+        cascade. Image files no longer referenced are deleted after commit."""
+        from arches_controlled_lists.tasks import delete_files_on_commit
+
+        list_ids = list(self.values_list("pk", flat=True))
+        if not list_ids:
+            return 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            file_names = _delete_values_of_items(
+                cursor,
+                """
+                SELECT id FROM arches_controlled_lists_listitem
+                WHERE list_id = ANY(%(list_ids)s::uuid[])
+                """,
+                {"list_ids": list_ids},
+            )
+            cursor.execute(
+                """
+                WITH deleted_items AS (
+                    DELETE FROM arches_controlled_lists_listitem
+                    WHERE list_id = ANY(%(list_ids)s::uuid[])
+                ), deleted_lists AS (
+                    DELETE FROM arches_controlled_lists_list
+                    WHERE id = ANY(%(list_ids)s::uuid[])
+                    RETURNING id
+                )
+                SELECT count(*) FROM deleted_lists;
+                """,
+                {"list_ids": list_ids},
+            )
+            (deleted,) = cursor.fetchone()
+        delete_files_on_commit(file_names)
+        return deleted
+
+
+class CurrentTransactionId(models.Func):
+    """The id of the current transaction, which is assigned if need be."""
+
+    template = "pg_current_xact_id()::text::bigint"
+    output_field = models.BigIntegerField()
+
+
+class AssignedTransactionId(models.Func):
+    """The id of the current transaction, or NULL if it has not written."""
+
+    template = "pg_current_xact_id_if_assigned()::text::bigint"
+    output_field = models.BigIntegerField()
+
+
+class SnapshotXmin(models.Func):
+    """The id of the oldest transaction in progress when the statement's
+    snapshot was taken. Every transaction before it has ended."""
+
+    template = "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+    output_field = models.BigIntegerField()
+
+
+class ListChangeQuerySet(models.QuerySet):
+    """Changes are ordered by transaction, then id. Ids are drawn when a
+    change is written, not when it is committed, so a change can become
+    visible after one with a later id; ordered by transaction, the changes
+    before those of the oldest transaction in progress are final."""
+
+    def settled(self):
+        """The changes no transaction in progress can be ordered before,
+        and those of the current transaction, which sees its own writes."""
+        return self.filter(
+            Q(xact_id__lt=SnapshotXmin()) | Q(xact_id=AssignedTransactionId())
+        )
+
+    def in_order(self):
+        return self.order_by("xact_id", "id")
+
+    def after(self, cursor):
+        """The changes after the change with id `cursor`, or all of them for
+        cursor 0. Raises ListChange.DoesNotExist if that change was
+        compacted away."""
+        if not cursor:
+            return self
+        xact_id = self.model.objects.values_list("xact_id", flat=True).get(pk=cursor)
+        return self.filter(Q(xact_id__gt=xact_id) | Q(xact_id=xact_id, id__gt=cursor))
+
+    def revision(self):
+        """The cursor of the latest of these changes that is settled, or 0 if
+        there are none."""
+        return (
+            self.settled()
+            .order_by("-xact_id", "-id")
+            .values_list("id", flat=True)
+            .first()
+        ) or 0
+
+    def compact(self, before):
+        """Deletes the changes made before `before` that a later change to
+        the same object supersedes, so the log grows with the number of
+        objects rather than of writes. Reading the feed from cursor 0 still
+        gives the state of every object. Returns the number deleted."""
+        later = self.model.objects.filter(
+            Q(xact_id__gt=OuterRef("xact_id"))
+            | Q(xact_id=OuterRef("xact_id"), id__gt=OuterRef("id")),
+            model=OuterRef("model"),
+            object_id=OuterRef("object_id"),
+        )
+        deleted, unused = self.filter(changed__lt=before).filter(Exists(later)).delete()
+        return deleted
+
+
+class ListItemQuerySet(models.QuerySet):
+    def bulk_delete(self):
+        """Deletes the items and all their descendants, with their values and
+        image metadata. The recursive cascade is resolved by a recursive CTE
+        rather than by Django's collector. Image files no longer referenced
+        are deleted after commit."""
+        from arches_controlled_lists.tasks import delete_files_on_commit
+
+        item_ids = list(self.values_list("pk", flat=True))
+        if not item_ids:
+            return 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE subtree AS (
+                    SELECT id
+                    FROM arches_controlled_lists_listitem
+                    WHERE id = ANY(%(item_ids)s::uuid[])
+                    UNION
+                    SELECT item.id
+                    FROM arches_controlled_lists_listitem AS item
+                    JOIN subtree ON item.parent_id = subtree.id
+                )
+                SELECT ARRAY(SELECT id FROM subtree);
+                """,
+                {"item_ids": item_ids},
+            )
+            (subtree_ids,) = cursor.fetchone()
+            file_names = _delete_values_of_items(
+                cursor,
+                "SELECT unnest(%(subtree_ids)s::uuid[])",
+                {"subtree_ids": subtree_ids},
+            )
+            cursor.execute(
+                """
+                DELETE FROM arches_controlled_lists_listitem
+                WHERE id = ANY(%(subtree_ids)s::uuid[]);
+                """,
+                {"subtree_ids": subtree_ids},
+            )
+            deleted = cursor.rowcount
+        delete_files_on_commit(file_names)
+        return deleted
+
 
 class ListItemValueQuerySet(models.QuerySet):
     def values_without_images(self):
@@ -251,6 +251,16 @@ RATE_LIMIT = "5/m"
 # Sets default max upload size to 15MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 15728640
 
+# Longest side, in pixels, of the thumbnails generated for list item images
+CONTROLLED_LIST_THUMBNAIL_SIZES = {"small": 64, "medium": 256}
+
+# Days of changes kept in full in the controlled list change log. Older
+# changes superseded by later ones are compacted away daily.
+CONTROLLED_LIST_CHANGE_RETENTION_DAYS = 30
+
+# Largest image, in bytes, that can be uploaded in chunks to a list item
+CONTROLLED_LIST_MAX_IMAGE_UPLOAD_SIZE = 100 * 1024 * 1024
+
 # Unique session cookie ensures that logins are treated separately for each app
 SESSION_COOKIE_NAME = "arches_controlled_lists"
 
@@ -329,6 +339,14 @@ CELERY_BEAT_SCHEDULE = {
         "schedule": CELERY_SEARCH_EXPORT_CHECK,
         "args": ("Celery Beat is Running",),
     },
+    "compact-controlled-list-changes": {
+        "task": "arches_controlled_lists.tasks.compact_list_changes",
+        "schedule": 24 * 3600,
+    },
+    "delete-stale-controlled-list-image-uploads": {
+        "task": "arches_controlled_lists.tasks.delete_stale_image_uploads",
+        "schedule": 3600,
+    },
 }
 
 # Set to True if you want to send celery tasks to the broker without being able to detect celery.
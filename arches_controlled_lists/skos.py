@@ -0,0 +1,255 @@
+"""Streaming SKOS reading and writing for controlled lists.
+
+RDF/XML is read incrementally and both RDF/XML and Turtle are written
+incrementally, so memory use does not grow with the number of values.
+"""
+
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from xml.sax.saxutils import XMLGenerator
+
+from django.conf import settings
+
+from arches_controlled_lists.models import ListItem, ListItemValue
+
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+SKOS = "http://www.w3.org/2004/02/skos/core#"
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+# SKOS properties that have a counterpart value type in Arches.
+SKOS_VALUETYPES = (
+    "prefLabel",
+    "altLabel",
+    "hiddenLabel",
+    "scopeNote",
+    "definition",
+    "example",
+    "historyNote",
+    "editorialNote",
+    "changeNote",
+    "note",
+)
+
+RDF_XML_EXTENSIONS = (".rdf", ".xml", ".owl")
+RDFLIB_EXTENSIONS = (".ttl", ".nt", ".n3")
+SKOS_EXTENSIONS = RDF_XML_EXTENSIONS + RDFLIB_EXTENSIONS
+
+
+@dataclass
+class SKOSConcept:
+    uri: str
+    # (valuetype, language, value)
+    values: list[tuple[str, str | None, str]] = field(default_factory=list)
+    broader: list[str] = field(default_factory=list)
+    narrower: list[str] = field(default_factory=list)
+    schemes: list[str] = field(default_factory=list)
+
+
+@dataclass
+class SKOSConceptScheme:
+    uri: str
+    labels: list[tuple[str | None, str]] = field(default_factory=list)
+
+
+class SKOSReader:
+    """Yields ConceptSchemes and Concepts one at a time from a SKOS file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        if self.path.lower().endswith(RDF_XML_EXTENSIONS):
+            yield from self._read_rdf_xml()
+        else:
+            yield from self._read_with_rdflib()
+
+    def _read_rdf_xml(self):
+        depth = 0
+        root = None
+        for event, elem in ET.iterparse(self.path, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            # Top-level resource descriptions are children of rdf:RDF.
+            if depth == 1:
+                resource = self._resource_from_element(elem)
+                if resource:
+                    yield resource
+                root.clear()
+
+    def _resource_from_element(self, elem):
+        uri = elem.get(f"{{{RDF}}}about")
+        if not uri:
+            return None
+        types = {elem.tag} | {
+            child.get(f"{{{RDF}}}resource")
+            for child in elem
+            if child.tag == f"{{{RDF}}}type"
+        }
+        if f"{{{SKOS}}}ConceptScheme" in types or f"{SKOS}ConceptScheme" in types:
+            scheme = SKOSConceptScheme(uri=uri)
+            for child in elem:
+                if child.tag == f"{{{SKOS}}}prefLabel" and child.text:
+                    scheme.labels.append((child.get(XML_LANG), child.text))
+            return scheme
+        if f"{{{SKOS}}}Concept" not in types and f"{SKOS}Concept" not in types:
+            return None
+
+        concept = SKOSConcept(uri=uri)
+        for child in elem:
+            if not child.tag.startswith(f"{{{SKOS}}}"):
+                continue
+            predicate = child.tag.removeprefix(f"{{{SKOS}}}")
+            if predicate in SKOS_VALUETYPES and child.text:
+                concept.values.append((predicate, child.get(XML_LANG), child.text))
+            elif predicate == "broader":
+                concept.broader.append(child.get(f"{{{RDF}}}resource"))
+            elif predicate == "narrower":
+                concept.narrower.append(child.get(f"{{{RDF}}}resource"))
+            elif predicate in ("inScheme", "topConceptOf"):
+                concept.schemes.append(child.get(f"{{{RDF}}}resource"))
+        return concept
+
+    def _read_with_rdflib(self):
+        """Turtle & friends cannot be parsed incrementally, so the whole
+        graph is held in memory while concepts are yielded."""
+        from rdflib import Graph, Namespace, URIRef
+        from rdflib.namespace import RDF as RDF_NS
+
+        skos = Namespace(SKOS)
+        graph = Graph()
+        graph.parse(self.path)
+
+        for subject in graph.subjects(RDF_NS.type, skos.ConceptScheme):
+            yield SKOSConceptScheme(
+                uri=str(subject),
+                labels=[
+                    (label.language, str(label))
+                    for label in graph.objects(subject, skos.prefLabel)
+                ],
+            )
+
+        for subject in graph.subjects(RDF_NS.type, skos.Concept):
+            if not isinstance(subject, URIRef):
+                continue
+            concept = SKOSConcept(uri=str(subject))
+            for valuetype in SKOS_VALUETYPES:
+                for literal in graph.objects(subject, skos[valuetype]):
+                    concept.values.append(
+                        (valuetype, getattr(literal, "language", None), str(literal))
+                    )
+            concept.broader = [str(o) for o in graph.objects(subject, skos.broader)]
+            concept.narrower = [str(o) for o in graph.objects(subject, skos.narrower)]
+            concept.schemes = [
+                str(o)
+                for predicate in (skos.inScheme, skos.topConceptOf)
+                for o in graph.objects(subject, predicate)
+            ]
+            yield concept
+
+
+class SKOSWriter:
+    """Writes controlled lists as SKOS ConceptSchemes, one item at a time."""
+
+    def __init__(self, stream, rdf_format="xml"):
+        self.stream = stream
+        self.rdf_format = rdf_format
+
+    @staticmethod
+    def scheme_uri(controlled_list):
+        list_prefix = ListItem.generated_uri_prefix().removesuffix("item/") + "list/"
+        return list_prefix + str(controlled_list.pk)
+
+    def write(self, controlled_lists):
+        if self.rdf_format == "xml":
+            self._write_rdf_xml(controlled_lists)
+        else:
+            self._write_turtle(controlled_lists)
+
+    def _iter_concepts(self, controlled_list):
+        """Merge-join items and their values, both ordered by item id."""
+        items = (
+            ListItem.objects.filter(list=controlled_list)
+            .order_by("pk")
+            .values_list("pk", "uri", "parent__uri")
+            .iterator()
+        )
+        values = (
+            ListItemValue.objects.values_without_images()
+            .filter(list_item__list=controlled_list, valuetype__in=SKOS_VALUETYPES)
+            .order_by("list_item_id", "valuetype_id", "language_id")
+            .values_list("list_item_id", "valuetype_id", "language_id", "value")
+            .iterator()
+        )
+        pending_value = next(values, None)
+        for item_id, uri, parent_uri in items:
+            item_values = []
+            while pending_value and pending_value[0] == item_id:
+                item_values.append(pending_value[1:])
+                pending_value = next(values, None)
+            yield uri, parent_uri, item_values
+
+    def _write_rdf_xml(self, controlled_lists):
+        xml = XMLGenerator(self.stream, encoding="utf-8", short_empty_elements=True)
+        xml.startDocument()
+        xml.startElement("rdf:RDF", {"xmlns:rdf": RDF, "xmlns:skos": SKOS})
+        for controlled_list in controlled_lists:
+            scheme_uri = self.scheme_uri(controlled_list)
+            xml.startElement("skos:ConceptScheme", {"rdf:about": scheme_uri})
+            xml.startElement("skos:prefLabel", {"xml:lang": settings.LANGUAGE_CODE})
+            xml.characters(controlled_list.name)
+            xml.endElement("skos:prefLabel")
+            xml.endElement("skos:ConceptScheme")
+
+            for uri, parent_uri, item_values in self._iter_concepts(controlled_list):
+                xml.startElement("skos:Concept", {"rdf:about": uri})
+                xml.startElement("skos:inScheme", {"rdf:resource": scheme_uri})
+                xml.endElement("skos:inScheme")
+                for valuetype, language, value in item_values:
+                    xml.startElement(f"skos:{valuetype}", {"xml:lang": language})
+                    xml.characters(value)
+                    xml.endElement(f"skos:{valuetype}")
+                if parent_uri:
+                    xml.startElement("skos:broader", {"rdf:resource": parent_uri})
+                    xml.endElement("skos:broader")
+                else:
+                    xml.startElement("skos:topConceptOf", {"rdf:resource": scheme_uri})
+                    xml.endElement("skos:topConceptOf")
+                xml.endElement("skos:Concept")
+        xml.endElement("rdf:RDF")
+        xml.endDocument()
+
+    def _write_turtle(self, controlled_lists):
+        def literal(value, language):
+            escaped = (
+                value.replace("\\", "\\\\")
+                .replace('"', '\\"')
+                .replace("\n", "\\n")
+                .replace("\r", "\\r")
+            )
+            return f'"{escaped}"@{language}'
+
+        def write(line):
+            self.stream.write((line + "\n").encode("utf-8"))
+
+        write(f"@prefix skos: <{SKOS}> .")
+        for controlled_list in controlled_lists:
+            scheme_uri = self.scheme_uri(controlled_list)
+            write("")
+            write(f"<{scheme_uri}> a skos:ConceptScheme ;")
+            write(
+                f"    skos:prefLabel {literal(controlled_list.name, settings.LANGUAGE_CODE)} ."
+            )
+            for uri, parent_uri, item_values in self._iter_concepts(controlled_list):
+                write("")
+                write(f"<{uri}> a skos:Concept ;")
+                write(f"    skos:inScheme <{scheme_uri}> ;")
+                for valuetype, language, value in item_values:
+                    write(f"    skos:{valuetype} {literal(value, language)} ;")
+                if parent_uri:
+                    write(f"    skos:broader <{parent_uri}> .")
+                else:
+                    write(f"    skos:topConceptOf <{scheme_uri}> .")
@@ -12,11 +12,41 @@ import type {
     ControlledListItemImage,
     ControlledListItemImageMetadata,
     NewControlledListItem,
+    NewControlledListItemBatchEntry,
     NewOrExistingControlledListItemImageMetadata,
     NewValue,
     Value,
 } from "@/arches_controlled_lists/types";
 
+export class ConflictError extends Error {
+    // Changes made by someone else since the revision sent, in the same
+    // format as the change feed.
+    changes: object[];
+
+    constructor(message: string, changes: object[]) {
+        super(message);
+        this.changes = changes;
+    }
+}
+
+function revisionHeaders(revision: number | undefined) {
+    const headers: Record<string, string> = { "X-CSRFToken": getToken() };
+    if (revision !== undefined) {
+        headers["If-Match"] = `"${revision}"`;
+    }
+    return headers;
+}
+
+function responseRevision(response: Response) {
+    const etag = response.headers.get("ETag");
+    return etag ? parseInt(etag.replace(/"/g, "")) : undefined;
+}
+
+async function conflictError(response: Response) {
+    const parsed = await response.json();
+    return new ConflictError(parsed.message, parsed.changes);
+}
+
 function getToken() {
     const token = Cookies.get("csrftoken");
     if (!token) {
@@ -42,6 +72,22 @@ export const fetchLists = async (
     }
 };
 
+export const fetchChanges = async (since: number = 0) => {
+    const params = new URLSearchParams({ since: since.toString() });
+    const response = await fetch(
+        `${arches.urls.controlled_list_changes}?${params}`,
+    );
+    try {
+        const parsed = await response.json();
+        if (response.ok) {
+            return parsed;
+        }
+        throw new Error(parsed.message);
+    } catch (error) {
+        throw new Error((error as Error).message || response.statusText);
+    }
+};
+
 export const createList = async (name: string) => {
     const response = await fetch(arches.urls.controlled_list_add, {
         method: "POST",
@@ -59,6 +105,23 @@ export const createList = async (name: string) => {
     }
 };
 
+export const cloneList = async (list: ControlledList, name?: string) => {
+    const response = await fetch(arches.urls.controlled_list_clone(list.id), {
+        method: "POST",
+        headers: { "X-CSRFToken": getToken() },
+        body: JSON.stringify({ name }),
+    });
+    try {
+        const parsed = await response.json();
+        if (response.ok) {
+            return parsed;
+        }
+        throw new Error(parsed.message);
+    } catch (error) {
+        throw new Error((error as Error).message || response.statusText);
+    }
+};
+
 export const createItem = async (item: NewControlledListItem) => {
     const response = await fetch(arches.urls.controlled_list_item_add, {
         method: "POST",
@@ -76,18 +139,42 @@ export const createItem = async (item: NewControlledListItem) => {
     }
 };
 
+export const createItems = async (
+    listId: string,
+    items: NewControlledListItemBatchEntry[],
+) => {
+    const response = await fetch(arches.urls.controlled_list_items_add, {
+        method: "POST",
+        headers: { "X-CSRFToken": getToken() },
+        body: JSON.stringify({ list_id: listId, items }),
+    });
+    try {
+        const parsed = await response.json();
+        if (response.ok) {
+            return parsed;
+        }
+        throw new Error(parsed.message);
+    } catch (error) {
+        throw new Error((error as Error).message || response.statusText);
+    }
+};
+
 export const patchItem = async (
     item: ControlledListItem,
     field: "uri" | "guide",
 ) => {
     const response = await fetch(arches.urls.controlled_list_item(item.id), {
         method: "PATCH",
-        headers: { "X-CSRFToken": getToken() },
+        headers: revisionHeaders(item.revision),
         body: JSON.stringify({ [field]: item[field] }),
     });
     if (response.ok) {
+        item.revision = responseRevision(response);
         return true;
     }
+    if (response.status === 409) {
+        throw await conflictError(response);
+    }
     try {
         const error = await response.json();
         throw new Error(error.message);
@@ -119,12 +206,16 @@ export const patchList = async (
 
     const response = await fetch(arches.urls.controlled_list(list.id), {
         method: "PATCH",
-        headers: { "X-CSRFToken": getToken() },
+        headers: revisionHeaders(list.revision),
         body: JSON.stringify(body),
     });
     if (response.ok) {
+        list.revision = responseRevision(response);
         return true;
     }
+    if (response.status === 409) {
+        throw await conflictError(response);
+    }
     try {
         const error = await response.json();
         throw new Error(error.message);
@@ -133,6 +224,61 @@ export const patchList = async (
     }
 };
 
+export const moveItem = async (
+    item: ControlledListItem,
+    afterId: string | null,
+) => {
+    const response = await fetch(arches.urls.controlled_list(item.list_id), {
+        method: "PATCH",
+        headers: { "X-CSRFToken": getToken() },
+        body: JSON.stringify({
+            move: {
+                item_id: item.id,
+                parent_id: item.parent_id,
+                after_id: afterId,
+            },
+        }),
+    });
+    try {
+        const parsed = await response.json();
+        if (response.ok) {
+            return parsed;
+        }
+        throw new Error(parsed.message);
+    } catch (error) {
+        throw new Error((error as Error).message || response.statusText);
+    }
+};
+
+export const moveOrCopySubtree = async (
+    item: ControlledListItem,
+    operation: "move" | "copy",
+    listId: string,
+    parentId: string | null,
+) => {
+    const response = await fetch(
+        arches.urls.controlled_list_item_subtree(item.id),
+        {
+            method: "POST",
+            headers: { "X-CSRFToken": getToken() },
+            body: JSON.stringify({
+                operation,
+                list_id: listId,
+                parent_id: parentId,
+            }),
+        },
+    );
+    try {
+        const parsed = await response.json();
+        if (response.ok) {
+            return parsed;
+        }
+        throw new Error(parsed.message);
+    } catch (error) {
+        throw new Error((error as Error).message || response.statusText);
+    }
+};
+
 export const deleteLists = async (listIds: string[]) => {
     const promises = listIds.map((id) =>
         fetch(arches.urls.controlled_list(id), {
@@ -202,6 +348,26 @@ export const upsertValue = async (value: Value | NewValue) => {
     }
 };
 
+export const upsertAndDeleteValues = async (
+    upsert: (Value | NewValue)[],
+    deleteIds: string[] = [],
+) => {
+    const response = await fetch(arches.urls.controlled_list_item_values, {
+        method: "POST",
+        headers: { "X-CSRFToken": getToken() },
+        body: JSON.stringify({ upsert, delete: deleteIds }),
+    });
+    try {
+        const parsed = await response.json();
+        if (response.ok) {
+            return parsed;
+        }
+        throw new Error(parsed.message);
+    } catch (error) {
+        throw new Error((error as Error).message || response.statusText);
+    }
+};
+
 export const deleteValue = async (value: Value) => {
     const response = await fetch(
         arches.urls.controlled_list_item_value(value.id),
@@ -265,6 +431,122 @@ export const deleteMetadata = async (
     }
 };
 
+export const fetchItemImages = async (itemIds: string[]) => {
+    const params = new URLSearchParams();
+    itemIds.forEach((itemId) => params.append("item_id", itemId));
+    const response = await fetch(
+        `${arches.urls.controlled_list_item_images}?${params}`,
+    );
+    try {
+        const parsed = await response.json();
+        if (response.ok) {
+            return parsed as Record<string, ControlledListItemImage[]>;
+        }
+        throw new Error(parsed.message);
+    } catch (error) {
+        throw new Error((error as Error).message || response.statusText);
+    }
+};
+
+const sha256 = async (file: File) => {
+    const digest = await crypto.subtle.digest(
+        "SHA-256",
+        await file.arrayBuffer(),
+    );
+    return Array.from(new Uint8Array(digest))
+        .map((byte) => byte.toString(16).padStart(2, "0"))
+        .join("");
+};
+
+// Below the server's maximum chunk size (5 MB)
+const IMAGE_CHUNK_SIZE = 4 * 1024 * 1024;
+const IMAGE_CHUNK_RETRIES = 3;
+
+const uploadImageInChunks = async (itemId: string, file: File) => {
+    const response = await fetch(
+        arches.urls.controlled_list_item_image_upload_add,
+        {
+            method: "POST",
+            headers: { "X-CSRFToken": getToken() },
+            body: JSON.stringify({ list_item_id: itemId, name: file.name }),
+        },
+    );
+    const upload = await response.json();
+    if (!response.ok) {
+        throw new Error(upload.message || response.statusText);
+    }
+    const uploadUrl = arches.urls.controlled_list_item_image_upload(
+        upload.upload_id,
+    );
+
+    let offset: number = upload.offset;
+    let failures = 0;
+    while (offset < file.size) {
+        try {
+            const chunkResponse = await fetch(uploadUrl, {
+                method: "PATCH",
+                headers: {
+                    "X-CSRFToken": getToken(),
+                    "Upload-Offset": offset.toString(),
+                },
+                body: file.slice(offset, offset + IMAGE_CHUNK_SIZE),
+            });
+            const parsed = await chunkResponse.json();
+            // On 409 (e.g. a chunk whose response was lost), resume at
+            // the offset the server has.
+            if (!chunkResponse.ok && chunkResponse.status !== 409) {
+                throw new Error(parsed.message || chunkResponse.statusText);
+            }
+            offset = parsed.offset;
+            failures = 0;
+        } catch (error) {
+            failures += 1;
+            if (failures > IMAGE_CHUNK_RETRIES) {
+                throw error;
+            }
+        }
+    }
+
+    return await fetch(uploadUrl, {
+        method: "POST",
+        headers: { "X-CSRFToken": getToken() },
+    });
+};
+
+export const uploadImage = async (itemId: string, file: File) => {
+    // Images are stored once per content hash: only upload the file
+    // if the server does not have it yet.
+    const body = new FormData();
+    body.set("list_item_id", itemId);
+    body.set("sha256", await sha256(file));
+    body.set("name", file.name);
+    let response = await fetch(arches.urls.controlled_list_item_image_add, {
+        method: "POST",
+        headers: { "X-CSRFToken": getToken() },
+        body,
+    });
+    if (response.status === 404 && file.size > IMAGE_CHUNK_SIZE) {
+        response = await uploadImageInChunks(itemId, file);
+    } else if (response.status === 404) {
+        body.delete("sha256");
+        body.set("item_image", file);
+        response = await fetch(arches.urls.controlled_list_item_image_add, {
+            method: "POST",
+            headers: { "X-CSRFToken": getToken() },
+            body,
+        });
+    }
+    try {
+        const parsed = await response.json();
+        if (response.ok) {
+            return parsed as ControlledListItemImage;
+        }
+        throw new Error(parsed.message);
+    } catch (error) {
+        throw new Error((error as Error).message || response.statusText);
+    }
+};
+
 export const deleteImage = async (image: ControlledListItemImage) => {
     const response = await fetch(
         arches.urls.controlled_list_item_image(image.id),
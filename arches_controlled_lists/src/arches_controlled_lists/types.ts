@@ -48,6 +48,8 @@ export interface ControlledListItemImage {
     id: string;
     list_item_id: string;
     url: string;
+    // Resized copies by size name, e.g. "small"
+    thumbnails: Record<string, string>;
     metadata: ControlledListItemImageMetadata[];
 }
 
@@ -58,10 +60,14 @@ export interface ControlledListItem {
     sortorder: number;
     guide: boolean;
     values: Value[];
-    images: ControlledListItemImage[];
+    // Left out of trees, see fetchItemImages()
+    images?: ControlledListItemImage[];
+    image_count: number;
     children: ControlledListItem[];
     parent_id: string;
     depth: number;
+    // Change feed cursor the item was read or last written at
+    revision?: number;
 }
 
 export interface NewControlledListItem {
@@ -77,6 +83,15 @@ export interface NewControlledListItem {
     depth: number;
 }
 
+export interface NewControlledListItemBatchEntry {
+    // Temporary id, for reference by other entries' parent_id.
+    id: string | null;
+    parent_id: string | null;
+    uri?: string;
+    guide?: boolean;
+    values: Pick<NewValue, "valuetype_id" | "language_id" | "value">[];
+}
+
 export interface ControlledList {
     id: string;
     name: string;
@@ -84,6 +99,8 @@ export interface ControlledList {
     search_only: boolean;
     items: ControlledListItem[];
     nodes: ReferencingNode[];
+    // Change feed cursor the list was read or last written at
+    revision?: number;
 }
 
 export type Selectable =
@@ -231,6 +231,7 @@ export const reorderItems = (
     };
 
     recalculateSortOrderRecursive(list, list.items);
+    return reorderedSiblings;
 };
 
 // Directives
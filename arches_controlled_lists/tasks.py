@@ -0,0 +1,260 @@
+import datetime
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from celery import shared_task
+from django.core import management
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from arches.app.models.system_settings import settings
+from arches.app.tasks import create_user_task_record, log_error, update_user_task_record
+from arches.app.utils import task_management
+from arches.app.utils.message_contexts import return_message_context
+from arches_controlled_lists import thumbnails, uploads
+
+TASK_COMPLETE_NOTIFTYPE = "Controlled List Task Complete"
+EXPORT_READY_NOTIFTYPE = "Controlled List Export Ready"
+
+UPLOAD_DIR = "controlled_lists/imports"
+EXPORT_DIR = "controlled_lists/exports"
+
+DEFAULT_CHANGE_RETENTION_DAYS = 30
+
+EXPORT_FILE_EXTENSIONS = {
+    "xlsx": "xlsx",
+    "csv": "zip",
+    "jsonl": "zip",
+    "rdf": "rdf",
+    "ttl": "ttl",
+}
+
+
+@contextmanager
+def local_copy(file_name):
+    """Yields a local path for a file in default storage, which need not be
+    on the worker's file system."""
+    try:
+        path = default_storage.path(file_name)
+    except NotImplementedError:
+        path = None
+    if path:
+        yield path
+        return
+    suffix = os.path.splitext(file_name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        with default_storage.open(file_name, "rb") as f:
+            shutil.copyfileobj(f, tmp)
+        tmp.flush()
+        yield tmp.name
+
+
+def start_task(task, userid, *args):
+    """Queues a task that records its status for, and notifies, the user."""
+    return task.apply_async(
+        (userid, *args),
+        link=update_user_task_record.s(),
+        link_error=log_error.s(),
+    )
+
+
+def task_result(task, msg, notiftype_name, greeting, **additional_context):
+    """The argument of arches' update_user_task_record(), which notifies the
+    user who started the task."""
+    return {
+        "taskid": task.request.id,
+        "msg": msg,
+        "notiftype_name": notiftype_name,
+        "context": return_message_context(
+            greeting=greeting,
+            closing_text=_("Thank you"),
+            additional_context={"link": "", **additional_context},
+        ),
+    }
+
+
+def call_command(*args, **options):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    management.call_command(*args, stdout=stdout, stderr=stderr, **options)
+    return (stdout.getvalue() + stderr.getvalue()).strip()
+
+
+@shared_task(bind=True)
+def import_controlled_lists(self, userid, file_name, merge=False):
+    settings.update_from_db()
+    create_user_task_record(self.request.id, self.name, userid)
+    try:
+        with local_copy(file_name) as path:
+            output = call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=path,
+                merge=merge,
+            )
+    finally:
+        default_storage.delete(file_name)
+
+    return task_result(
+        self,
+        _("Controlled lists have been imported."),
+        TASK_COMPLETE_NOTIFTYPE,
+        _("Hello,\nYour controlled lists have been imported."),
+        output=output,
+    )
+
+
+@shared_task(bind=True)
+def export_controlled_lists(self, userid, interchange_format="xlsx"):
+    settings.update_from_db()
+    create_user_task_record(self.request.id, self.name, userid)
+    file_name = "controlled_lists.{0}".format(
+        EXPORT_FILE_EXTENSIONS[interchange_format]
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        call_command(
+            "packages",
+            operation="export_controlled_lists",
+            dest_dir=tmp_dir,
+            file_name=file_name,
+            interchange_format=interchange_format,
+        )
+        with open(os.path.join(tmp_dir, file_name), "rb") as f:
+            stored_name = default_storage.save(
+                os.path.join(EXPORT_DIR, str(self.request.id), file_name), File(f)
+            )
+
+    link = default_storage.url(stored_name)
+    return task_result(
+        self,
+        _("Your controlled list export is ready for download."),
+        EXPORT_READY_NOTIFTYPE,
+        _("Hello,\nYour controlled list export is now ready."),
+        link=link,
+        email_link=link,
+        button_text=_("Download Now"),
+        name=file_name,
+    )
+
+
+@shared_task(bind=True)
+def migrate_collections_to_controlled_lists(
+    self,
+    userid,
+    collections_to_migrate,
+    host,
+    overwrite=False,
+    preferred_sort_language="en",
+    resume=False,
+):
+    settings.update_from_db()
+    create_user_task_record(self.request.id, self.name, userid)
+    output = call_command(
+        "controlled_lists",
+        operation="migrate_collections_to_controlled_lists",
+        collections_to_migrate=collections_to_migrate,
+        host=host,
+        overwrite=overwrite,
+        preferred_sort_language=preferred_sort_language,
+        resume=resume,
+    )
+    return task_result(
+        self,
+        _("Collections have been migrated to controlled lists."),
+        TASK_COMPLETE_NOTIFTYPE,
+        _("Hello,\nYour collections have been migrated to controlled lists."),
+        output=output,
+    )
+
+
+@shared_task(bind=True)
+def migrate_concept_nodes_to_reference_datatype(self, userid, graph):
+    settings.update_from_db()
+    create_user_task_record(self.request.id, self.name, userid)
+    output = call_command(
+        "controlled_lists",
+        operation="migrate_concept_nodes_to_reference_datatype",
+        graph=graph,
+    )
+    return task_result(
+        self,
+        _("Concept nodes have been migrated to the reference datatype."),
+        TASK_COMPLETE_NOTIFTYPE,
+        _("Hello,\nYour concept nodes have been migrated to the reference datatype."),
+        output=output,
+    )
+
+
+@shared_task
+def delete_unreferenced_files(file_names):
+    """Deletes stored image files that no list item image refers to. Files
+    may be shared, e.g. by cloned lists, so references are checked first,
+    under the lock that attaching images to the file takes."""
+    from arches_controlled_lists.models import ListItemImage
+
+    for file_name in sorted(set(file_names)):
+        with transaction.atomic():
+            ListItemImage.lock_stored_file(file_name)
+            if ListItemImage.objects.filter(value=file_name).exists():
+                continue
+            default_storage.delete(file_name)
+            thumbnails.delete_thumbnails(file_name)
+
+
+def run_on_commit(task, *args):
+    """Runs the task in the background, or inline if Celery is not
+    available, once the current transaction is committed."""
+
+    def run():
+        if task_management.check_if_celery_available():
+            task.delay(*args)
+        else:
+            task(*args)
+
+    transaction.on_commit(run)
+
+
+def delete_files_on_commit(file_names):
+    """Deletes the files once the deletion of their rows is committed."""
+    if file_names:
+        run_on_commit(delete_unreferenced_files, file_names)
+
+
+@shared_task
+def generate_thumbnails(file_names):
+    for file_name in file_names:
+        thumbnails.generate_thumbnails(file_name)
+
+
+def generate_thumbnails_on_commit(file_names):
+    """Generates thumbnails once the images' rows are committed."""
+    if file_names:
+        run_on_commit(generate_thumbnails, file_names)
+
+
+@shared_task
+def delete_stale_image_uploads():
+    """Scheduled with Celery beat."""
+    uploads.delete_stale_uploads()
+
+
+@shared_task
+def compact_list_changes():
+    """Compacts the change log, keeping CONTROLLED_LIST_CHANGE_RETENTION_DAYS
+    of changes in full. Scheduled with Celery beat."""
+    from arches_controlled_lists.models import ListChange
+
+    retention = datetime.timedelta(
+        days=getattr(
+            settings,
+            "CONTROLLED_LIST_CHANGE_RETENTION_DAYS",
+            DEFAULT_CHANGE_RETENTION_DAYS,
+        )
+    )
+    return ListChange.objects.compact(timezone.now() - retention)
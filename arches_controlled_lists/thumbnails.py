@@ -0,0 +1,106 @@
+"""Resized copies of list item images, so that trees and widgets need not
+download the originals, and the URLs of the stored files.
+
+Thumbnails are stored beside the originals under predictable names, e.g.
+list_item_images/thumbnails/small/photo.jpg, so their URLs can be given
+without querying anything. The sizes (longest side, in pixels) are
+configured with CONTROLLED_LIST_THUMBNAIL_SIZES.
+"""
+
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+DEFAULT_THUMBNAIL_SIZES = {"small": 64, "medium": 256}
+DEFAULT_URL_CACHE_SECONDS = 300
+
+
+def thumbnail_sizes():
+    return getattr(settings, "CONTROLLED_LIST_THUMBNAIL_SIZES", DEFAULT_THUMBNAIL_SIZES)
+
+
+def thumbnail_name(file_name, size_name):
+    directory, base_name = os.path.split(file_name)
+    return os.path.join(directory, "thumbnails", size_name, base_name)
+
+
+def stored_file_names(file_name):
+    """The stored files of an image: the original and its thumbnails."""
+    return [
+        file_name,
+        *(thumbnail_name(file_name, size_name) for size_name in thumbnail_sizes()),
+    ]
+
+
+def storage_urls(file_names):
+    """Maps stored file names to their URLs. Storages like S3 sign every
+    URL, so URLs are cached for CONTROLLED_LIST_IMAGE_URL_CACHE_SECONDS,
+    which should be shorter than their expiry."""
+    keys = {
+        "controlled_lists_image_url_"
+        + hashlib.sha1(file_name.encode()).hexdigest(): file_name
+        for file_name in file_names
+    }
+    urls = {keys[key]: url for key, url in cache.get_many(keys).items()}
+    missing = {
+        key: default_storage.url(file_name)
+        for key, file_name in keys.items()
+        if file_name not in urls
+    }
+    cache.set_many(
+        missing,
+        timeout=getattr(
+            settings,
+            "CONTROLLED_LIST_IMAGE_URL_CACHE_SECONDS",
+            DEFAULT_URL_CACHE_SECONDS,
+        ),
+    )
+    urls.update((keys[key], url) for key, url in missing.items())
+    return urls
+
+
+def image_urls(file_name, urls=None):
+    """The URL of an image and the URLs of its thumbnails by size name."""
+    if urls is None:
+        urls = storage_urls(stored_file_names(file_name))
+    thumbnails = {
+        size_name: urls[thumbnail_name(file_name, size_name)]
+        for size_name in thumbnail_sizes()
+    }
+    return urls[file_name], thumbnails
+
+
+def generate_thumbnails(file_name):
+    """Writes (or overwrites) the thumbnails of one stored image. Images
+    smaller than a size are stored as they are, and files Pillow cannot
+    read are skipped. Returns the number of thumbnails written."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with default_storage.open(file_name, "rb") as f:
+            original = Image.open(f)
+            original.load()
+    except (FileNotFoundError, UnidentifiedImageError):
+        return 0
+
+    written = 0
+    for size_name, size in thumbnail_sizes().items():
+        image = original.copy()
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        image.save(buffer, format=original.format)
+        name = thumbnail_name(file_name, size_name)
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+        written += 1
+    return written
+
+
+def delete_thumbnails(file_name):
+    for size_name in thumbnail_sizes():
+        default_storage.delete(thumbnail_name(file_name, size_name))
@@ -0,0 +1,123 @@
+"""Chunked, resumable uploads of list item images.
+
+Each upload is a directory in default storage holding a manifest and one
+file per chunk, named by its offset. Storages like S3 cannot append to a
+file, so chunks are never appended in place; they are streamed into one
+file when the upload is finalized. Memory use is bounded by the chunk size.
+"""
+
+import datetime
+import hashlib
+import json
+import posixpath
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+UPLOAD_DIR = "controlled_lists/image_uploads"
+MANIFEST = "manifest.json"
+MAX_CHUNK_SIZE = 5 * 1024 * 1024
+DEFAULT_MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+# Uploads not finalized or aborted within this time are deleted, by
+# delete_stale_uploads() on a schedule (see tasks.delete_stale_image_uploads).
+EXPIRY = datetime.timedelta(days=1)
+
+
+def max_upload_size():
+    """The largest image, in bytes, an upload may assemble."""
+    return getattr(
+        settings, "CONTROLLED_LIST_MAX_IMAGE_UPLOAD_SIZE", DEFAULT_MAX_UPLOAD_SIZE
+    )
+
+
+def upload_dir(upload_id):
+    return posixpath.join(UPLOAD_DIR, str(upload_id))
+
+
+def start_upload(upload_id, list_item_id, file_name):
+    manifest = {
+        "list_item_id": str(list_item_id),
+        "name": file_name,
+        "created": timezone.now().isoformat(),
+    }
+    default_storage.save(
+        posixpath.join(upload_dir(upload_id), MANIFEST),
+        ContentFile(json.dumps(manifest).encode()),
+    )
+
+
+def read_manifest(upload_id):
+    """The manifest of an upload, or None if there is no such upload."""
+    try:
+        with default_storage.open(
+            posixpath.join(upload_dir(upload_id), MANIFEST), "rb"
+        ) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def chunk_names(upload_id):
+    """Chunk file names in order. Chunks are named by their zero-padded
+    offset, and names a storage made unique (a chunk sent twice) are
+    ignored."""
+    unused, file_names = default_storage.listdir(upload_dir(upload_id))
+    return [
+        posixpath.join(upload_dir(upload_id), file_name)
+        for file_name in sorted(file_names)
+        if file_name.isdigit()
+    ]
+
+
+def upload_offset(upload_id):
+    """The number of bytes received, i.e. the offset to resume from."""
+    names = chunk_names(upload_id)
+    if not names:
+        return 0
+    last = names[-1]
+    return int(posixpath.basename(last)) + default_storage.size(last)
+
+
+def append_chunk(upload_id, offset, data):
+    default_storage.save(
+        posixpath.join(upload_dir(upload_id), f"{offset:015d}"), ContentFile(data)
+    )
+    return offset + len(data)
+
+
+def assemble(upload_id):
+    """Streams the chunks into a temporary file, which is returned open at
+    its start with the SHA-256 hash of its content. The caller closes it."""
+    assembled = tempfile.TemporaryFile()
+    digest = hashlib.sha256()
+    for name in chunk_names(upload_id):
+        with default_storage.open(name, "rb") as chunk:
+            for data in chunk.chunks():
+                digest.update(data)
+                assembled.write(data)
+    assembled.seek(0)
+    return assembled, digest.hexdigest()
+
+
+def delete_upload(upload_id):
+    unused, file_names = default_storage.listdir(upload_dir(upload_id))
+    for file_name in file_names:
+        default_storage.delete(posixpath.join(upload_dir(upload_id), file_name))
+
+
+def delete_stale_uploads():
+    try:
+        upload_ids, unused = default_storage.listdir(UPLOAD_DIR)
+    except FileNotFoundError:
+        return
+    expired = timezone.now() - EXPIRY
+    for upload_id in upload_ids:
+        manifest = read_manifest(upload_id)
+        if (
+            manifest is None
+            or datetime.datetime.fromisoformat(manifest["created"]) < expired
+        ):
+            delete_upload(upload_id)
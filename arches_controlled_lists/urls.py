@@ -4,22 +4,40 @@ from django.conf.urls.i18n import i18n_patterns
 from django.urls import include, path
 
 from arches_controlled_lists.views import (
+    ListChangesView,
+    ListCloneView,
+    ListItemBatchView,
+    ListItemSubtreeView,
     ListItemView,
     ListView,
     ListsView,
     ListItemImageView,
+    ListItemImageUploadView,
+    ListItemImagesView,
     ListItemImageMetadataView,
+    ListItemValueBatchView,
     ListItemValueView,
+    ListTaskView,
 )
 
 urlpatterns = [
     path("api/controlled_lists", ListsView.as_view(), name="controlled_lists"),
+    path(
+        "api/controlled_lists/changes",
+        ListChangesView.as_view(),
+        name="controlled_list_changes",
+    ),
     path(
         "api/controlled_list/<uuid:list_id>",
         ListView.as_view(),
         name="controlled_list",
     ),
     path("api/controlled_list", ListView.as_view(), name="controlled_list_add"),
+    path(
+        "api/controlled_list/<uuid:list_id>/clone",
+        ListCloneView.as_view(),
+        name="controlled_list_clone",
+    ),
     path(
         "api/controlled_list_item/<uuid:item_id>",
         ListItemView.as_view(),
@@ -30,6 +48,16 @@ urlpatterns = [
         ListItemView.as_view(),
         name="controlled_list_item_add",
     ),
+    path(
+        "api/controlled_list_item/<uuid:item_id>/subtree",
+        ListItemSubtreeView.as_view(),
+        name="controlled_list_item_subtree",
+    ),
+    path(
+        "api/controlled_list_items",
+        ListItemBatchView.as_view(),
+        name="controlled_list_items_add",
+    ),
     path(
         "api/controlled_list_item_value/<uuid:value_id>",
         ListItemValueView.as_view(),
@@ -40,6 +68,11 @@ urlpatterns = [
         ListItemValueView.as_view(),
         name="controlled_list_item_value_add",
     ),
+    path(
+        "api/controlled_list_item_values",
+        ListItemValueBatchView.as_view(),
+        name="controlled_list_item_values",
+    ),
     path(
         "api/controlled_list_item_image/<uuid:image_id>",
         ListItemImageView.as_view(),
@@ -50,6 +83,21 @@ urlpatterns = [
         ListItemImageView.as_view(),
         name="controlled_list_item_image_add",
     ),
+    path(
+        "api/controlled_list_item_image_upload/<uuid:upload_id>",
+        ListItemImageUploadView.as_view(),
+        name="controlled_list_item_image_upload",
+    ),
+    path(
+        "api/controlled_list_item_image_upload",
+        ListItemImageUploadView.as_view(),
+        name="controlled_list_item_image_upload_add",
+    ),
+    path(
+        "api/controlled_list_item_images",
+        ListItemImagesView.as_view(),
+        name="controlled_list_item_images",
+    ),
     path(
         "api/controlled_list_item_image_metadata/<uuid:metadata_id>",
         ListItemImageMetadataView.as_view(),
@@ -60,6 +108,16 @@ urlpatterns = [
         ListItemImageMetadataView.as_view(),
         name="controlled_list_item_image_metadata_add",
     ),
+    path(
+        "api/controlled_list_task/<uuid:task_id>",
+        ListTaskView.as_view(),
+        name="controlled_list_task",
+    ),
+    path(
+        "api/controlled_list_task",
+        ListTaskView.as_view(),
+        name="controlled_list_task_add",
+    ),
 ]
 
 # Ensure Arches core urls are superseded by project-level urls
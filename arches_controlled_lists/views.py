@@ -1,34 +1,52 @@
+import os
+import re
+import uuid
+from collections import defaultdict
+from functools import partial
 from http import HTTPStatus
 from uuid import UUID
 
+from celery.result import AsyncResult
 from django.core.exceptions import ValidationError
-from django.db import transaction
-from django.db.models import Max
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
 from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag
 from django.utils.translation import gettext as _
 from django.views.generic import View
 
+from arches.app.models.models import DValueType, Language, UserXTask
 from arches.app.models.utils import field_names
 from arches.app.utils.betterJSONSerializer import JSONDeserializer
 from arches.app.utils.decorators import group_required
 from arches.app.utils.permission_backend import get_nodegroups_by_perm
 from arches.app.utils.response import JSONErrorResponse, JSONResponse
+from arches.app.utils import task_management
 from arches.app.utils.string_utils import str_to_bool
 from arches.app.views.api import APIBase
+from arches_controlled_lists import tasks, uploads
 from arches_controlled_lists.models import (
     List,
+    ListChange,
     ListItem,
     ListItemImage,
     ListItemImageMetadata,
     ListItemValue,
     NodeProxy,
 )
+from arches_controlled_lists.thumbnails import storage_urls, stored_file_names
 
 
 def _prefetch_terms(request):
     """Children at arbitrary depth will still be returned, but tell
-    the ORM to prefetch a certain depth to mitigate N+1 queries after."""
+    the ORM to prefetch a certain depth to mitigate N+1 queries after.
+    Images and their metadata are only prefetched if asked for (?images=true),
+    otherwise items carry an image count and the images can be fetched
+    for the items shown (ListItemImagesView)."""
     find_children = not str_to_bool(request.GET.get("flat", "false"))
+    find_images = _include_images(request)
 
     # Raising the prefetch depth will only save queries, never cause more.
     # Might add slight python overhead? ~12-14 is enough for Getty AAT.
@@ -36,27 +54,113 @@ def _prefetch_terms(request):
 
     terms = []
     for i in range(prefetch_depth):
-        if i == 0:
+        if i > 0 and not find_children:
+            break
+        items = f"list_items{'__children' * i}"
+        terms.extend([items, f"{items}__list_item_values"])
+        if find_images:
             terms.extend(
                 [
-                    "list_items",
-                    "list_items__list_item_values",
-                    "list_items__list_item_images",
-                    "list_items__list_item_images__list_item_image_metadata",
-                ]
-            )
-        elif find_children:
-            terms.extend(
-                [
-                    f"list_items{'__children' * i}",
-                    f"list_items{'__children' * i}__list_item_values",
-                    f"list_items{'__children' * i}__list_item_images",
-                    f"list_items{'__children' * i}__list_item_images__list_item_image_metadata",
+                    f"{items}__list_item_images",
+                    f"{items}__list_item_images__list_item_image_metadata",
                 ]
             )
     return terms
 
 
+def _include_images(request):
+    return str_to_bool(request.GET.get("images", "false"))
+
+
+def _check_value_choices(values):
+    """Validates the value types and languages of many (non-image) values
+    with one query each, rather than one per value as full_clean() does."""
+    valuetype_ids = set(
+        DValueType.objects.filter(category__in=("label", "note")).values_list(
+            "pk", flat=True
+        )
+    )
+    language_ids = set(Language.objects.values_list("code", flat=True))
+    for value in values:
+        if value.valuetype_id not in valuetype_ids:
+            raise ValidationError(
+                _("Invalid value type: {valuetype}").format(
+                    valuetype=value.valuetype_id
+                )
+            )
+        if value.language_id not in language_ids:
+            raise ValidationError(
+                _("Invalid language: {language}").format(language=value.language_id)
+            )
+
+
+def _revision_conflict(request, controlled_list, changes):
+    """Locks the list and returns a 409 response carrying the given changes
+    made after the revision in the If-Match header, or None if there are
+    none. Revisions are change feed cursors, so any revision a client read
+    the list at is valid for the list and each of its items. A revision
+    compacted out of the change log gets a 412: the client must reload.
+    Writes without If-Match are unconditional."""
+    etags = parse_etags(request.headers.get("If-Match", ""))
+    if not etags or "*" in etags:
+        return None
+    try:
+        revision = int(etags[0].removeprefix("W/").strip('"'))
+    except ValueError:
+        return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+    list(
+        controlled_list.select_for_update(of=("self",)).order_by("pk").values_list("pk")
+    )
+    try:
+        conflicting = list(changes.after(revision).in_order())
+    except ListChange.DoesNotExist:
+        return JSONErrorResponse(
+            message=_("This revision is no longer available. Please reload."),
+            status=HTTPStatus.PRECONDITION_FAILED,
+        )
+    if not conflicting:
+        return None
+    return JSONResponse(
+        {
+            "message": _("This list was changed by someone else."),
+            "changes": ListChangesView.serialize_changes(conflicting),
+        },
+        status=HTTPStatus.CONFLICT,
+    )
+
+
+def _with_revision(response, revision):
+    """Sets the revision a list or item was read or written at as the ETag."""
+    response["ETag"] = quote_etag(str(revision))
+    return response
+
+
+def _write_if_unchanged(request, controlled_lists, changes, write):
+    """Calls write() in a transaction, unless _revision_conflict() finds
+    changes after the If-Match revision. Successful responses carry the new
+    revision of the changes' scope as the ETag."""
+    with transaction.atomic():
+        conflict = _revision_conflict(request, controlled_lists, changes)
+        if conflict:
+            return conflict
+        response = write()
+    if response.status_code >= HTTPStatus.BAD_REQUEST:
+        return response
+    return _with_revision(response, changes.revision())
+
+
+def _write_items_if_unchanged(request, item_ids, write):
+    """_write_if_unchanged() for writes to items, or their values, images
+    and image metadata, whose revision is that of the items."""
+    return _write_if_unchanged(
+        request,
+        List.objects.filter(list_items__in=item_ids),
+        ListChange.objects.filter(list_item_id__in=item_ids),
+        write,
+    )
+
+
 @method_decorator(
     group_required("RDM Administrator", raise_exception=True), name="dispatch"
 )
@@ -83,13 +187,142 @@ class ListsView(APIBase):
             lists_query = lists_query.filter(node_alias__overlap=node_aliases)
 
         serialized = [
-            obj.serialize(flat=flat, permitted_nodegroups=permitted)
+            obj.serialize(
+                flat=flat,
+                permitted_nodegroups=permitted,
+                include_images=_include_images(request),
+            )
             for obj in lists_query
         ]
 
         return JSONResponse({"controlled_lists": serialized})
 
 
+@method_decorator(
+    group_required("RDM Administrator", raise_exception=True), name="dispatch"
+)
+class ListChangesView(APIBase):
+    """Returns the changes after a cursor (?since=, default 0, i.e. everything),
+    with the current state of each changed object, so that clients can apply
+    deltas to a local copy. Repeated changes to an object within a page are
+    collapsed into the last one. Item sortorders here are the stored sort
+    keys, which only order items, not their dense ranks.
+
+    Only settled changes are returned (see ListChangeQuerySet), so a change
+    committed late is never skipped. Old changes superseded by later ones
+    are compacted away; a cursor that was gets a 410, and the client starts
+    over from cursor 0."""
+
+    DEFAULT_LIMIT = 1000
+    MAX_LIMIT = 10000
+
+    def get(self, request):
+        try:
+            since = int(request.GET.get("since", 0))
+            limit = min(
+                int(request.GET.get("limit", self.DEFAULT_LIMIT)), self.MAX_LIMIT
+            )
+        except ValueError:
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+        try:
+            changes = list(
+                ListChange.objects.settled().after(since).in_order()[: limit + 1]
+            )
+        except ListChange.DoesNotExist:
+            return JSONErrorResponse(
+                message=_(
+                    "Changes after this cursor are no longer available. Please start over from cursor 0."
+                ),
+                status=HTTPStatus.GONE,
+            )
+        more = len(changes) > limit
+        changes = changes[:limit]
+
+        return JSONResponse(
+            {
+                "changes": self.serialize_changes(changes),
+                "cursor": changes[-1].id if changes else since,
+                "more": more,
+            }
+        )
+
+    @classmethod
+    def serialize_changes(cls, changes):
+        """Collapses repeated changes to an object into the last one and adds
+        the current state of each object that still exists."""
+        latest = {}
+        for change in changes:
+            latest.pop((change.model, change.object_id), None)
+            latest[(change.model, change.object_id)] = change
+
+        ids_by_model = defaultdict(list)
+        for change in latest.values():
+            if change.operation != "delete":
+                ids_by_model[change.model].append(change.object_id)
+        current = cls.current_objects(ids_by_model)
+
+        return [
+            {
+                "cursor": change.id,
+                "model": change.model,
+                "id": str(change.object_id),
+                "operation": change.operation,
+                "list_id": change.list_id,
+                "list_item_id": change.list_item_id,
+                "changed": change.changed,
+                "data": current.get((change.model, change.object_id)),
+            }
+            for change in latest.values()
+        ]
+
+    @staticmethod
+    def current_objects(ids_by_model):
+        """Serializes the changed objects with one query per model, keyed by
+        (model, id). Objects deleted since their change was logged are left
+        out."""
+        serializers = {
+            "list": (
+                List.objects.all(),
+                lambda lst: {
+                    "id": str(lst.pk),
+                    "name": lst.name,
+                    "dynamic": lst.dynamic,
+                    "search_only": lst.search_only,
+                },
+            ),
+            "listitem": (
+                ListItem.objects.all(),
+                lambda item: {
+                    "id": str(item.pk),
+                    "list_id": str(item.list_id),
+                    "uri": item.uri,
+                    "sortorder": item.sortorder,
+                    "guide": item.guide,
+                    "parent_id": str(item.parent_id) if item.parent_id else None,
+                },
+            ),
+            "listitemvalue": (
+                ListItemValue.objects.values_without_images(),
+                lambda value: value.serialize(),
+            ),
+            "listitemimage": (
+                ListItemImage.objects.prefetch_related("list_item_image_metadata"),
+                lambda image: image.serialize(),
+            ),
+            "listitemimagemetadata": (
+                ListItemImageMetadata.objects.all(),
+                lambda metadata: metadata.serialize(),
+            ),
+        }
+        current = {}
+        for model, ids in ids_by_model.items():
+            queryset, serialize = serializers[model]
+            for obj in queryset.filter(pk__in=ids):
+                current[(model, obj.pk)] = serialize(obj)
+        return current
+
+
 @method_decorator(
     group_required("RDM Administrator", raise_exception=True), name="dispatch"
 )
@@ -105,9 +338,14 @@ class ListView(APIBase):
 
         flat = str_to_bool(request.GET.get("flat", "false"))
         permitted = get_nodegroups_by_perm(request.user, "read_nodegroup")
-        serialized = lst.serialize(flat=flat, permitted_nodegroups=permitted)
+        serialized = lst.serialize(
+            flat=flat,
+            permitted_nodegroups=permitted,
+            include_images=_include_images(request),
+        )
+        serialized["revision"] = ListChange.objects.filter(list_id=lst.pk).revision()
 
-        return JSONResponse(serialized)
+        return _with_revision(JSONResponse(serialized), serialized["revision"])
 
     def post(self, request):
         data = JSONDeserializer().deserialize(request.body)
@@ -122,8 +360,25 @@ class ListView(APIBase):
         return JSONResponse(lst.serialize(), status=HTTPStatus.CREATED)
 
     def patch(self, request, list_id):
+        """Updates list fields, or reorders items. With If-Match, responds
+        409 with the conflicting changes if the list changed after the given
+        revision. The new revision is returned as the ETag."""
         data = JSONDeserializer().deserialize(request.body)
         data.pop("items", None)
+        data.pop("revision", None)
+        if "move" in data:
+            write = partial(self.move_item, list_id, data["move"])
+        else:
+            write = partial(self.update_list, list_id, data)
+        return _write_if_unchanged(
+            request,
+            List.objects.filter(pk=list_id),
+            ListChange.objects.filter(list_id=list_id),
+            write,
+        )
+
+    @staticmethod
+    def update_list(list_id, data):
         sortorder_map = data.pop("sortorder_map", {})
         parent_map = data.pop("parent_map", {})
 
@@ -149,33 +404,88 @@ class ListView(APIBase):
 
         return JSONResponse(status=HTTPStatus.NO_CONTENT)
 
+    @staticmethod
+    def move_item(list_id, move):
+        """Moves one item under a parent, after a sibling, and returns only
+        the sortorders that changed, e.g. {"item_id": ..., "parent_id": ...,
+        "after_id": ...}, where missing parent or sibling ids mean the top
+        level or the first position."""
+        try:
+            item = ListItem.objects.get(pk=move["item_id"], list_id=list_id)
+        except KeyError:
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+        except (ListItem.DoesNotExist, ValidationError):
+            return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+
+        try:
+            changes = item.move(
+                parent_id=move.get("parent_id"), after_id=move.get("after_id")
+            )
+        except ValidationError as ve:
+            return JSONErrorResponse(
+                message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
+            )
+
+        return JSONResponse(
+            {
+                "sortorder_map": {
+                    str(item_id): sortorder for item_id, sortorder in changes.items()
+                },
+                "parent_map": {
+                    str(item.pk): str(item.parent_id) if item.parent_id else None
+                },
+            }
+        )
+
     def delete(self, request, list_id):
         try:
             list_to_delete = List.objects.get(pk=list_id)
         except List.DoesNotExist:
             return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
 
-        nodes_using_list = NodeProxy.objects.with_controlled_lists().filter(
-            controlled_list_id=list_to_delete.pk
+        nodes_using_list = (
+            NodeProxy.objects.with_controlled_lists()
+            .filter(controlled_list_id=list_to_delete.pk)
+            .values_list("graph__name", "name")
         )
         errors = [
             _(
                 "{controlled_list} could not be deleted: still in use by {graph} - {node}".format(
                     controlled_list=list_to_delete.name,
-                    graph=node.graph.name,
-                    node=node.name,
+                    graph=graph_name,
+                    node=node_name,
                 )
             )
-            for node in nodes_using_list
+            for graph_name, node_name in nodes_using_list
         ]
         if errors:
             return JSONErrorResponse(
                 message="\n".join(errors), status=HTTPStatus.BAD_REQUEST
             )
-        list_to_delete.delete()
+        List.objects.filter(pk=list_to_delete.pk).bulk_delete()
         return JSONResponse(status=HTTPStatus.NO_CONTENT)
 
 
+@method_decorator(
+    group_required("RDM Administrator", raise_exception=True), name="dispatch"
+)
+class ListCloneView(APIBase):
+    def post(self, request, list_id):
+        data = JSONDeserializer().deserialize(request.body) if request.body else {}
+        try:
+            lst = List.objects.get(pk=list_id)
+        except List.DoesNotExist:
+            return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+
+        try:
+            clone = lst.clone(name=data.get("name"))
+        except ValidationError as ve:
+            return JSONErrorResponse(
+                message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
+            )
+        return JSONResponse(clone.serialize(), status=HTTPStatus.CREATED)
+
+
 @method_decorator(
     group_required("RDM Administrator", raise_exception=True), name="dispatch"
 )
@@ -188,32 +498,40 @@ class ListItemView(APIBase):
         except KeyError:
             return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
 
-        try:
-            controlled_list = (
-                List.objects.filter(pk=list_id)
-                .annotate(max_sortorder=Max("list_items__sortorder", default=-1))
-                .get()
-            )
-        except List.DoesNotExist:
-            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+        with transaction.atomic():
+            try:
+                controlled_list = (
+                    List.objects.filter(pk=list_id).lock_with_max_sortorder().get()
+                )
+            except List.DoesNotExist:
+                return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
 
-        try:
-            item = ListItem(
-                list=controlled_list,
-                sortorder=controlled_list.max_sortorder + 1,
-                parent_id=parent_id,
-            )
-            item.full_clean()
-            item.save()
-        except ValidationError as ve:
-            return JSONErrorResponse(
-                message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
-            )
+            try:
+                item = ListItem(
+                    list=controlled_list,
+                    sortorder=controlled_list.max_sortorder + ListItem.SORTORDER_GAP,
+                    parent_id=parent_id,
+                )
+                item.full_clean()
+                item.save()
+            except ValidationError as ve:
+                return JSONErrorResponse(
+                    message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
+                )
 
         return JSONResponse(item.serialize(), status=HTTPStatus.CREATED)
 
     def patch(self, request, item_id):
+        """With If-Match, responds 409 with the conflicting changes if the
+        item or its values changed after the given revision. The new revision
+        is returned as the ETag."""
         data = JSONDeserializer().deserialize(request.body)
+        return _write_items_if_unchanged(
+            request, [item_id], partial(self.update_item, item_id, data)
+        )
+
+    @staticmethod
+    def update_item(item_id, data):
         item = ListItem(id=item_id, **data)
 
         update_fields = set(data)
@@ -241,16 +559,190 @@ class ListItemView(APIBase):
         return JSONResponse(status=HTTPStatus.NO_CONTENT)
 
     def delete(self, request, item_id):
-        objs_deleted, unused = ListItem.objects.filter(pk=item_id).delete()
+        objs_deleted = ListItem.objects.filter(pk=item_id).bulk_delete()
         if not objs_deleted:
             return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
         return JSONResponse(status=HTTPStatus.NO_CONTENT)
 
 
+@method_decorator(
+    group_required("RDM Administrator", raise_exception=True), name="dispatch"
+)
+class ListItemBatchView(APIBase):
+    """Creates many items, with their values, in one request and one
+    transaction. Items refer to their parents, whether new or existing, by id:
+    new items are given temporary ids by the client, which are mapped to the
+    ids of the created items in the response."""
+
+    def post(self, request):
+        data = JSONDeserializer().deserialize(request.body)
+        try:
+            list_id = data["list_id"]
+            entries = data["items"]
+        except KeyError:
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+        with transaction.atomic():
+            try:
+                controlled_list = (
+                    List.objects.filter(pk=list_id).lock_with_max_sortorder().get()
+                )
+            except List.DoesNotExist:
+                return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+            try:
+                items, values, id_map = self.build_items(controlled_list, entries)
+            except (KeyError, TypeError, ValueError):
+                return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+            except RecursionError:
+                return JSONErrorResponse(
+                    message=_("Recursive structure detected."),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            except ValidationError as ve:
+                return JSONErrorResponse(
+                    message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
+                )
+
+            try:
+                with transaction.atomic():
+                    ListItem.objects.bulk_create(items)
+                    ListItemValue.objects.bulk_create(values)
+            except IntegrityError as e:
+                return JSONErrorResponse(
+                    message=ListItem.violation_error_message(e),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+
+        created = ListItem.objects.filter(
+            pk__in=[item.pk for item in items]
+        ).prefetch_related(
+            "list_item_values",
+            "list_item_images__list_item_image_metadata",
+        )
+        return JSONResponse(
+            {
+                "items": [
+                    item.serialize(flat=True)
+                    for item in sorted(created, key=lambda item: item.sortorder)
+                ],
+                "ids": {temp_id: str(item_id) for temp_id, item_id in id_map.items()},
+            },
+            status=HTTPStatus.CREATED,
+        )
+
+    @staticmethod
+    def build_items(controlled_list, entries):
+        """Validates the entries without querying per item or value: foreign
+        keys are checked in bulk, uniqueness is left to the database."""
+        id_map = {
+            str(entry["id"]): uuid.uuid4() for entry in entries if entry.get("id")
+        }
+        new_item_ids = set(id_map.values())
+        new_parents = {}
+        existing_parent_ids = set()
+        for entry in entries:
+            parent_id = entry.get("parent_id")
+            if parent_id and str(parent_id) not in id_map:
+                existing_parent_ids.add(UUID(str(parent_id)))
+        if existing_parent_ids and len(existing_parent_ids) != (
+            ListItem.objects.filter(
+                list=controlled_list, pk__in=existing_parent_ids
+            ).count()
+        ):
+            raise ValidationError(_("Parent items must belong to the same list."))
+
+        items = []
+        values = []
+        for i, entry in enumerate(entries):
+            item_id = id_map[str(entry["id"])] if entry.get("id") else uuid.uuid4()
+            parent_id = entry.get("parent_id")
+            if parent_id:
+                parent_id = id_map.get(str(parent_id)) or UUID(str(parent_id))
+                if parent_id in new_item_ids:
+                    new_parents[item_id] = parent_id
+            item = ListItem(
+                id=item_id,
+                list=controlled_list,
+                sortorder=controlled_list.max_sortorder
+                + ListItem.SORTORDER_GAP * (i + 1),
+                parent_id=parent_id or None,
+                uri=entry.get("uri", ""),
+                guide=entry.get("guide", False),
+            )
+            item.clean_fields(exclude={"list", "parent"})
+            item.clean()
+            items.append(item)
+
+            for value_data in entry.get("values", []):
+                value = ListItemValue(
+                    list_item_id=item_id,
+                    valuetype_id=value_data["valuetype_id"],
+                    language_id=value_data["language_id"],
+                    value=value_data.get("value", ""),
+                )
+                value.clean_fields(exclude={"list_item", "valuetype", "language"})
+                value.clean()
+                values.append(value)
+        _check_value_choices(values)
+
+        # New items may only refer to each other acyclically.
+        for item_id in new_parents:
+            seen = {item_id}
+            ancestor_id = new_parents[item_id]
+            while ancestor_id in new_parents:
+                if ancestor_id in seen:
+                    raise RecursionError
+                seen.add(ancestor_id)
+                ancestor_id = new_parents[ancestor_id]
+
+        return items, values, id_map
+
+
+@method_decorator(
+    group_required("RDM Administrator", raise_exception=True), name="dispatch"
+)
+class ListItemSubtreeView(APIBase):
+    """Moves or copies an item and its descendants to the end of a list,
+    e.g. {"operation": "copy", "list_id": ..., "parent_id": ...}."""
+
+    def post(self, request, item_id):
+        data = JSONDeserializer().deserialize(request.body)
+        try:
+            operation = data["operation"]
+            list_id = data["list_id"]
+        except KeyError:
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+        if operation not in ("move", "copy"):
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+        try:
+            item = ListItem.objects.get(pk=item_id)
+        except ListItem.DoesNotExist:
+            return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+
+        try:
+            if operation == "move":
+                item.move_subtree(list_id, parent_id=data.get("parent_id"))
+            else:
+                item = item.copy_subtree(list_id, parent_id=data.get("parent_id"))
+        except ValidationError as ve:
+            return JSONErrorResponse(
+                message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
+            )
+
+        return JSONResponse(
+            {"id": str(item.pk), "list_id": str(item.list_id)},
+            status=HTTPStatus.CREATED if operation == "copy" else HTTPStatus.OK,
+        )
+
+
 @method_decorator(
     group_required("RDM Administrator", raise_exception=True), name="dispatch"
 )
 class ListItemValueView(APIBase):
+    """Writes take If-Match with the item's revision, like ListItemView."""
+
     def post(self, request):
         data = JSONDeserializer().deserialize(request.body)
         value = ListItemValue(**data)
@@ -260,9 +752,12 @@ class ListItemValueView(APIBase):
             return JSONErrorResponse(
                 message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
             )
-        value.save()
 
-        return JSONResponse(value.serialize(), status=HTTPStatus.CREATED)
+        def create():
+            value.save()
+            return JSONResponse(value.serialize(), status=HTTPStatus.CREATED)
+
+        return _write_items_if_unchanged(request, [value.list_item_id], create)
 
     def put(self, request, value_id):
         data = JSONDeserializer().deserialize(request.body)
@@ -282,9 +777,12 @@ class ListItemValueView(APIBase):
             )
         except KeyError:
             return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
-        value.save()
 
-        return JSONResponse(value.serialize())
+        def update():
+            value.save()
+            return JSONResponse(value.serialize())
+
+        return _write_items_if_unchanged(request, [value.list_item_id], update)
 
     def delete(self, request, value_id):
         try:
@@ -292,25 +790,164 @@ class ListItemValueView(APIBase):
         except ListItemValue.DoesNotExist:
             return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
 
+        def delete():
+            try:
+                value.delete()
+            except ValidationError as ve:
+                return JSONErrorResponse(
+                    message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
+                )
+            return JSONResponse(status=HTTPStatus.NO_CONTENT)
+
+        return _write_items_if_unchanged(request, [value.list_item_id], delete)
+
+
+@method_decorator(
+    group_required("RDM Administrator", raise_exception=True), name="dispatch"
+)
+class ListItemValueBatchView(APIBase):
+    """Creates, updates and deletes many values, across items, in one
+    transaction, e.g. {"upsert": [{"id": ..., "list_item_id": ...,
+    "valuetype_id": ..., "language_id": ..., "value": ...}], "delete": [...]}.
+    Values without an id, or with an unknown one, are created. With If-Match,
+    the revision covers every item written to."""
+
+    def post(self, request):
+        data = JSONDeserializer().deserialize(request.body)
+        upserts = data.get("upsert", [])
+        delete_ids = data.get("delete", [])
+        if not upserts and not delete_ids:
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
         try:
-            value.delete()
+            existing = ListItemValue.objects.values_without_images().in_bulk(
+                [upsert["id"] for upsert in upserts if upsert.get("id")]
+            )
+            to_create = []
+            to_update = []
+            for upsert in upserts:
+                value = existing.get(UUID(upsert["id"])) if upsert.get("id") else None
+                if value:
+                    to_update.append(value)
+                else:
+                    value = ListItemValue(list_item_id=upsert["list_item_id"])
+                    if upsert.get("id"):
+                        value.id = upsert["id"]
+                    to_create.append(value)
+                value.valuetype_id = upsert["valuetype_id"]
+                value.language_id = upsert["language_id"]
+                value.value = upsert.get("value", "")
+                value.clean_fields(exclude={"list_item", "valuetype", "language"})
+                value.clean()
+            _check_value_choices(to_create + to_update)
+        except (KeyError, TypeError, ValueError):
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
         except ValidationError as ve:
             return JSONErrorResponse(
                 message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
             )
-        return JSONResponse(status=HTTPStatus.NO_CONTENT)
+
+        to_delete = ListItemValue.objects.values_without_images().filter(
+            pk__in=delete_ids
+        )
+        # Only deletions and updates can remove an item's last prefLabel.
+        checked_item_ids = {value.list_item_id for value in to_update} | set(
+            to_delete.values_list("list_item_id", flat=True)
+        )
+
+        def write():
+            try:
+                with transaction.atomic():
+                    deleted, unused = to_delete.delete()
+                    ListItemValue.objects.bulk_update(
+                        to_update, fields=["valuetype", "language", "value"]
+                    )
+                    ListItemValue.objects.bulk_create(to_create)
+                    self.ensure_pref_labels(checked_item_ids)
+            except IntegrityError as e:
+                return JSONErrorResponse(
+                    message=ListItem.violation_error_message(e),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            except ValidationError as ve:
+                return JSONErrorResponse(
+                    message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
+                )
+
+            return JSONResponse(
+                {
+                    "values": [value.serialize() for value in to_update + to_create],
+                    "deleted": deleted,
+                }
+            )
+
+        return _write_items_if_unchanged(
+            request,
+            checked_item_ids | {value.list_item_id for value in to_create},
+            write,
+        )
+
+    @staticmethod
+    def ensure_pref_labels(item_ids):
+        """ListItem.ensure_pref_label() for many items, in one query."""
+        if not item_ids:
+            return
+        missing = (
+            ListItem.objects.filter(pk__in=item_ids)
+            .annotate(
+                pref_label_count=Count(
+                    "list_item_values",
+                    filter=Q(list_item_values__valuetype="prefLabel"),
+                )
+            )
+            .filter(pref_label_count=0)
+        )
+        if missing.exists():
+            raise ValidationError(_("At least one preferred label is required."))
 
 
 @method_decorator(
     group_required("RDM Administrator", raise_exception=True), name="dispatch"
 )
 class ListItemImageView(APIBase):
+    """Writes take If-Match with the item's revision, like ListItemView."""
+
+    SHA256_PATTERN = re.compile("[0-9a-f]{64}")
+
     def post(self, request):
-        uploaded_file = request.FILES["item_image"]
+        """Attaches an uploaded image (item_image), or an image already
+        stored with the given content hash and file name (sha256, name),
+        so clients can skip uploading duplicates: 404 means upload it."""
+        try:
+            list_item_id = UUID(request.POST["list_item_id"])
+        except (KeyError, ValueError):
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+        uploaded_file = request.FILES.get("item_image")
+        if uploaded_file:
+            content_hash = ListItemImage.content_hash(uploaded_file)
+            file_name = uploaded_file.name
+        else:
+            content_hash = request.POST.get("sha256", "").lower()
+            file_name = request.POST.get("name", "")
+            if not self.SHA256_PATTERN.fullmatch(content_hash):
+                return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+        return _write_items_if_unchanged(
+            request,
+            [list_item_id],
+            partial(self.attach, list_item_id, content_hash, file_name, uploaded_file),
+        )
+
+    @staticmethod
+    def attach(list_item_id, content_hash, file_name, file=None):
+        """Creates an image referring to the stored file with this content
+        hash, storing the given file first if there is none."""
+        stored_name = ListItemImage.content_addressed_name(
+            content_hash, os.path.splitext(file_name)[1]
+        )
         img = ListItemImage(
-            list_item_id=UUID(request.POST["list_item_id"]),
+            list_item_id=UUID(str(list_item_id)),
             valuetype_id="image",
-            value=uploaded_file,
+            value=stored_name,
         )
         try:
             img.full_clean()
@@ -318,20 +955,187 @@ class ListItemImageView(APIBase):
             return JSONErrorResponse(
                 message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
             )
-        img.save()
+
+        with transaction.atomic():
+            ListItemImage.lock_stored_file(stored_name)
+            already_stored = default_storage.exists(stored_name)
+            if not already_stored:
+                if not file:
+                    return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+                saved_name = default_storage.save(stored_name, file)
+                if saved_name != stored_name:
+                    # The file would not be found by its content hash.
+                    default_storage.delete(saved_name)
+                    return JSONErrorResponse(
+                        message=_("The image could not be stored under its hash."),
+                        status=HTTPStatus.CONFLICT,
+                    )
+            img.save()
+        if not already_stored:
+            tasks.generate_thumbnails_on_commit([stored_name])
         return JSONResponse(img.serialize(), status=HTTPStatus.CREATED)
 
     def delete(self, request, image_id):
-        count, unused = ListItemImage.objects.filter(pk=image_id).delete()
-        if not count:
+        images = ListItemImage.objects.filter(pk=image_id)
+        try:
+            list_item_id, file_name = images.values_list("list_item_id", "value").get()
+        except ListItemImage.DoesNotExist:
             return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+
+        def delete():
+            images.delete()
+            tasks.delete_files_on_commit([file_name])
+            return JSONResponse(status=HTTPStatus.NO_CONTENT)
+
+        return _write_items_if_unchanged(request, [list_item_id], delete)
+
+
+@method_decorator(
+    group_required("RDM Administrator", raise_exception=True), name="dispatch"
+)
+class ListItemImageUploadView(APIBase):
+    """Chunked, resumable image uploads (see uploads.py):
+    POST {"list_item_id", "name"} starts an upload;
+    PATCH <upload_id> appends the request body at the Upload-Offset header;
+    GET <upload_id> returns the offset to resume from;
+    POST <upload_id> creates the image from the chunks;
+    DELETE <upload_id> aborts the upload."""
+
+    def post(self, request, upload_id=None):
+        if upload_id:
+            return self.finalize(request, upload_id)
+
+        data = JSONDeserializer().deserialize(request.body)
+        try:
+            list_item_id = UUID(data["list_item_id"])
+            file_name = str(data["name"])
+        except (KeyError, TypeError, ValueError):
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+        if not ListItem.objects.filter(pk=list_item_id).exists():
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+        upload_id = uuid.uuid4()
+        uploads.start_upload(upload_id, list_item_id, file_name)
+        return JSONResponse(
+            {"upload_id": upload_id, "offset": 0}, status=HTTPStatus.CREATED
+        )
+
+    def get(self, request, upload_id):
+        if not uploads.read_manifest(upload_id):
+            return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+        return JSONResponse(
+            {"upload_id": upload_id, "offset": uploads.upload_offset(upload_id)}
+        )
+
+    def patch(self, request, upload_id):
+        if not uploads.read_manifest(upload_id):
+            return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+        current_offset = uploads.upload_offset(upload_id)
+        if offset != current_offset:
+            return JSONResponse(
+                {
+                    "message": _("Resume the upload at the current offset."),
+                    "upload_id": upload_id,
+                    "offset": current_offset,
+                },
+                status=HTTPStatus.CONFLICT,
+            )
+        # Reading one byte more than allowed tells oversized chunks apart.
+        data = request.read(uploads.MAX_CHUNK_SIZE + 1)
+        if len(data) > uploads.MAX_CHUNK_SIZE:
+            return JSONErrorResponse(status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        if not data:
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+        if offset + len(data) > uploads.max_upload_size():
+            return JSONErrorResponse(
+                message=_("The image is too large."),
+                status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        return JSONResponse(
+            {
+                "upload_id": upload_id,
+                "offset": uploads.append_chunk(upload_id, offset, data),
+            }
+        )
+
+    def delete(self, request, upload_id):
+        if not uploads.read_manifest(upload_id):
+            return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+        uploads.delete_upload(upload_id)
         return JSONResponse(status=HTTPStatus.NO_CONTENT)
 
+    @staticmethod
+    def finalize(request, upload_id):
+        """Takes If-Match with the item's revision, like ListItemImageView."""
+        manifest = uploads.read_manifest(upload_id)
+        if not manifest:
+            return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+        # Chunks are checked as they arrive, but the limit may have changed.
+        if uploads.upload_offset(upload_id) > uploads.max_upload_size():
+            return JSONErrorResponse(
+                message=_("The image is too large."),
+                status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            )
+        assembled, content_hash = uploads.assemble(upload_id)
+        with assembled:
+            response = _write_items_if_unchanged(
+                request,
+                [manifest["list_item_id"]],
+                partial(
+                    ListItemImageView.attach,
+                    manifest["list_item_id"],
+                    content_hash,
+                    manifest["name"],
+                    File(assembled),
+                ),
+            )
+        if response.status_code == HTTPStatus.CREATED:
+            uploads.delete_upload(upload_id)
+        return response
+
+
+@method_decorator(
+    group_required("RDM Administrator", raise_exception=True), name="dispatch"
+)
+class ListItemImagesView(APIBase):
+    def get(self, request):
+        """Returns the images and their metadata of the given items
+        (?item_id=...&item_id=...), by item id. Trees leave images out."""
+        try:
+            item_ids = [UUID(item_id) for item_id in request.GET.getlist("item_id")]
+        except ValueError:
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+        images = (
+            ListItemImage.objects.filter(list_item_id__in=item_ids)
+            .prefetch_related("list_item_image_metadata")
+            .order_by("list_item_id", "pk")
+        )
+        urls = storage_urls(
+            [
+                file_name
+                for image in images
+                for file_name in stored_file_names(image.value.name)
+            ]
+        )
+        images_by_item = {str(item_id): [] for item_id in item_ids}
+        for image in images:
+            images_by_item[str(image.list_item_id)].append(image.serialize(urls))
+        return JSONResponse(images_by_item)
+
 
 @method_decorator(
     group_required("RDM Administrator", raise_exception=True), name="dispatch"
 )
 class ListItemImageMetadataView(APIBase):
+    """Writes take If-Match with the item's revision, like ListItemView."""
+
     def post(self, request):
         data = JSONDeserializer().deserialize(request.body)
         data.pop("metadata_label", None)
@@ -342,13 +1146,21 @@ class ListItemImageMetadataView(APIBase):
             return JSONErrorResponse(
                 message="\n".join(ve.messages), status=HTTPStatus.BAD_REQUEST
             )
-        metadata.save()
-        return JSONResponse(metadata.serialize(), status=HTTPStatus.CREATED)
+
+        def create():
+            metadata.save()
+            return JSONResponse(metadata.serialize(), status=HTTPStatus.CREATED)
+
+        return _write_items_if_unchanged(
+            request, [metadata.list_item_image.list_item_id], create
+        )
 
     def put(self, request, metadata_id):
         data = JSONDeserializer().deserialize(request.body)
         try:
-            metadata = ListItemImageMetadata.objects.get(pk=metadata_id)
+            metadata = ListItemImageMetadata.objects.select_related(
+                "list_item_image"
+            ).get(pk=metadata_id)
         except ListItemImageMetadata.DoesNotExist:
             return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
 
@@ -363,12 +1175,112 @@ class ListItemImageMetadataView(APIBase):
             )
         except KeyError:
             return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
-        metadata.save()
 
-        return JSONResponse(metadata.serialize())
+        def update():
+            metadata.save()
+            return JSONResponse(metadata.serialize())
+
+        return _write_items_if_unchanged(
+            request, [metadata.list_item_image.list_item_id], update
+        )
 
     def delete(self, request, metadata_id):
-        count, unused = ListItemImageMetadata.objects.filter(pk=metadata_id).delete()
-        if not count:
+        metadata = ListItemImageMetadata.objects.filter(pk=metadata_id)
+        list_item_id = metadata.values_list(
+            "list_item_image__list_item_id", flat=True
+        ).first()
+        if list_item_id is None:
             return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
-        return JSONResponse(status=HTTPStatus.NO_CONTENT)
+
+        def delete():
+            metadata.delete()
+            return JSONResponse(status=HTTPStatus.NO_CONTENT)
+
+        return _write_items_if_unchanged(request, [list_item_id], delete)
+
+
+@method_decorator(
+    group_required("RDM Administrator", raise_exception=True), name="dispatch"
+)
+class ListTaskView(APIBase):
+    """Runs long controlled list operations as Celery tasks. The user who
+    started a task is notified when it completes, and can poll its status."""
+
+    def get(self, request, task_id):
+        user_tasks = UserXTask.objects.filter(taskid=task_id)
+        if not request.user.is_superuser:
+            user_tasks = user_tasks.filter(user=request.user)
+        try:
+            user_task = user_tasks.get()
+        except UserXTask.DoesNotExist:
+            return JSONErrorResponse(status=HTTPStatus.NOT_FOUND)
+
+        data = {
+            "taskid": str(user_task.taskid),
+            "name": user_task.name,
+            "status": user_task.status,
+            "datestart": user_task.datestart,
+            "datedone": user_task.datedone,
+        }
+        if user_task.status == "SUCCESS":
+            result = AsyncResult(str(task_id)).result
+            if isinstance(result, dict):
+                data["message"] = result.get("msg")
+                data["output"] = result["context"].get("output", "")
+                data["link"] = result["context"].get("link", "")
+        return JSONResponse(data)
+
+    def post(self, request):
+        if not task_management.check_if_celery_available():
+            return JSONErrorResponse(
+                message=_(
+                    "Background tasks are not available. Please contact your administrator."
+                ),
+                status=HTTPStatus.SERVICE_UNAVAILABLE,
+            )
+
+        operation = request.POST.get("operation")
+        if operation == "import_controlled_lists":
+            try:
+                uploaded_file = request.FILES["file"]
+            except KeyError:
+                return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+            file_name = default_storage.save(
+                os.path.join(tasks.UPLOAD_DIR, uploaded_file.name), uploaded_file
+            )
+            task, args = tasks.import_controlled_lists, (
+                file_name,
+                str_to_bool(request.POST.get("merge", "false")),
+            )
+        elif operation == "export_controlled_lists":
+            interchange_format = request.POST.get("interchange_format", "xlsx")
+            if interchange_format not in tasks.EXPORT_FILE_EXTENSIONS:
+                return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+            task, args = tasks.export_controlled_lists, (interchange_format,)
+        elif operation == "migrate_collections_to_controlled_lists":
+            collections = request.POST.getlist("collections")
+            if not collections:
+                return JSONErrorResponse(
+                    message=_("No collections provided to migrate."),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            task, args = tasks.migrate_collections_to_controlled_lists, (
+                collections,
+                request.POST.get("host", ListItem.generated_uri_prefix()),
+                str_to_bool(request.POST.get("overwrite", "false")),
+                request.POST.get("preferred_sort_language", "en"),
+                str_to_bool(request.POST.get("resume", "false")),
+            )
+        elif operation == "migrate_concept_nodes_to_reference_datatype":
+            graph = request.POST.get("graph")
+            if not graph:
+                return JSONErrorResponse(
+                    message=_("Please provide a graph id or slug"),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            task, args = tasks.migrate_concept_nodes_to_reference_datatype, (graph,)
+        else:
+            return JSONErrorResponse(status=HTTPStatus.BAD_REQUEST)
+
+        result = tasks.start_task(task, request.user.id, *args)
+        return JSONResponse({"taskid": result.id}, status=HTTPStatus.ACCEPTED)
@@ -1,16 +1,40 @@
+import csv
+import datetime
 import io
 import os
+import re
+import shutil
+import tempfile
+from unittest import mock
 
 from django.core import management
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.test.client import Client
 from django.test.utils import captured_stdout
+from django.utils import timezone
 from django.core.management.base import CommandError
-
-from arches.app.models.models import Node
+from django.db import IntegrityError
+
+from arches.app.models.models import (
+    CardXNodeXWidget,
+    Language,
+    Node,
+    TileModel,
+)
 from arches.app.utils.skos import SKOSReader
-from arches_controlled_lists.models import List, ListItem, ListItemValue
+from arches_controlled_lists.management.commands.controlled_lists import (
+    Command as ControlledListsCommand,
+)
+from arches_controlled_lists.management.commands.packages import (
+    Command as PackagesCommand,
+)
+from arches_controlled_lists.models import (
+    CollectionMigration,
+    List,
+    ListItem,
+    ListItemValue,
+)
 
 from .test_settings import PROJECT_TEST_ROOT
 
@@ -43,6 +67,175 @@ class ListExportPackageTests(TestCase):
             )
         self.assertTrue(os.path.exists(file_path))
 
+    def test_export_import_controlled_list_csv_round_trip(self):
+        export_file_name = "export_controlled_lists.zip"
+        file_path = os.path.join(PROJECT_TEST_ROOT, export_file_name)
+        self.addCleanup(os.remove, file_path)
+        output = io.StringIO()
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="export_controlled_lists",
+                dest_dir=PROJECT_TEST_ROOT,
+                file_name=export_file_name,
+                interchange_format="csv",
+                stdout=output,
+            )
+        self.assertTrue(os.path.exists(file_path))
+
+        List.objects.all().delete()
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=file_path,
+                stdout=output,
+            )
+
+        self.assertEqual(List.objects.all().count(), 2)
+        self.assertEqual(ListItem.objects.all().count(), 10)
+        self.assertEqual(ListItemValue.objects.all().count(), 21)
+        self.assertEqual(ListItem.objects.filter(parent__isnull=False).count(), 4)
+
+    def test_merge_import_controlled_list(self):
+        export_file_name = "export_controlled_lists_for_merge.zip"
+        file_path = os.path.join(PROJECT_TEST_ROOT, export_file_name)
+        self.addCleanup(os.remove, file_path)
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="export_controlled_lists",
+                dest_dir=PROJECT_TEST_ROOT,
+                file_name=export_file_name,
+                interchange_format="csv",
+                stdout=io.StringIO(),
+            )
+
+        List.objects.filter(pk=self.list1.pk).update(name="renamed")
+        extra_item = ListItem.objects.create(
+            list=self.list1, sortorder=99, uri="https://archesproject.org/extra"
+        )
+
+        output = io.StringIO()
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=file_path,
+                merge=True,
+                stdout=output,
+            )
+
+        self.assertEqual(List.objects.get(pk=self.list1.pk).name, "list1")
+        self.assertFalse(ListItem.objects.filter(pk=extra_item.pk).exists())
+        self.assertIn(
+            "List: 0 inserted, 1 updated, 1 unchanged, 0 deleted", output.getvalue()
+        )
+        self.assertIn(
+            "ListItem: 0 inserted, 0 updated, 10 unchanged, 1 deleted",
+            output.getvalue(),
+        )
+
+    def test_export_controlled_list_changes(self):
+        export_dir_name = "export_controlled_list_changes"
+        export_path = os.path.join(PROJECT_TEST_ROOT, export_dir_name)
+        self.addCleanup(shutil.rmtree, export_path, ignore_errors=True)
+        since = timezone.now()
+        ListItemValue.objects.filter(list_item__list=self.list1).update(value="changed")
+        deleted_list_id = self.list2.pk
+        self.list2.delete()
+        output = io.StringIO()
+
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="export_controlled_lists",
+                dest_dir=PROJECT_TEST_ROOT,
+                file_name=export_dir_name,
+                interchange_format="csv",
+                modified_since=since,
+                stdout=output,
+            )
+
+        def read_rows(model_name):
+            with open(os.path.join(export_path, f"{model_name}.csv")) as f:
+                return list(csv.DictReader(f))
+
+        self.assertEqual([row["id"] for row in read_rows("List")], [str(self.list1.pk)])
+        self.assertEqual(len(read_rows("ListItem")), 5)
+        self.assertEqual(
+            [row["id"] for row in read_rows("ListTombstone")], [str(deleted_list_id)]
+        )
+        # The cutoff comes from the database clock that stamped the changes.
+        self.list1.refresh_from_db()
+        cutoff = re.search(r"Export changes since (\S+) next time", output.getvalue())
+        self.assertGreaterEqual(
+            datetime.datetime.fromisoformat(cutoff.group(1)), self.list1.modified
+        )
+
+    def test_parallel_import_of_tombstones_only(self):
+        source = tempfile.mkdtemp(dir=PROJECT_TEST_ROOT)
+        self.addCleanup(shutil.rmtree, source)
+        with open(os.path.join(source, "ListTombstone.csv"), "w") as f:
+            f.write(f"id,deleted\n{self.list1.pk},2024-01-01T00:00:00+00:00\n")
+
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=source,
+                workers=2,
+                stdout=io.StringIO(),
+            )
+
+        self.assertQuerySetEqual(List.objects.all(), [self.list2])
+
+    def test_check_cross_list_integrity(self):
+        item = self.list1.list_items.first()
+        item.parent = self.list2.list_items.first()
+        item.save()
+
+        self.assertEqual(
+            PackagesCommand.check_cross_list_integrity([self.list1.pk]),
+            [f"ListItem {item.pk} has a parent in another list."],
+        )
+
+    def test_export_import_controlled_list_skos_round_trip(self):
+        export_file_name = "export_controlled_lists.rdf"
+        file_path = os.path.join(PROJECT_TEST_ROOT, export_file_name)
+        self.addCleanup(os.remove, file_path)
+        output = io.StringIO()
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="export_controlled_lists",
+                dest_dir=PROJECT_TEST_ROOT,
+                file_name=export_file_name,
+                interchange_format="rdf",
+                stdout=output,
+            )
+
+        List.objects.all().delete()
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=file_path,
+                stdout=output,
+            )
+
+        self.assertQuerySetEqual(
+            List.objects.order_by("name").values_list("name", flat=True),
+            ["list1", "list2"],
+        )
+        self.assertEqual(ListItem.objects.all().count(), 10)
+        # Images are not exported to SKOS.
+        self.assertEqual(ListItemValue.objects.all().count(), 20)
+        self.assertEqual(
+            ListItem.objects.get(uri="https://getty.edu/1").parent.uri,
+            "https://getty.edu/0",
+        )
+
 
 class ListImportPackageTests(TestCase):
 
@@ -64,9 +257,183 @@ class ListImportPackageTests(TestCase):
         self.assertEqual(ListItem.objects.all().count(), 10)
         self.assertEqual(ListItemValue.objects.all().count(), 21)
 
+    def test_partition_import_by_list(self):
+        tables = {
+            List: (
+                ["id", "name", "dynamic", "search_only"],
+                [["l1", "a", "0", "0"], ["l2", "b", "0", "0"]],
+            ),
+            ListItem: (
+                ["id", "uri", "list", "sortorder", "parent", "guide"],
+                [
+                    ["i1", "", "l1", "0", "", "0"],
+                    ["i2", "", "l1", "1", "i1", "0"],
+                    ["i3", "", "l2", "0", "", "0"],
+                ],
+            ),
+            ListItemValue: (
+                ["id", "list_item", "valuetype", "language", "value"],
+                [["v1", "i2", "prefLabel", "en", "label"]],
+            ),
+        }
+        list_id_by_item_id = PackagesCommand.list_ids_by_item_id(tables)
+        partitions = PackagesCommand.partition_by_list(tables, 2, list_id_by_item_id)
+
+        self.assertEqual(
+            [len(partition[ListItem][1]) for partition in partitions], [2, 1]
+        )
+        self.assertEqual(len(partitions[0][ListItemValue][1]), 1)
+
+        # Parents in another list cannot be imported independently.
+        tables[ListItem][1][2][4] = "i1"
+        with self.assertRaises(CommandError):
+            PackagesCommand.partition_by_list(tables, 2, list_id_by_item_id)
+
+    def test_import_skos_duplicate_concept_error(self):
+        input_file = os.path.join(PROJECT_TEST_ROOT, "duplicate_concepts.rdf")
+        self.addCleanup(os.remove, input_file)
+        concept = (
+            '<skos:Concept rdf:about="https://example.com/1">'
+            '<skos:prefLabel xml:lang="en">{0}</skos:prefLabel>'
+            "</skos:Concept>"
+        )
+        with open(input_file, "w") as f:
+            f.write(
+                '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+                'xmlns:skos="http://www.w3.org/2004/02/skos/core#">'
+                + concept.format("one")
+                + concept.format("two")
+                + "</rdf:RDF>"
+            )
+
+        with self.assertRaisesMessage(CommandError, "described more than once"):
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=input_file,
+                stdout=io.StringIO(),
+            )
+        self.assertFalse(List.objects.exists())
+
+        with self.assertRaisesMessage(CommandError, "not supported"):
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=input_file,
+                merge=True,
+                stdout=io.StringIO(),
+            )
+
+    def test_import_skos_concept_without_pref_label_error(self):
+        input_file = os.path.join(PROJECT_TEST_ROOT, "unlabeled_concepts.rdf")
+        self.addCleanup(os.remove, input_file)
+        with open(input_file, "w") as f:
+            f.write(
+                '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+                'xmlns:skos="http://www.w3.org/2004/02/skos/core#">'
+                '<skos:Concept rdf:about="https://example.com/1">'
+                '<skos:prefLabel xml:lang="en">one</skos:prefLabel>'
+                "</skos:Concept>"
+                '<skos:Concept rdf:about="https://example.com/2">'
+                '<skos:altLabel xml:lang="en">two</skos:altLabel>'
+                "</skos:Concept>"
+                "</rdf:RDF>"
+            )
+
+        with self.assertRaisesMessage(
+            CommandError,
+            "no skos:prefLabel in {0}: https://example.com/2".format(input_file),
+        ):
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=input_file,
+                stdout=io.StringIO(),
+            )
+        self.assertFalse(List.objects.exists())
+
     ### TODO Add test for creating new language if language code not in db but found in import file
 
 
+class ParallelListImportTests(TransactionTestCase):
+    # Workers import in their own connections, so the data must be committed.
+    serialized_rollback = True
+
+    def setUp(self):
+        language = Language.objects.first()
+        self.items = []
+        for name in ("list1", "list2"):
+            controlled_list = List.objects.create(name=name)
+            parent = ListItem.objects.create(list=controlled_list, sortorder=0)
+            child = ListItem.objects.create(
+                list=controlled_list, sortorder=1, parent=parent
+            )
+            ListItemValue.objects.bulk_create(
+                ListItemValue(
+                    list_item=item,
+                    valuetype_id="prefLabel",
+                    language=language,
+                    value=name,
+                )
+                for item in (parent, child)
+            )
+            self.items.append((parent, child))
+
+    def test_parallel_import(self):
+        export_file_name = "export_controlled_lists_for_workers.zip"
+        file_path = os.path.join(PROJECT_TEST_ROOT, export_file_name)
+        self.addCleanup(os.remove, file_path)
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="export_controlled_lists",
+                dest_dir=PROJECT_TEST_ROOT,
+                file_name=export_file_name,
+                interchange_format="csv",
+                stdout=io.StringIO(),
+            )
+        List.objects.all().delete()
+
+        output = io.StringIO()
+        with captured_stdout():
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=file_path,
+                workers=2,
+                stdout=output,
+            )
+
+        self.assertIn("Data imported successfully", output.getvalue())
+        self.assertEqual(List.objects.count(), 2)
+        self.assertEqual(ListItem.objects.filter(parent__isnull=False).count(), 2)
+        self.assertEqual(ListItemValue.objects.count(), 4)
+
+    def test_parallel_import_checks_staged_cross_list_integrity(self):
+        (parent, child), (other_parent, unused) = self.items
+        source = tempfile.mkdtemp(dir=PROJECT_TEST_ROOT)
+        self.addCleanup(shutil.rmtree, source)
+        # Moves the first list's parent to the second list, without its child.
+        with open(os.path.join(source, "ListItem.csv"), "w") as f:
+            f.write("id,uri,list,sortorder,parent,guide\n")
+            f.write(f"{parent.pk},{parent.uri},{other_parent.list_id},5,,0\n")
+
+        with self.assertRaisesMessage(
+            CommandError, f"ListItem {child.pk} has a parent {parent.pk}"
+        ):
+            management.call_command(
+                "packages",
+                operation="import_controlled_lists",
+                source=source,
+                workers=2,
+                merge=True,
+                stdout=io.StringIO(),
+            )
+
+        parent.refresh_from_db()
+        self.assertEqual(parent.list_id, child.list_id)
+
+
 class RDMToControlledListsETLTests(TestCase):
     fixtures = ["polyhierarchical_collections"]
 
@@ -128,6 +495,65 @@ class RDMToControlledListsETLTests(TestCase):
             imported_item_values.get(value="French Test Concept 1").pk,
         )
 
+    def test_resume_migrate_collections_to_controlled_lists(self):
+        options = {
+            "operation": "migrate_collections_to_controlled_lists",
+            "host": "http://localhost:8000/plugins/controlled-list-manager/item/",
+            "preferred_sort_language": "en",
+            "overwrite": False,
+        }
+        management.call_command(
+            "controlled_lists",
+            collections_to_migrate=["Polyhierarchical Collection Test"],
+            stdout=io.StringIO(),
+            **options,
+        )
+
+        output = io.StringIO()
+        management.call_command(
+            "controlled_lists",
+            collections_to_migrate=[
+                "Polyhierarchical Collection Test",
+                "Polyhierarchy Collection 2",
+            ],
+            resume=True,
+            stdout=output,
+            **options,
+        )
+
+        self.assertIn(
+            "[1/2] Skipping Polyhierarchical Collection Test", output.getvalue()
+        )
+        self.assertIn("[2/2] Migrated Polyhierarchy Collection 2", output.getvalue())
+        self.assertEqual(
+            List.objects.filter(name__startswith="Polyhierarch").count(), 2
+        )
+        self.assertEqual(
+            CollectionMigration.objects.get(
+                collection="Polyhierarchical Collection Test"
+            ).item_count,
+            3,
+        )
+
+    def test_dry_run_migrate_collections_to_controlled_lists(self):
+        output = io.StringIO()
+        management.call_command(
+            "controlled_lists",
+            operation="migrate_collections_to_controlled_lists",
+            collections_to_migrate=[
+                "Polyhierarchical Collection Test",
+                "Polyhierarchy Collection 2",
+            ],
+            dry_run=True,
+            stdout=output,
+        )
+
+        self.assertIn("Polyhierarchical Collection Test: 3 concepts", output.getvalue())
+        self.assertIn("in 2 list(s)", output.getvalue())
+        self.assertFalse(
+            List.objects.filter(name="Polyhierarchical Collection Test").exists()
+        )
+
     def test_no_matching_collection_error(self):
         expected_output = "Failed to find the following collections in the database: Collection That Doesn't Exist"
         output = io.StringIO()
@@ -204,6 +630,160 @@ class MigrateConceptNodesToReferenceDatatypeTests(TestCase):
                     expected_widget_config_keys, list(widget.config.keys())
                 )
 
+    def test_migrate_concept_node_cross_records(self):
+        TEST_GRAPH_ID = "8f7cfa3c-d0e0-4a66-8608-43dd726a1b81"
+        CONCEPT_CROSS_RECORD_ID = "b0e8c700-fdab-40b0-a5b0-b8807f16194c"
+        CONCEPT_LIST_CROSS_RECORD_ID = "bea9a4ab-366c-473d-8d97-ec173e0c77e4"
+
+        management.call_command(
+            "controlled_lists",
+            operation="migrate_concept_nodes_to_reference_datatype",
+            graph=TEST_GRAPH_ID,
+            stdout=io.StringIO(),
+        )
+
+        for cross_record_id, expected_item_id in (
+            (CONCEPT_CROSS_RECORD_ID, "8f9a53b7-35cd-48be-9093-bd202fbe8e0b"),
+            (CONCEPT_LIST_CROSS_RECORD_ID, "a1f4cab6-f577-40af-b8fe-589c61236dd2"),
+        ):
+            cross_record = CardXNodeXWidget.objects.get(pk=cross_record_id)
+            self.assertEqual(cross_record.widget.name, "reference-select-widget")
+            self.assertNotIn("options", cross_record.config)
+            [default_value] = cross_record.config["defaultValue"]
+            self.assertEqual(default_value["uri"][-36:], expected_item_id)
+            self.assertEqual(
+                default_value["list_id"], cross_record.node.config["controlledList"]
+            )
+            self.assertTrue(default_value["labels"])
+
+    def test_migrate_concept_nodes_of_several_graphs(self):
+        output = io.StringIO()
+        TEST_GRAPH_ID = "8f7cfa3c-d0e0-4a66-8608-43dd726a1b81"
+        NO_CONCEPT_NODES_GRAPH_ID = "fc46b399-c824-45e5-86e2-5b992b8fa619"
+
+        with self.assertRaisesMessage(CommandError, "1 of 2 graphs failed"):
+            management.call_command(
+                "controlled_lists",
+                operation="migrate_concept_nodes_to_reference_datatype",
+                graph=[TEST_GRAPH_ID, NO_CONCEPT_NODES_GRAPH_ID],
+                stdout=output,
+            )
+
+        self.assertIn(
+            "Migrated 4 concept/concept-list nodes in 1 of 2 graphs",
+            output.getvalue(),
+        )
+        self.assertEqual(
+            Node.objects.filter(graph_id=TEST_GRAPH_ID, datatype="reference").count(),
+            4,
+        )
+
+    def test_migrate_concept_nodes_of_several_graphs_reports_any_error(self):
+        output = io.StringIO()
+        with (
+            mock.patch.object(
+                ControlledListsCommand,
+                "migrate_concept_nodes_to_reference_datatype",
+                side_effect=[IntegrityError("duplicate key"), 4],
+            ),
+            self.assertRaisesMessage(CommandError, "duplicate key"),
+        ):
+            management.call_command(
+                "controlled_lists",
+                operation="migrate_concept_nodes_to_reference_datatype",
+                graph=["graph1", "graph2"],
+                stdout=output,
+            )
+
+        self.assertIn(
+            "Migrated 4 concept/concept-list nodes in 1 of 2 graphs",
+            output.getvalue(),
+        )
+
+    def test_migrate_concept_tiles_to_reference_datatype(self):
+        TEST_GRAPH_ID = "8f7cfa3c-d0e0-4a66-8608-43dd726a1b81"
+        CONCEPT_NODE_ID = "9f26d038-7b65-11ef-a937-0aa766c61b64"
+        CONCEPT_LIST_NODE_ID = "b29546b8-7b65-11ef-a937-0aa766c61b64"
+        CHILD1_VALUE_ID = "8e88c7ea-a157-4846-826d-4422eb967b9e"
+        CHILD2_VALUE_ID = "7e4c0e04-2a58-456d-8728-5fa8019307a5"
+        tile = TileModel.objects.create(
+            resourceinstance_id="a106c400-260c-11e7-a604-14109fd34195",
+            nodegroup_id="94cb9a10-7b65-11ef-a937-0aa766c61b64",
+            data={
+                CONCEPT_NODE_ID: CHILD1_VALUE_ID,
+                CONCEPT_LIST_NODE_ID: [CHILD2_VALUE_ID, CHILD1_VALUE_ID],
+            },
+        )
+        management.call_command(
+            "controlled_lists",
+            operation="migrate_concept_nodes_to_reference_datatype",
+            graph=TEST_GRAPH_ID,
+            stdout=io.StringIO(),
+        )
+
+        output = io.StringIO()
+        management.call_command(
+            "controlled_lists",
+            operation="migrate_concept_tiles_to_reference_datatype",
+            graph=TEST_GRAPH_ID,
+            batch_size=1,
+            reindex=False,
+            stdout=output,
+        )
+
+        tile.refresh_from_db()
+        self.assertEqual(
+            [reference["uri"][-36:] for reference in tile.data[CONCEPT_NODE_ID]],
+            ["a1f4cab6-f577-40af-b8fe-589c61236dd2"],
+        )
+        self.assertEqual(
+            [reference["uri"][-36:] for reference in tile.data[CONCEPT_LIST_NODE_ID]],
+            [
+                "8f9a53b7-35cd-48be-9093-bd202fbe8e0b",
+                "a1f4cab6-f577-40af-b8fe-589c61236dd2",
+            ],
+        )
+        self.assertIn("2 concept/concept-list tile values", output.getvalue())
+
+    def test_migrate_concept_tiles_of_all_graphs(self):
+        TEST_GRAPH_ID = "8f7cfa3c-d0e0-4a66-8608-43dd726a1b81"
+        options = {
+            "operation": "migrate_concept_tiles_to_reference_datatype",
+            "all_graphs": True,
+        }
+        with self.assertRaisesMessage(
+            CommandError, "No graphs with reference nodes of controlled lists found"
+        ):
+            ControlledListsCommand.graphs_to_migrate(options)
+
+        management.call_command(
+            "controlled_lists",
+            operation="migrate_concept_nodes_to_reference_datatype",
+            graph=TEST_GRAPH_ID,
+            stdout=io.StringIO(),
+        )
+
+        self.assertEqual(
+            ControlledListsCommand.graphs_to_migrate(options), [TEST_GRAPH_ID]
+        )
+
+    def test_dry_run_migrate_concept_nodes_to_reference_datatype(self):
+        output = io.StringIO()
+        TEST_GRAPH_ID = "8f7cfa3c-d0e0-4a66-8608-43dd726a1b81"
+
+        management.call_command(
+            "controlled_lists",
+            operation="migrate_concept_nodes_to_reference_datatype",
+            graph=TEST_GRAPH_ID,
+            dry_run=True,
+            stdout=output,
+        )
+
+        self.assertIn("Total: 4 nodes", output.getvalue())
+        self.assertFalse(
+            Node.objects.filter(graph_id=TEST_GRAPH_ID, datatype="reference").exists()
+        )
+
     def test_no_matching_graph_error(self):
         output = io.StringIO()
         expected_output = "GraphModel matching query does not exist."
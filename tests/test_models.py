@@ -1,11 +1,24 @@
+import datetime
+
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-from arches_controlled_lists.models import ListItem
+from arches_controlled_lists.models import List, ListItem
 
 # these tests can be run from the command line via
 # python manage.py test tests.test_models --settings="tests.test_settings"
 
 
+class ListTests(TestCase):
+    def test_modified_is_stamped_by_the_database_on_insert(self):
+        stale = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+        controlled_list = List.objects.create(name="list", modified=stale)
+
+        controlled_list.refresh_from_db()
+        self.assertGreater(controlled_list.modified, stale)
+
+
 class ListItemTests(TestCase):
     def test_uri_generation_guards_against_failure(self):
         # Don't bother setting up a list.
@@ -17,3 +30,98 @@ class ListItemTests(TestCase):
 
         item.full_clean(exclude={"list"})
         self.assertIsNotNone(item.uri)
+
+
+class ListItemMoveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.list = List.objects.create(name="list")
+        cls.items = ListItem.objects.bulk_create(
+            ListItem(list=cls.list, sortorder=(i + 1) * ListItem.SORTORDER_GAP)
+            for i in range(3)
+        )
+
+    def sibling_order(self, parent=None):
+        return list(
+            self.list.list_items.filter(parent=parent)
+            .order_by("sortorder")
+            .values_list("pk", flat=True)
+        )
+
+    def test_move_updates_only_the_moved_item(self):
+        first, second, third = self.items
+
+        with self.assertNumQueries(8):
+            changes = third.move(position=0)
+
+        self.assertEqual(self.sibling_order(), [third.pk, first.pk, second.pk])
+        self.assertEqual(changes, {third.pk: 0, first.pk: 1, second.pk: 2})
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.sortorder, ListItem.SORTORDER_GAP)
+        self.assertEqual(second.sortorder, 2 * ListItem.SORTORDER_GAP)
+
+    def test_move_under_new_parent(self):
+        first, second, third = self.items
+
+        third.move(parent_id=first.pk, position=0)
+
+        self.assertEqual(self.sibling_order(), [first.pk, second.pk])
+        self.assertEqual(self.sibling_order(parent=first), [third.pk])
+        # Depth-first order is kept: the child sorts between its parent and
+        # the parent's next sibling.
+        self.assertLess(first.sortorder, third.sortorder)
+        self.assertLess(third.sortorder, second.sortorder)
+
+    def test_move_keeps_descendants_with_the_item(self):
+        first, second, third = self.items
+        second.move(parent_id=first.pk)
+
+        changes = first.move(after_id=third.pk)
+        new_item = ListItem.objects.create(
+            list=self.list, sortorder=10 * ListItem.SORTORDER_GAP
+        )
+        new_item.move(parent_id=first.pk, position=0)
+
+        self.assertEqual(changes, {third.pk: 0, first.pk: 1, second.pk: 2})
+        self.assertEqual(
+            list(
+                self.list.list_items.order_by("sortorder").values_list("pk", flat=True)
+            ),
+            [third.pk, first.pk, new_item.pk, second.pk],
+        )
+        self.assertEqual(self.sibling_order(parent=first), [new_item.pk, second.pk])
+
+    def test_move_in_breadth_first_list(self):
+        # Lists migrated from collections are ordered by depth.
+        first, second, third = self.items
+        child = ListItem.objects.create(
+            list=self.list, parent=first, sortorder=4 * ListItem.SORTORDER_GAP
+        )
+
+        third.move(after_id=first.pk)
+        second.move(parent_id=first.pk, position=0)
+
+        self.assertEqual(self.sibling_order(), [first.pk, third.pk])
+        self.assertEqual(self.sibling_order(parent=first), [second.pk, child.pk])
+
+    def test_move_rebalances_when_out_of_gaps(self):
+        first, second, third = self.items
+        ListItem.objects.filter(pk=second.pk).update(sortorder=first.sortorder + 1)
+
+        third.move(position=1)
+
+        self.assertEqual(self.sibling_order(), [first.pk, third.pk, second.pk])
+
+    def test_move_under_own_child(self):
+        first, second, third = self.items
+        second.move(parent_id=first.pk)
+
+        with self.assertRaises(ValidationError):
+            first.move(parent_id=second.pk)
+
+    def test_serialized_sortorder_is_dense(self):
+        self.assertEqual(
+            [item["sortorder"] for item in self.list.serialize(flat=True)["items"]],
+            [0, 1, 2],
+        )
@@ -1,13 +1,23 @@
+import datetime
+import hashlib
+import io
 import json
+import os
+import tempfile
 import uuid
 import sys
 from http import HTTPStatus
+from unittest import mock
 
 from django.contrib.auth.models import Group, User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
-from django.test.utils import override_settings
+from django.test.utils import captured_stdout, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from guardian.shortcuts import assign_perm
+from PIL import Image
 
 from arches.app.models.graph import Graph
 from arches.app.models.models import (
@@ -15,14 +25,23 @@ from arches.app.models.models import (
     Language,
     Node,
     NodeGroup,
+    Notification,
+    UserXTask,
 )
+from arches.app.tasks import update_user_task_record
+from arches.app.utils import task_management
+from arches_controlled_lists import tasks
 from arches_controlled_lists.models import (
     List,
+    ListChange,
     ListItem,
     ListItemImage,
     ListItemImageMetadata,
     ListItemValue,
 )
+from arches_controlled_lists.thumbnails import generate_thumbnails, thumbnail_name
+
+from .test_settings import PROJECT_TEST_ROOT
 
 # these tests can be run from the command line via
 # python manage.py test tests.test_views --settings="tests.test_settings"
@@ -36,6 +55,13 @@ def sync_pk_for_comparison(item):
     return item
 
 
+def run_eagerly(task):
+    """Patches a task to run in the test's thread and transaction when queued."""
+    return mock.patch.object(
+        task, "apply_async", side_effect=lambda args, **options: task.apply(args)
+    )
+
+
 class ListTests(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -192,20 +218,18 @@ class ListTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN, response.content)
 
         self.client.force_login(self.admin)
-        with self.assertNumQueries(14):
+        with self.assertNumQueries(11):
             # 1: session
             # 2: auth
             # 3: SELECT FROM lists
             # 4: prefetch items
-            # 5: prefetch item labels/images
-            # 7: prefetch image metadata
-            # 8: prefetch children: items
-            # 9: prefetch children: item labels/images
-            # 10: prefetch children: image metadata
-            # 11: prefetch grandchildren: items
-            # there are no grandchildren, so no values/metadata to get
-            # 12: get permitted nodegroups
-            # 13-14: permission checks
+            # 5: prefetch item values (images are only counted)
+            # 6: prefetch children: items
+            # 7: prefetch children: item values
+            # 8: prefetch grandchildren: items
+            # there are no grandchildren, so no values to get
+            # 9: get permitted nodegroups
+            # 10-11: permission checks
             response = self.client.get(reverse("controlled_lists"))
 
         self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
@@ -228,10 +252,80 @@ class ListTests(TestCase):
 
         for item in first_list["items"]:
             self.assertEqual(item["children"], [])
+            self.assertNotIn("images", item)
+        self.assertEqual(
+            {item["id"]: item["image_count"] for item in first_list["items"]},
+            {
+                str(item.pk): int(item.pk == self.image.list_item_id)
+                for item in self.list1.list_items.all()
+            },
+        )
 
         self.assertEqual(len(second_list["items"]), 1)
         self.assertEqual(len(second_list["items"][0]["children"]), 4)
 
+    def test_get_changes(self):
+        self.client.force_login(self.admin)
+        cursor = ListChange.objects.latest("id").id
+        item = self.list1.list_items.first()
+        item.guide = True
+        item.save()
+        ListItemValue.objects.filter(list_item=item, valuetype="altLabel").delete()
+
+        response = self.client.get(
+            reverse("controlled_list_changes"), {"since": cursor}
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+        result = response.json()
+        self.assertFalse(result["more"])
+        self.assertGreater(result["cursor"], cursor)
+        changes = {
+            (change["model"], change["operation"]): change
+            for change in result["changes"]
+        }
+        self.assertIs(changes[("listitem", "update")]["data"]["guide"], True)
+        self.assertIsNone(changes[("listitemvalue", "delete")]["data"])
+        # Touching List.modified is not a change to the list itself.
+        self.assertNotIn(("list", "update"), changes)
+
+    def test_get_changes_after_compaction(self):
+        self.client.force_login(self.admin)
+        item = self.list1.list_items.first()
+        item.guide = True
+        item.save()
+        cursor = ListChange.objects.latest("id").id
+        item.guide = False
+        item.save()
+
+        compacted = ListChange.objects.compact(
+            before=timezone.now() + datetime.timedelta(minutes=1)
+        )
+
+        self.assertGreater(compacted, 0)
+        self.assertEqual(
+            ListChange.objects.filter(model="listitem", object_id=item.pk).count(), 1
+        )
+        with self.assertLogs("django.request", level="WARNING"):
+            response = self.client.get(
+                reverse("controlled_list_changes"), {"since": cursor}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.GONE, response.content)
+
+        # Starting over still gives the state of every object.
+        response = self.client.get(reverse("controlled_list_changes"))
+        self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+        items = {
+            change["id"]: change["data"]
+            for change in response.json()["changes"]
+            if change["model"] == "listitem"
+        }
+        self.assertEqual(
+            set(items),
+            {str(pk) for pk in ListItem.objects.values_list("pk", flat=True)},
+        )
+        self.assertIs(items[str(item.pk)]["guide"], False)
+
     def test_get_list_permitted_nodegroups(self):
         assign_perm("no_access_to_nodegroup", self.rdm_user, self.nodegroup)
 
@@ -260,6 +354,30 @@ class ListTests(TestCase):
             List.objects.filter(name__startswith="Untitled List: ").count(), 1
         )
 
+    def test_clone_list(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.post(
+            reverse("controlled_list_clone", kwargs={"list_id": str(self.list2.pk)}),
+            {"name": "list2 fork"},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.CREATED, response.content)
+        clone = List.objects.get(pk=response.json()["id"])
+        self.assertEqual(clone.name, "list2 fork")
+        self.assertEqual(clone.list_items.count(), 5)
+        self.assertEqual(clone.list_items.filter(parent=None).count(), 1)
+        self.assertEqual(
+            ListItemValue.objects.filter(list_item__list=clone).count(),
+            ListItemValue.objects.filter(list_item__list=self.list2).count(),
+        )
+        self.assertFalse(
+            clone.list_items.filter(
+                uri__in=self.list2.list_items.values("uri")
+            ).exists()
+        )
+
     def test_delete_list(self):
         self.client.force_login(self.admin)
         with self.assertLogs("django.request", level="WARNING"):
@@ -269,11 +387,23 @@ class ListTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST, response.content)
         del self.node_using_list1.config["controlledList"]
         self.node_using_list1.save()
-        response = self.client.delete(
-            reverse("controlled_list", kwargs={"list_id": str(self.list1.pk)}),
-        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(
+                reverse("controlled_list", kwargs={"list_id": str(self.list1.pk)}),
+            )
         self.assertEqual(List.objects.count(), 1)
         self.assertEqual(List.objects.first().pk, self.list2.pk)
+        self.assertFalse(ListItem.objects.filter(list=self.list1).exists())
+        self.assertFalse(ListItemImageMetadata.objects.exists())
+        # The image file is deleted after commit.
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(
+            ListChange.objects.filter(
+                model__in=["listitemvalue", "listitemimagemetadata"],
+                operation="delete",
+                list_id=None,
+            ).exists()
+        )
 
     def test_create_list_item(self):
         self.client.force_login(self.admin)
@@ -315,6 +445,87 @@ class ListTests(TestCase):
             transform=sync_pk_for_comparison,
         )
 
+    def test_create_list_items_batch(self):
+        self.client.force_login(self.admin)
+        existing_pks = [item.pk for item in self.list1.list_items.all()]
+        parent_item = self.list1.list_items.order_by("uri").first()
+        language = self.first_language.code
+
+        response = self.client.post(
+            reverse("controlled_list_items_add"),
+            {
+                "list_id": str(self.list1.pk),
+                "items": [
+                    {
+                        "id": "new-1",
+                        "parent_id": str(parent_item.pk),
+                        "values": [
+                            {
+                                "valuetype_id": "prefLabel",
+                                "language_id": language,
+                                "value": "Batch parent",
+                            },
+                        ],
+                    },
+                    {
+                        "id": "new-2",
+                        "parent_id": "new-1",
+                        "values": [
+                            {
+                                "valuetype_id": "prefLabel",
+                                "language_id": language,
+                                "value": "Batch child",
+                            },
+                            {
+                                "valuetype_id": "altLabel",
+                                "language_id": language,
+                                "value": "Batch child alt",
+                            },
+                        ],
+                    },
+                ],
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.CREATED, response.content)
+        ids = response.json()["ids"]
+        self.assertQuerySetEqual(
+            self.list1.list_items.exclude(pk__in=existing_pks).order_by("sortorder"),
+            [
+                (uuid.UUID(ids["new-1"]), parent_item.pk, 4 + ListItem.SORTORDER_GAP),
+                (
+                    uuid.UUID(ids["new-2"]),
+                    uuid.UUID(ids["new-1"]),
+                    4 + 2 * ListItem.SORTORDER_GAP,
+                ),
+            ],
+            transform=lambda item: (item.pk, item.parent_id, item.sortorder),
+        )
+        self.assertEqual(
+            ListItemValue.objects.filter(list_item_id=ids["new-2"]).count(), 2
+        )
+
+    def test_create_list_items_batch_cycle(self):
+        self.client.force_login(self.admin)
+        item_count = ListItem.objects.count()
+
+        with self.assertLogs("django.request", level="WARNING"):
+            response = self.client.post(
+                reverse("controlled_list_items_add"),
+                {
+                    "list_id": str(self.list1.pk),
+                    "items": [
+                        {"id": "new-1", "parent_id": "new-2", "values": []},
+                        {"id": "new-2", "parent_id": "new-1", "values": []},
+                    ],
+                },
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST, response.content)
+        self.assertEqual(ListItem.objects.count(), item_count)
+
     def test_list_items_provide_new_sortorder(self):
         self.client.force_login(self.admin)
 
@@ -364,6 +575,136 @@ class ListTests(TestCase):
             [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
         )
 
+    def test_move_list_item_delta(self):
+        self.client.force_login(self.admin)
+        items = list(self.list1.list_items.order_by("sortorder"))
+
+        response = self.client.patch(
+            reverse("controlled_list", kwargs={"list_id": str(self.list1.pk)}),
+            {"move": {"item_id": str(items[0].pk), "after_id": str(items[2].pk)}},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+        self.assertEqual(
+            response.json()["sortorder_map"],
+            {
+                str(items[1].pk): 0,
+                str(items[2].pk): 1,
+                str(items[0].pk): 2,
+            },
+        )
+        self.assertEqual(
+            list(self.list1.list_items.order_by("sortorder")),
+            [items[1], items[2], items[0], *items[3:]],
+        )
+
+    def test_patch_list_item_revision_conflict(self):
+        self.client.force_login(self.admin)
+        item = self.list1.list_items.first()
+        response = self.client.get(
+            reverse("controlled_list", kwargs={"list_id": str(self.list1.pk)})
+        )
+        revision = response["ETag"]
+        self.assertEqual(revision, f'"{response.json()["revision"]}"')
+
+        ListItem.objects.filter(pk=item.pk).update(uri="https://example.com/other")
+        item_url = reverse("controlled_list_item", kwargs={"item_id": str(item.pk)})
+
+        with self.assertLogs("django.request", level="WARNING"):
+            response = self.client.patch(
+                item_url,
+                {"guide": True},
+                content_type="application/json",
+                headers={"If-Match": revision},
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT, response.content)
+        [change] = response.json()["changes"]
+        self.assertEqual(change["id"], str(item.pk))
+        self.assertEqual(change["data"]["uri"], "https://example.com/other")
+        item.refresh_from_db()
+        self.assertIs(item.guide, False)
+
+        response = self.client.patch(
+            item_url,
+            {"guide": True},
+            content_type="application/json",
+            headers={"If-Match": f'"{change["cursor"]}"'},
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT, response.content)
+        self.assertGreater(int(response["ETag"].strip('"')), change["cursor"])
+
+    def test_copy_subtree(self):
+        self.client.force_login(self.admin)
+        list1_item_count = self.list1.list_items.count()
+
+        response = self.client.post(
+            reverse(
+                "controlled_list_item_subtree", kwargs={"item_id": str(self.parent.pk)}
+            ),
+            {"operation": "copy", "list_id": str(self.list1.pk)},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.CREATED, response.content)
+        copy = ListItem.objects.get(pk=response.json()["id"])
+        self.assertEqual(copy.list_id, self.list1.pk)
+        self.assertIsNone(copy.parent_id)
+        self.assertNotEqual(copy.uri, self.parent.uri)
+        self.assertEqual(copy.children.count(), self.parent.children.count())
+        self.assertEqual(
+            self.list1.list_items.count(),
+            list1_item_count + 1 + self.parent.children.count(),
+        )
+        self.assertEqual(
+            ListItemValue.objects.filter(
+                list_item__in=[copy, *copy.children.all()]
+            ).count(),
+            ListItemValue.objects.filter(list_item__list=self.list2).count(),
+        )
+        # The original is untouched.
+        self.assertEqual(self.list2.list_items.count(), 5)
+
+    def test_move_subtree(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.post(
+            reverse(
+                "controlled_list_item_subtree", kwargs={"item_id": str(self.parent.pk)}
+            ),
+            {
+                "operation": "move",
+                "list_id": str(self.list1.pk),
+                "parent_id": str(self.list1.list_items.first().pk),
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+        self.assertEqual(self.list2.list_items.count(), 0)
+        self.assertEqual(self.list1.list_items.count(), 10)
+
+    def test_move_subtree_under_own_child(self):
+        self.client.force_login(self.admin)
+
+        with self.assertLogs("django.request", level="WARNING"):
+            response = self.client.post(
+                reverse(
+                    "controlled_list_item_subtree",
+                    kwargs={"item_id": str(self.parent.pk)},
+                ),
+                {
+                    "operation": "move",
+                    "list_id": str(self.list2.pk),
+                    "parent_id": str(self.parent.children.first().pk),
+                },
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST, response.content)
+
     def test_recursive_cycles(self):
         self.client.force_login(self.admin)
         serialized_list = self.list2.serialize(flat=False)
@@ -412,6 +753,17 @@ class ListTests(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT, response.content)
         self.assertQuerySetEqual(ListItem.objects.filter(pk=self.parent.pk), [])
+        self.assertEqual(self.list2.list_items.count(), 0)
+        self.assertFalse(ListItemValue.objects.filter(list_item__list=self.list2))
+        # Deleted values are logged against their list.
+        self.assertEqual(
+            set(
+                ListChange.objects.filter(
+                    model="listitemvalue", operation="delete"
+                ).values_list("list_id", flat=True)
+            ),
+            {self.list2.pk},
+        )
 
     def test_update_label_valid(self):
         self.client.force_login(self.admin)
@@ -426,6 +778,38 @@ class ListTests(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
 
+    def test_update_label_revision_conflict(self):
+        self.client.force_login(self.admin)
+        label = ListItemValue.objects.filter(
+            list_item__list=self.list1, valuetype="prefLabel"
+        ).first()
+        revision = ListChange.objects.filter(list_item_id=label.list_item_id).revision()
+        ListItemValue.objects.filter(pk=label.pk).update(value="changed elsewhere")
+        value_url = reverse("controlled_list_item_value", kwargs={"value_id": label.pk})
+
+        with self.assertLogs("django.request", level="WARNING"):
+            response = self.client.put(
+                value_url,
+                {**label.serialize(), "value": "changed here"},
+                content_type="application/json",
+                headers={"If-Match": f'"{revision}"'},
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT, response.content)
+        [change] = response.json()["changes"]
+        self.assertEqual(change["data"]["value"], "changed elsewhere")
+        label.refresh_from_db()
+        self.assertEqual(label.value, "changed elsewhere")
+
+        response = self.client.put(
+            value_url,
+            {**label.serialize(), "value": "changed here"},
+            content_type="application/json",
+            headers={"If-Match": f'"{change["cursor"]}"'},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+        self.assertGreater(int(response["ETag"].strip('"')), change["cursor"])
+
     def test_update_label_invalid(self):
         self.client.force_login(self.admin)
         serialized_list = self.list1.serialize(flat=False)
@@ -462,6 +846,326 @@ class ListTests(TestCase):
             )
         self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST, response.content)
 
+    def test_upsert_and_delete_values(self):
+        self.client.force_login(self.admin)
+        items = list(self.list1.list_items.all())
+        alt_label = ListItemValue.objects.filter(
+            list_item=items[0], valuetype="altLabel"
+        ).first()
+
+        response = self.client.post(
+            reverse("controlled_list_item_values"),
+            {
+                "upsert": [
+                    {
+                        "list_item_id": str(item.pk),
+                        "valuetype_id": "prefLabel",
+                        "language_id": self.new_language.code,
+                        "value": f"{item.uri} in Esperanto",
+                    }
+                    for item in items
+                ]
+                + [
+                    {
+                        "id": str(alt_label.pk),
+                        "list_item_id": str(items[0].pk),
+                        "valuetype_id": "altLabel",
+                        "language_id": self.first_language.code,
+                        "value": "updated",
+                    }
+                ],
+                "delete": [],
+            },
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+        self.assertEqual(
+            ListItemValue.objects.filter(language=self.new_language).count(),
+            len(items),
+        )
+        alt_label.refresh_from_db()
+        self.assertEqual(alt_label.value, "updated")
+
+    def test_delete_values_keeps_pref_label(self):
+        self.client.force_login(self.admin)
+        item = self.list1.list_items.first()
+        pref_labels = ListItemValue.objects.filter(
+            list_item=item, valuetype="prefLabel"
+        )
+
+        with self.assertLogs("django.request", level="WARNING"):
+            response = self.client.post(
+                reverse("controlled_list_item_values"),
+                {"delete": [str(value.pk) for value in pref_labels]},
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST, response.content)
+        self.assertTrue(pref_labels.exists())
+
+    def test_get_item_images(self):
+        self.client.force_login(self.admin)
+        other_item = self.list1.list_items.exclude(pk=self.image.list_item_id).first()
+
+        response = self.client.get(
+            reverse("controlled_list_item_images"),
+            {"item_id": [str(self.image.list_item_id), str(other_item.pk)]},
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+        result = response.json()
+        self.assertEqual(result[str(other_item.pk)], [])
+        [image] = result[str(self.image.list_item_id)]
+        self.assertEqual(image["id"], str(self.image.pk))
+        self.assertEqual(
+            len(image["metadata"]), self.image.list_item_image_metadata.count()
+        )
+
+    def test_create_image_thumbnails(self):
+        self.client.force_login(self.admin)
+        buffer = io.BytesIO()
+        Image.new("RGB", (600, 300)).save(buffer, format="PNG")
+        upload = SimpleUploadedFile("photo.png", buffer.getvalue())
+
+        with (
+            tempfile.TemporaryDirectory() as media_root,
+            override_settings(MEDIA_ROOT=media_root),
+        ):
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(
+                    reverse("controlled_list_item_image_add"),
+                    {
+                        "list_item_id": str(self.image.list_item_id),
+                        "item_image": upload,
+                    },
+                )
+            self.assertEqual(response.status_code, HTTPStatus.CREATED, response.content)
+            self.assertEqual(set(response.json()["thumbnails"]), {"small", "medium"})
+            # Thumbnails are generated after commit.
+            self.assertEqual(len(callbacks), 1)
+
+            image = ListItemImage.objects.get(pk=response.json()["id"])
+            self.assertEqual(generate_thumbnails(image.value.name), 2)
+            with default_storage.open(thumbnail_name(image.value.name, "medium")) as f:
+                self.assertEqual(Image.open(f).size, (256, 128))
+
+    def test_create_duplicate_images(self):
+        self.client.force_login(self.admin)
+        content = b"GIF89a same logo"
+        content_hash = hashlib.sha256(content).hexdigest()
+        first_item, second_item, third_item = self.list1.list_items.all()[:3]
+
+        with (
+            tempfile.TemporaryDirectory() as media_root,
+            override_settings(MEDIA_ROOT=media_root),
+        ):
+            with self.assertLogs("django.request", level="WARNING"):
+                response = self.client.post(
+                    reverse("controlled_list_item_image_add"),
+                    {
+                        "list_item_id": str(first_item.pk),
+                        "sha256": content_hash,
+                        "name": "logo.gif",
+                    },
+                )
+            # Not stored yet, so the client uploads the file.
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+            responses = [
+                self.client.post(
+                    reverse("controlled_list_item_image_add"),
+                    {
+                        "list_item_id": str(item.pk),
+                        "item_image": SimpleUploadedFile("logo.gif", content),
+                    },
+                )
+                for item in (first_item, second_item)
+            ]
+            response = self.client.post(
+                reverse("controlled_list_item_image_add"),
+                {
+                    "list_item_id": str(third_item.pk),
+                    "sha256": content_hash,
+                    "name": "LOGO.GIF",
+                },
+            )
+            responses.append(response)
+
+            for response in responses:
+                self.assertEqual(
+                    response.status_code, HTTPStatus.CREATED, response.content
+                )
+            self.assertEqual(
+                set(
+                    ListItemImage.objects.filter(
+                        pk__in=[response.json()["id"] for response in responses]
+                    ).values_list("value", flat=True)
+                ),
+                {f"list_item_images/{content_hash}.gif"},
+            )
+            self.assertEqual(
+                os.listdir(os.path.join(media_root, "list_item_images")),
+                [f"{content_hash}.gif"],
+            )
+
+    def test_create_image_not_stored_under_its_hash(self):
+        self.client.force_login(self.admin)
+        content = b"GIF89a raced logo"
+        stored_name = f"list_item_images/{hashlib.sha256(content).hexdigest()}.gif"
+
+        with (
+            tempfile.TemporaryDirectory() as media_root,
+            override_settings(MEDIA_ROOT=media_root),
+        ):
+            default_storage.save(stored_name, io.BytesIO(content))
+            # As if the file were stored after the check: storage would pick
+            # another name.
+            with (
+                mock.patch.object(default_storage, "exists", return_value=False),
+                self.assertLogs("django.request", level="WARNING"),
+            ):
+                response = self.client.post(
+                    reverse("controlled_list_item_image_add"),
+                    {
+                        "list_item_id": str(self.image.list_item_id),
+                        "item_image": SimpleUploadedFile("logo.gif", content),
+                    },
+                )
+
+            self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+            self.assertFalse(
+                ListItemImage.objects.filter(value__startswith=stored_name[:-4])
+            )
+            self.assertEqual(
+                os.listdir(os.path.join(media_root, "list_item_images")),
+                [os.path.basename(stored_name)],
+            )
+
+    def test_delete_unreferenced_files_keeps_referenced_files(self):
+        with (
+            tempfile.TemporaryDirectory() as media_root,
+            override_settings(MEDIA_ROOT=media_root),
+        ):
+            kept = default_storage.save("list_item_images/kept.gif", io.BytesIO())
+            deleted = default_storage.save("list_item_images/deleted.gif", io.BytesIO())
+            ListItemImage.objects.filter(pk=self.image.pk).update(value=kept)
+
+            tasks.delete_unreferenced_files([kept, deleted])
+
+            self.assertTrue(default_storage.exists(kept))
+            self.assertFalse(default_storage.exists(deleted))
+
+    def test_chunked_image_upload(self):
+        self.client.force_login(self.admin)
+        content = b"II*\x00 a large scan"
+        item = self.list1.list_items.first()
+
+        with (
+            tempfile.TemporaryDirectory() as media_root,
+            override_settings(MEDIA_ROOT=media_root),
+        ):
+            response = self.client.post(
+                reverse("controlled_list_item_image_upload_add"),
+                {"list_item_id": str(item.pk), "name": "scan.tif"},
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, HTTPStatus.CREATED, response.content)
+            upload_url = reverse(
+                "controlled_list_item_image_upload",
+                kwargs={"upload_id": response.json()["upload_id"]},
+            )
+
+            for offset in (0, 8):
+                response = self.client.patch(
+                    upload_url,
+                    content[offset : offset + 8],
+                    content_type="application/octet-stream",
+                    headers={"Upload-Offset": str(offset)},
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+
+            # A repeated chunk is refused with the offset to resume from.
+            with self.assertLogs("django.request", level="WARNING"):
+                response = self.client.patch(
+                    upload_url,
+                    content[8:16],
+                    content_type="application/octet-stream",
+                    headers={"Upload-Offset": "8"},
+                )
+            self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+            self.assertEqual(response.json()["offset"], 16)
+
+            response = self.client.patch(
+                upload_url,
+                content[16:],
+                content_type="application/octet-stream",
+                headers={"Upload-Offset": "16"},
+            )
+            self.assertEqual(self.client.get(upload_url).json()["offset"], len(content))
+
+            response = self.client.post(upload_url)
+
+            self.assertEqual(response.status_code, HTTPStatus.CREATED, response.content)
+            image = ListItemImage.objects.get(pk=response.json()["id"])
+            self.assertEqual(image.list_item_id, item.pk)
+            with default_storage.open(image.value.name) as f:
+                self.assertEqual(f.read(), content)
+            self.assertEqual(
+                image.value.name,
+                f"list_item_images/{hashlib.sha256(content).hexdigest()}.tif",
+            )
+            # The chunks are gone.
+            with self.assertLogs("django.request", level="WARNING"):
+                self.assertEqual(
+                    self.client.get(upload_url).status_code, HTTPStatus.NOT_FOUND
+                )
+
+    def test_chunked_image_upload_too_large(self):
+        self.client.force_login(self.admin)
+        item = self.list1.list_items.first()
+        image_count = ListItemImage.objects.count()
+
+        with (
+            tempfile.TemporaryDirectory() as media_root,
+            override_settings(
+                MEDIA_ROOT=media_root, CONTROLLED_LIST_MAX_IMAGE_UPLOAD_SIZE=12
+            ),
+        ):
+            response = self.client.post(
+                reverse("controlled_list_item_image_upload_add"),
+                {"list_item_id": str(item.pk), "name": "scan.tif"},
+                content_type="application/json",
+            )
+            upload_url = reverse(
+                "controlled_list_item_image_upload",
+                kwargs={"upload_id": response.json()["upload_id"]},
+            )
+            response = self.client.patch(
+                upload_url,
+                b"II*\x00 a l",
+                content_type="application/octet-stream",
+                headers={"Upload-Offset": "0"},
+            )
+            self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
+
+            with self.assertLogs("django.request", level="WARNING"):
+                response = self.client.patch(
+                    upload_url,
+                    b"arge scan",
+                    content_type="application/octet-stream",
+                    headers={"Upload-Offset": "8"},
+                )
+            self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+            with (
+                override_settings(CONTROLLED_LIST_MAX_IMAGE_UPLOAD_SIZE=4),
+                self.assertLogs("django.request", level="WARNING"),
+            ):
+                response = self.client.post(upload_url)
+            self.assertEqual(response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            self.assertEqual(ListItemImage.objects.count(), image_count)
+
     def test_delete_image(self):
         self.client.force_login(self.admin)
         response = self.client.delete(
@@ -488,6 +1192,26 @@ class ListTests(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.OK, response.content)
 
+    def test_delete_metadata_revision_conflict(self):
+        self.client.force_login(self.admin)
+        metadata = self.image.list_item_image_metadata.first()
+        revision = ListChange.objects.filter(
+            list_item_id=self.image.list_item_id
+        ).revision()
+        ListItemImageMetadata.objects.filter(pk=metadata.pk).update(value="changed")
+
+        with self.assertLogs("django.request", level="WARNING"):
+            response = self.client.delete(
+                reverse(
+                    "controlled_list_item_image_metadata",
+                    kwargs={"metadata_id": str(metadata.pk)},
+                ),
+                headers={"If-Match": f'"{revision}"'},
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT, response.content)
+        self.assertTrue(ListItemImageMetadata.objects.filter(pk=metadata.pk).exists())
+
     def test_update_metadata_invalid(self):
         self.client.force_login(self.admin)
         serialized_image = self.image.serialize()
@@ -518,3 +1242,102 @@ class ListTests(TestCase):
         self.assertQuerySetEqual(
             ListItemImageMetadata.objects.filter(pk=metadata.pk), []
         )
+
+    def test_get_unknown_task(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse("controlled_list_task", kwargs={"task_id": str(uuid.uuid4())}),
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND, response.content)
+
+    def test_start_task(self):
+        self.client.force_login(self.admin)
+        input_file = os.path.join(
+            PROJECT_TEST_ROOT, "fixtures", "data", "controlled_lists.xlsx"
+        )
+        with (
+            open(input_file, "rb") as f,
+            mock.patch.object(
+                task_management, "check_if_celery_available", return_value=True
+            ),
+            run_eagerly(tasks.import_controlled_lists),
+            captured_stdout(),
+        ):
+            response = self.client.post(
+                reverse("controlled_list_task_add"),
+                {"operation": "import_controlled_lists", "file": f},
+            )
+
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED, response.content)
+        user_task = UserXTask.objects.get(taskid=response.json()["taskid"])
+        self.assertEqual(user_task.user, self.admin)
+        self.assertEqual(user_task.name, tasks.import_controlled_lists.name)
+        self.assertEqual(List.objects.count(), 4)
+        # The uploaded file is deleted once imported.
+        self.assertNotIn(
+            "controlled_lists.xlsx", default_storage.listdir(tasks.UPLOAD_DIR)[1]
+        )
+
+    def test_start_task_without_celery(self):
+        self.client.force_login(self.admin)
+        with (
+            mock.patch.object(
+                task_management, "check_if_celery_available", return_value=False
+            ),
+            mock.patch.object(tasks, "start_task") as start_task,
+            self.assertLogs("django.request", level="WARNING"),
+        ):
+            response = self.client.post(
+                reverse("controlled_list_task_add"),
+                {"operation": "export_controlled_lists"},
+            )
+        self.assertEqual(
+            response.status_code, HTTPStatus.SERVICE_UNAVAILABLE, response.content
+        )
+        start_task.assert_not_called()
+
+    def test_start_task_unknown_operation(self):
+        self.client.force_login(self.admin)
+        with (
+            mock.patch.object(
+                task_management, "check_if_celery_available", return_value=True
+            ),
+            mock.patch.object(tasks, "start_task") as start_task,
+            self.assertLogs("django.request", level="WARNING"),
+        ):
+            response = self.client.post(
+                reverse("controlled_list_task_add"), {"operation": "reticulate"}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST, response.content)
+        start_task.assert_not_called()
+
+    def test_start_task_guarded(self):
+        self.client.force_login(self.anonymous)
+        with (
+            mock.patch.object(
+                task_management, "check_if_celery_available", return_value=True
+            ),
+            mock.patch.object(tasks, "start_task") as start_task,
+            self.assertLogs("django.request", level="WARNING"),
+        ):
+            response = self.client.post(
+                reverse("controlled_list_task_add"),
+                {"operation": "export_controlled_lists"},
+            )
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN, response.content)
+        start_task.assert_not_called()
+
+    def test_export_task_notifies_with_download_link(self):
+        result = tasks.export_controlled_lists.apply((self.admin.id, "csv"))
+        stored_name = os.path.join(tasks.EXPORT_DIR, result.id, "controlled_lists.zip")
+        self.addCleanup(default_storage.delete, stored_name)
+        # Run the callback start_task() links to the task.
+        update_user_task_record(result.get())
+
+        self.assertTrue(default_storage.exists(stored_name))
+        self.assertEqual(UserXTask.objects.get(taskid=result.id).status, "SUCCESS")
+        notification = Notification.objects.get(
+            userxnotification__recipient=self.admin,
+            notiftype__name=tasks.EXPORT_READY_NOTIFTYPE,
+        )
+        self.assertEqual(notification.context["link"], default_storage.url(stored_name))